@@ -3,13 +3,137 @@ CropCoefficients class for managing AgriMet crop coefficient data.
 
 This module provides a class-based interface for reading, parsing, and querying
 AgriMet crop coefficient data from the crop_coefficients.txt file.
+
+When loaded from file, the 21-period curves are held in one contiguous (n_crops x 21)
+float array with a crop code -> row index, and a versioned binary cache of the parsed
+file (keyed on the file's SHA-256) is written next to it so later starts skip parsing.
 """
 
 import os
+import hashlib
+import json
+import logging
+import struct
 from typing import Dict, List, Optional
 import sqlite3
-import datetime
 import requests
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Path to the AgriMet crop_coefficients.txt file, overridable with the CROP_COEFFICIENTS_FILE environment variable
+DEFAULT_FILE_PATH = os.environ.get('CROP_COEFFICIENTS_FILE', '/PythonScripts/Agrimet/CropCoefficients/crop_coefficients.txt')
+
+NUM_PERIODS = 21
+
+# Binary cache layout: magic, format version, SHA-256 of the source file, length of the JSON
+# index, the JSON index (codes, curve numbers, descriptions), then the float64 coefficient array
+CACHE_MAGIC = b'AGKC'
+CACHE_VERSION = 2    # bump whenever _parse changes, so caches of the old parse are ignored
+_CACHE_HEADER = struct.Struct('<4sH32sI')
+
+
+def _to_float(value) -> float:
+    """Convert a database value to float, NaN if missing or not numeric."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _season_day(years: np.ndarray, month_day: str) -> np.ndarray:
+    """Anchor a 'MM/DD' season date to the given years, as datetime64[D]."""
+    month, day = (int(x) for x in month_day.split('/'))
+    months = years.astype('datetime64[M]') + np.timedelta64(month - 1, 'M')
+    return months.astype('datetime64[D]') + np.timedelta64(day - 1, 'D')
+
+
+def growth_stage_percent(dates, planting_date: str, full_cover_date: str, termination_date: str):
+    """
+    Vectorized growth stage (0-200%) of a crop on each of the given days.
+
+    The season's 'MM/DD' planting, full cover and termination dates are anchored to each day's year
+    (seasons that cross the new year, e.g. winter grain, are anchored to the year they started in).
+    The growth stage runs 0-100% from planting to full cover and 100-200% from full cover to
+    termination; days outside the season are 0%.
+
+    Args:
+        dates: array-like of dates (datetime64[D] or 'YYYY-MM-DD' strings)
+        planting_date, full_cover_date, termination_date: season dates as 'MM/DD'
+
+    Returns:
+        (gs_percent, in_season): float array of growth stage percents and a boolean in-season mask
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+
+    # season lengths, measured on a non-leap reference year
+    ref_year = np.array(['2001'], dtype='datetime64[Y]')
+    ref_plant = _season_day(ref_year, planting_date)[0]
+    ref_cover = _season_day(ref_year, full_cover_date)[0]
+    ref_term = _season_day(ref_year, termination_date)[0]
+    if ref_cover < ref_plant:
+        ref_cover += np.timedelta64(365, 'D')
+    if ref_term < ref_cover:
+        ref_term += np.timedelta64(365, 'D')
+    cover_days = int((ref_cover - ref_plant) / np.timedelta64(1, 'D'))
+    term_days = int((ref_term - ref_cover) / np.timedelta64(1, 'D'))
+    wraps_year = ref_term >= np.datetime64('2002-01-01')
+
+    years = dates.astype('datetime64[Y]')
+    plant = _season_day(years, planting_date)
+    if wraps_year:
+        # days before this year's planting date belong to the season that started last year
+        plant = np.where(dates < plant, _season_day(years - np.timedelta64(1, 'Y'), planting_date), plant)
+
+    days_since_planting = ((dates - plant) / np.timedelta64(1, 'D')).astype(np.float64)
+    in_season = (days_since_planting >= 0) & (days_since_planting <= cover_days + term_days)
+
+    # Determine growth stage percent (0-200)
+    if cover_days > 0:
+        to_cover = 100 * days_since_planting / cover_days
+    else:
+        to_cover = np.zeros_like(days_since_planting)
+    if term_days > 0:
+        to_term = 100 + 100 * (days_since_planting - cover_days) / term_days
+    else:
+        to_term = np.full_like(days_since_planting, 100.0)
+    gs_percent = np.where(days_since_planting <= cover_days, to_cover, to_term)
+    gs_percent = np.clip(np.where(in_season, gs_percent, 0.0), 0, 200)
+    return gs_percent, in_season
+
+
+def compute_kc_etc(dates, etrs, kc_curve, planting_date: str, full_cover_date: str, termination_date: str):
+    """
+    Vectorized daily Kc and ETc for one crop over any number of days.
+
+    Kc is interpolated linearly between the curve's 21 points (0, 10, ..., 200%) at each day's
+    growth stage (see growth_stage_percent). Days outside the season use the curve's first point.
+
+    Args:
+        dates: array-like of dates (datetime64[D] or 'YYYY-MM-DD' strings)
+        etrs: array-like of daily ETrs (in/day); NaN where missing
+        kc_curve: the crop's 21 Kc values
+        planting_date, full_cover_date, termination_date: season dates as 'MM/DD'
+
+    Returns:
+        (kc, etc): float arrays the same length as dates; etc is NaN where etrs is NaN
+
+    Example:
+        >>> kc, etc = compute_kc_etc(['2024-06-01', '2024-06-02'], [0.31, 0.28], curve, '04/01', '06/01', '10/05')
+    """
+    etrs = np.asarray(etrs, dtype=np.float64)
+    kc_curve = np.asarray(kc_curve, dtype=np.float64)
+    gs_percent, _ = growth_stage_percent(dates, planting_date, full_cover_date, termination_date)
+
+    # Interpolate Kc from kc_curve (21 points: 0, 10, ..., 200)
+    idx_float = gs_percent / 10
+    idx_low = np.floor(idx_float).astype(np.intp)
+    idx_high = np.minimum(idx_low + 1, NUM_PERIODS - 1)
+    kc = kc_curve[idx_low] + (kc_curve[idx_high] - kc_curve[idx_low]) * (idx_float - idx_low)
+
+    # ETrs is in in/day, Kc is unitless
+    etc = etrs * kc
+    return kc, etc
 
 
 class CropCoefficients:
@@ -21,35 +145,50 @@ class CropCoefficients:
     curves for various crops with 21 time periods representing the growing season.
     
     Attributes:
-        data (Dict): Dictionary containing crop coefficient data organized by
-                    curve number and crop code
+        coefficients (np.ndarray): (n_crops x 21) array of coefficient curves, one row per crop
         file_path (str): Path to the crop coefficients file
+        cache_path (str): Path to the binary cache of the parsed file
         
     Example:
-        >>> cc = CropCoefficients()
+        >>> cc = CropCoefficients(use_file=True)
         >>> alfp_coeff = cc.get_coefficient('ALFP', 10)  # Mid-season alfalfa
         >>> crops = cc.list_crops()
         >>> print(f"Available crops: {crops}")
     """
     
-    def __init__(self, use_file: bool = False ):  #  '/PythonScripts/Agrimet/CropCoefficients/crop_coefficients.txt'):
+    def __init__(self, use_file: bool = False, file_path: Optional[str] = None, cache_path: Optional[str] = None):
         """
         Initialize the CropCoefficients class.
         
         Args:
-            file_path (str): Path to the crop_coefficients.txt file
+            use_file (bool): Load the coefficient curves from crop_coefficients.txt (or its binary cache)
+            file_path (str, optional): Path to the crop_coefficients.txt file. Defaults to DEFAULT_FILE_PATH
+            cache_path (str, optional): Path to the binary cache. Defaults to file_path + '.cache'
             
         Raises:
             FileNotFoundError: If the crop coefficients file is not found
         """
+        self.file_path = file_path or DEFAULT_FILE_PATH
+        self.cache_path = cache_path
+        self.coefficients = None
+        self._row_by_code = {}
+        self._row_by_curve = {}
+        self._codes = []
+        self._curve_numbers = []
+        self._descriptions = []
+        self._sorted_codes = []
+        self._sorted_curves = []
+        self._data = None
         if use_file:
-            self.file_path = '/PythonScripts/Agrimet/CropCoefficients/crop_coefficients.txt'
-            self.data = None
             self._load_data()
     
+    def _get_cache_path(self) -> str:
+        return self.cache_path or self.file_path + '.cache'
+
     def _load_data(self) -> None:
         """
-        Load and parse the crop coefficients data from file.
+        Load the crop coefficients data, from the binary cache when it matches the file's
+        current hash, otherwise by parsing the file (and then rewriting the cache).
         
         Raises:
             FileNotFoundError: If the crop coefficients file is not found
@@ -57,71 +196,159 @@ class CropCoefficients:
         if not os.path.exists(self.file_path):
             raise FileNotFoundError(f"Crop coefficients file not found: {self.file_path}")
         
-        self.data = {
-            'by_curve_number': {},
-            'by_crop_code': {}
-        }
-        
+        with open(self.file_path, 'rb') as file:
+            raw = file.read()
+        file_hash = hashlib.sha256(raw).digest()
+
+        if not self._read_cache(file_hash):
+            self._parse(raw.decode('utf-8'))
+            self._write_cache(file_hash)
+
+        logger.info(f"Loaded {len(self._row_by_curve)} crop coefficient curves from {self.file_path}")
+
+    def _parse(self, text: str) -> None:
+        """
+        Parse crop_coefficients.txt in a single pass. Data lines start with the curve number,
+        followed by 21 coefficients, the crop code and a free-text description.
+
+        As in the original dict-based loader, a crop code or curve number maps to the last line that
+        has it, independently of each other, and a coefficient that can't be parsed reads as 0.0.
+        """
+        values = []
+        codes, curve_numbers, descriptions = [], [], []
+
+        for line_num, line in enumerate(text.splitlines(), 1):
+            line = line.strip()
+            # Skip empty lines, headers and comment lines; data lines start with a number
+            if not line or not line[0].isdigit():
+                continue
+
+            parts = line.split()
+            if len(parts) < NUM_PERIODS + 2:  # Need at least curve_number + 21 coefficients + crop_code
+                logger.warning(f"Line {line_num} of {self.file_path} has insufficient data, skipping")
+                continue
+
+            try:
+                curve_number = int(parts[0])
+            except ValueError as e:
+                logger.warning(f"Error parsing line {line_num} of {self.file_path}: {e}")
+                continue
+
+            curve = []
+            for i in range(1, NUM_PERIODS + 1):
+                try:
+                    curve.append(float(parts[i]))
+                except ValueError:
+                    logger.warning(f"Invalid coefficient at position {i} on line {line_num} of {self.file_path}")
+                    curve.append(0.0)
+
+            crop_code = parts[NUM_PERIODS + 1] if len(parts) > NUM_PERIODS + 1 else f"CROP_{curve_number}"
+            description = ' '.join(parts[NUM_PERIODS + 2:]) if len(parts) > NUM_PERIODS + 2 else "No description"
+
+            codes.append(crop_code)
+            curve_numbers.append(curve_number)
+            descriptions.append(description)
+            values.append(curve)
+
+        # Keep only the lines some crop code or curve number still maps to
+        last_by_code = {code: row for row, code in enumerate(codes)}
+        last_by_curve = {curve: row for row, curve in enumerate(curve_numbers)}
+        rows = sorted(set(last_by_code.values()) | set(last_by_curve.values()))
+
+        self._set_arrays(
+            np.array([values[row] for row in rows], dtype=np.float64).reshape(-1, NUM_PERIODS),
+            [codes[row] for row in rows],
+            [curve_numbers[row] for row in rows],
+            [descriptions[row] for row in rows],
+        )
+
+    def _set_arrays(self, coefficients, codes, curve_numbers, descriptions) -> None:
+        self.coefficients = np.ascontiguousarray(coefficients, dtype=np.float64)
+        self._codes = list(codes)
+        self._curve_numbers = [int(c) for c in curve_numbers]
+        self._descriptions = list(descriptions)
+        self._row_by_code = {code: row for row, code in enumerate(self._codes)}
+        self._row_by_curve = {curve: row for row, curve in enumerate(self._curve_numbers)}
+        self._sorted_codes = sorted(self._row_by_code)
+        self._sorted_curves = sorted(self._row_by_curve)
+        self._data = None
+
+    def _read_cache(self, file_hash: bytes) -> bool:
+        """Load the parsed arrays from the binary cache. Returns False if it is missing, stale or unreadable."""
+        cache_path = self._get_cache_path()
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as file:
-                lines = file.readlines()
-                
-            for line_num, line in enumerate(lines, 1):
-                line = line.strip()
-                
-                # Skip empty lines and comment lines
-                if not line or line.startswith('AgriMet') or line.startswith('The first'):
-                    continue
-                
-                # Parse data lines that start with a number
-                if line and line[0].isdigit():
-                    try:
-                        # Split the line into parts
-                        parts = line.split()
-                        
-                        if len(parts) < 23:  # Need at least curve_number + 21 coefficients + crop_code
-                            print(f"Warning: Line {line_num} has insufficient data, skipping")
-                            continue
-                        
-                        # Extract curve number
-                        curve_number = int(parts[0])
-                        
-                        # Extract 21 coefficient values
-                        coefficients = []
-                        for i in range(1, 22):  # positions 1-21 (21 values)
-                            try:
-                                coefficients.append(float(parts[i]))
-                            except (ValueError, IndexError):
-                                print(f"Warning: Invalid coefficient at position {i} on line {line_num}")
-                                coefficients.append(0.0)  # Default value
-                        
-                        # Extract crop code (should be at position 22)
-                        crop_code = parts[22] if len(parts) > 22 else f"CROP_{curve_number}"
-                        
-                        # Extract description (everything after crop code)
-                        description = ' '.join(parts[23:]) if len(parts) > 23 else "No description"
-                        
-                        # Create crop data entry
-                        crop_entry = {
-                            'curve_number': curve_number,
-                            'coefficients': coefficients,
-                            'crop_code': crop_code,
-                            'description': description
-                        }
-                        
-                        # Store in both dictionaries
-                        self.data['by_curve_number'][curve_number] = crop_entry
-                        self.data['by_crop_code'][crop_code] = crop_entry
-                        
-                    except (ValueError, IndexError) as e:
-                        print(f"Warning: Error parsing line {line_num}: {e}")
-                        continue
-        
-        except Exception as e:
-            print(f"Error reading crop coefficients file: {e}")
-            raise
-        
-        print(f"Successfully loaded {len(self.data['by_curve_number'])} crop coefficient curves")
+            with open(cache_path, 'rb') as f:
+                raw = f.read()
+            magic, version, cached_hash, index_len = _CACHE_HEADER.unpack_from(raw, 0)
+            if magic != CACHE_MAGIC or version != CACHE_VERSION or cached_hash != file_hash:
+                return False
+            offset = _CACHE_HEADER.size
+            index = json.loads(raw[offset:offset + index_len].decode('utf-8'))
+            offset += index_len
+            coefficients = np.frombuffer(raw, dtype='<f8', offset=offset).reshape(-1, NUM_PERIODS)
+            if coefficients.shape[0] != len(index['codes']):
+                return False
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable crop coefficients cache {cache_path}: {e}")
+            return False
+
+        self._set_arrays(coefficients, index['codes'], index['curve_numbers'], index['descriptions'])
+        return True
+
+    def _write_cache(self, file_hash: bytes) -> None:
+        """Write the parsed arrays to the binary cache (atomically). Failures are logged, not raised."""
+        cache_path = self._get_cache_path()
+        index = json.dumps({
+            'codes': self._codes,
+            'curve_numbers': self._curve_numbers,
+            'descriptions': self._descriptions,
+        }).encode('utf-8')
+        tmp_path = cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(_CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, file_hash, len(index)))
+                f.write(index)
+                f.write(self.coefficients.astype('<f8', copy=False).tobytes())
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write crop coefficients cache {cache_path}: {e}")
+
+    def _check_loaded(self) -> None:
+        if self.coefficients is None:
+            raise RuntimeError("Crop coefficient data not loaded")
+
+    def _row(self, crop_code: str) -> int:
+        self._check_loaded()
+        row = self._row_by_code.get(crop_code)
+        if row is None:
+            raise ValueError(f"Crop code '{crop_code}' not found. Available crops: {self._sorted_codes}")
+        return row
+
+    def _entry(self, row: int) -> Dict:
+        return {
+            'curve_number': self._curve_numbers[row],
+            'coefficients': self.coefficients[row].tolist(),
+            'crop_code': self._codes[row],
+            'description': self._descriptions[row]
+        }
+
+    @property
+    def data(self) -> Optional[Dict]:
+        """
+        Crop coefficient data organized by curve number and crop code (dict-of-dict view
+        of the coefficient array, built on first access).
+        """
+        if self.coefficients is None:
+            return None
+        if self._data is None:
+            entries = [self._entry(row) for row in range(len(self._codes))]
+            self._data = {
+                'by_curve_number': {entry['curve_number']: entry for entry in entries},
+                'by_crop_code': {entry['crop_code']: entry for entry in entries}
+            }
+        return self._data
     
     def get_coefficient(self, crop_code: str, period: int) -> float:
         """
@@ -138,24 +365,17 @@ class CropCoefficients:
             ValueError: If crop_code or period is invalid
             
         Example:
-            >>> cc = CropCoefficients()
+            >>> cc = CropCoefficients(use_file=True)
             >>> coeff = cc.get_coefficient('ALFP', 10)  # Mid-season coefficient for alfalfa
             >>> print(f"ALFP mid-season coefficient: {coeff}")
         """
-        if self.data is None:
-            raise RuntimeError("Crop coefficient data not loaded")
+        row = self._row(crop_code)
         
-        if crop_code not in self.data['by_crop_code']:
-            available_crops = list(self.data['by_crop_code'].keys())
-            raise ValueError(f"Crop code '{crop_code}' not found. Available crops: {available_crops}")
-        
-        if not (1 <= period <= 21):
+        if not (1 <= period <= NUM_PERIODS):
             raise ValueError(f"Period must be between 1 and 21, got {period}")
         
-        # Period is 1-indexed, but list is 0-indexed
-        coefficient = self.data['by_crop_code'][crop_code]['coefficients'][period - 1]
-        
-        return coefficient
+        # Period is 1-indexed, but the array is 0-indexed
+        return float(self.coefficients[row, period - 1])
     
     def get_crop_info(self, crop_code: str) -> Dict:
         """
@@ -172,19 +392,12 @@ class CropCoefficients:
             ValueError: If crop_code is not found
             
         Example:
-            >>> cc = CropCoefficients()
+            >>> cc = CropCoefficients(use_file=True)
             >>> crop_info = cc.get_crop_info('ALFP')
             >>> print(f"Description: {crop_info['description']}")
             >>> print(f"All coefficients: {crop_info['coefficients']}")
         """
-        if self.data is None:
-            raise RuntimeError("Crop coefficient data not loaded")
-        
-        if crop_code not in self.data['by_crop_code']:
-            available_crops = list(self.data['by_crop_code'].keys())
-            raise ValueError(f"Crop code '{crop_code}' not found. Available crops: {available_crops}")
-        
-        return self.data['by_crop_code'][crop_code].copy()
+        return self._entry(self._row(crop_code))
     
     def get_crop_by_curve_number(self, curve_number: int) -> Dict:
         """
@@ -200,18 +413,17 @@ class CropCoefficients:
             ValueError: If curve_number is not found
             
         Example:
-            >>> cc = CropCoefficients()
+            >>> cc = CropCoefficients(use_file=True)
             >>> crop_info = cc.get_crop_by_curve_number(1)
             >>> print(f"Crop code: {crop_info['crop_code']}")
         """
-        if self.data is None:
-            raise RuntimeError("Crop coefficient data not loaded")
+        self._check_loaded()
         
-        if curve_number not in self.data['by_curve_number']:
-            available_curves = list(self.data['by_curve_number'].keys())
-            raise ValueError(f"Curve number {curve_number} not found. Available curves: {available_curves}")
+        row = self._row_by_curve.get(curve_number)
+        if row is None:
+            raise ValueError(f"Curve number {curve_number} not found. Available curves: {self._sorted_curves}")
         
-        return self.data['by_curve_number'][curve_number].copy()
+        return self._entry(row)
     
     def list_crops(self) -> List[str]:
         """
@@ -221,14 +433,13 @@ class CropCoefficients:
             List[str]: Sorted list of available crop codes
             
         Example:
-            >>> cc = CropCoefficients()
+            >>> cc = CropCoefficients(use_file=True)
             >>> crops = cc.list_crops()
             >>> print(f"Available crops: {crops}")
         """
-        if self.data is None:
-            raise RuntimeError("Crop coefficient data not loaded")
+        self._check_loaded()
         
-        return sorted(list(self.data['by_crop_code'].keys()))
+        return list(self._sorted_codes)
     
     def list_curve_numbers(self) -> List[int]:
         """
@@ -238,14 +449,13 @@ class CropCoefficients:
             List[int]: Sorted list of available curve numbers
             
         Example:
-            >>> cc = CropCoefficients()
+            >>> cc = CropCoefficients(use_file=True)
             >>> curves = cc.list_curve_numbers()
             >>> print(f"Available curve numbers: {curves}")
         """
-        if self.data is None:
-            raise RuntimeError("Crop coefficient data not loaded")
+        self._check_loaded()
         
-        return sorted(list(self.data['by_curve_number'].keys()))
+        return list(self._sorted_curves)
     
     def get_seasonal_coefficients(self, crop_code: str) -> List[float]:
         """
@@ -261,12 +471,11 @@ class CropCoefficients:
             ValueError: If crop_code is not found
             
         Example:
-            >>> cc = CropCoefficients()
+            >>> cc = CropCoefficients(use_file=True)
             >>> coeffs = cc.get_seasonal_coefficients('ALFP')
             >>> print(f"Early season: {coeffs[0]}, Mid season: {coeffs[10]}, Late season: {coeffs[20]}")
         """
-        crop_info = self.get_crop_info(crop_code)
-        return crop_info['coefficients'].copy()
+        return self.coefficients[self._row(crop_code)].tolist()
     
     def search_crops(self, search_term: str, case_sensitive: bool = False) -> List[str]:
         """
@@ -280,21 +489,21 @@ class CropCoefficients:
             List[str]: List of matching crop codes
             
         Example:
-            >>> cc = CropCoefficients()
+            >>> cc = CropCoefficients(use_file=True)
             >>> alfalfa_crops = cc.search_crops('ALF')
             >>> grass_crops = cc.search_crops('grass', case_sensitive=False)
         """
-        if self.data is None:
-            raise RuntimeError("Crop coefficient data not loaded")
+        self._check_loaded()
         
         if not case_sensitive:
             search_term = search_term.lower()
         
         matching_crops = []
         
-        for crop_code, crop_info in self.data['by_crop_code'].items():
+        for crop_code, row in self._row_by_code.items():
+            description = self._descriptions[row]
             crop_code_check = crop_code if case_sensitive else crop_code.lower()
-            description_check = crop_info['description'] if case_sensitive else crop_info['description'].lower()
+            description_check = description if case_sensitive else description.lower()
             
             if search_term in crop_code_check or search_term in description_check:
                 matching_crops.append(crop_code)
@@ -317,18 +526,17 @@ class CropCoefficients:
             ValueError: If crop_code is not found or periods are invalid
             
         Example:
-            >>> cc = CropCoefficients()
+            >>> cc = CropCoefficients(use_file=True)
             >>> mid_season = cc.get_coefficient_range('ALFP', 8, 14)  # Mid-season range
         """
-        if not (1 <= start_period <= 21) or not (1 <= end_period <= 21):
+        if not (1 <= start_period <= NUM_PERIODS) or not (1 <= end_period <= NUM_PERIODS):
             raise ValueError("Periods must be between 1 and 21")
         
         if start_period > end_period:
             raise ValueError("Start period must be less than or equal to end period")
         
-        crop_info = self.get_crop_info(crop_code)
         # Convert to 0-indexed
-        return crop_info['coefficients'][start_period-1:end_period]
+        return self.coefficients[self._row(crop_code), start_period-1:end_period].tolist()
     
     def reload_data(self, new_file_path: Optional[str] = None) -> None:
         """
@@ -338,7 +546,7 @@ class CropCoefficients:
             new_file_path (str, optional): New file path. If None, uses existing path.
             
         Example:
-            >>> cc = CropCoefficients()
+            >>> cc = CropCoefficients(use_file=True)
             >>> cc.reload_data('/new/path/to/crop_coefficients.txt')
         """
         if new_file_path:
@@ -358,8 +566,7 @@ class CropCoefficients:
         >>> cc = CropCoefficients()
         >>> cc.save_to_database()
         """
-        if self.data is None:
-            raise RuntimeError("Crop coefficient data not loaded")
+        self._check_loaded()
     
         conn = sqlite3.connect(db_path)
         try:
@@ -390,17 +597,18 @@ class CropCoefficients:
             insert_sql += "p16, p17, p18, p19, p20, p21"
             insert_sql += ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
 
-            for crop_code, crop_info in self.data['by_crop_code'].items():
-                values = [
-                    crop_code,
-                    crop_info['curve_number'],
-                    crop_info['description']
-                    ] + crop_info['coefficients']  # Add all 21 coefficients
-
-                cursor.execute(insert_sql, values)
+            rows = [
+                [
+                    self._codes[row],
+                    self._curve_numbers[row],
+                    self._descriptions[row]
+                ] + self.coefficients[row].tolist()  # Add all 21 coefficients
+                for row in self._row_by_code.values()
+            ]
+            cursor.executemany(insert_sql, rows)
         
             conn.commit()
-            print(f"Successfully saved {len(self.data['by_crop_code'])} crop coefficients to database")
+            print(f"Successfully saved {len(rows)} crop coefficients to database")
         
         except Exception as e:
             conn.rollback()
@@ -456,6 +664,35 @@ class CropCoefficients:
         finally:
             conn.close()
        
+    def get_all_coefficients_from_database(self, db_path: str = "D:/Websites/AgWaterAPI/sqliteDBs/agrimet.db") -> Dict[str, List[float]]:
+        """
+        Get the crop coefficient curves for every crop in the SQLite database with a single query.
+    
+        Args:
+            db_path (str): Path to the SQLite database file
+        
+        Returns:
+            Dict[str, List[float]]: crop code -> list of 21 coefficient values
+        
+        Example:
+            >>> cc = CropCoefficients()
+            >>> curves = cc.get_all_coefficients_from_database()
+            >>> print(f"ALFP coefficients: {curves['ALFP']}")
+        """
+        conn = sqlite3.connect(db_path)
+        try:
+            cursor = conn.cursor()
+            query = "SELECT crop_code, p1, p2, p3, p4, p5, p6, p7, p8, p9, p10,"
+            query += "p11, p12, p13, p14, p15, p16, p17, p18, p19, p20, p21"
+            query += " FROM CropCoefficients"
+            cursor.execute(query)
+            return {row[0]: list(row[1:]) for row in cursor.fetchall()}
+
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Database error: {e}")
+        finally:
+            conn.close()
+
     def get_crop_dates(self, station):
         """
         Retrieves the planting_date, full_cover, and termination_date for the given crop and station.
@@ -463,7 +700,7 @@ class CropCoefficients:
         try:
             url = f"https://www.usbr.gov/pn/agrimet/chart/{station}ch.txt"
 
-            response = requests.get(url)
+            response = requests.get(url, timeout=10)
             response.raise_for_status()
             content = response.text
             #globals.agrimet_logger.info(f"Fetched Crop Water Use data for station {station}")
@@ -497,125 +734,83 @@ class CropCoefficients:
 
 
 
-    def compute_crop_ets(self, hist_station_data, crop_codes):
+    def compute_crop_kc_etc(self, dates, etrs, crop_codes, crop_dates, kc_curves=None):
+        """
+        Vectorized Kc and ETc arrays for several crops over the same days.
+        Args:
+            dates: array-like of dates (datetime64[D] or 'YYYY-MM-DD' strings)
+            etrs: array-like of daily ETrs (in/day), measured or estimated; NaN where missing
+            crop_codes: list of strings - crop identifiers (e.g., 'ALFM')
+            crop_dates: result of get_crop_dates() for the station, or None
+            kc_curves: optional result of get_all_coefficients_from_database(); read from the database when not given
+        Returns:
+            dict: crop_code -> (Kc array, ETc array), or None for crops without a Kc curve or crop dates
+        """
+        crop_dates_by_code = {cd['crop_code']: cd for cd in crop_dates['crop_dates']} if crop_dates else {}
+        if kc_curves is None:
+            # one query for all the Kc curves, then one vectorized pass over the days per crop
+            kc_curves = self.get_all_coefficients_from_database()
+
+        crop_results = {}  # key= crop_code, value = (Kc array, ETc array) or None
+        for crop in crop_codes:
+            crop_date = crop_dates_by_code.get(crop)
+            kc_curve = kc_curves.get(crop)
+            if kc_curve is None or crop_date is None or crop_date['planting_date'] is None or crop_date['full_cover_date'] is None or crop_date['termination_date'] is None:
+                crop_results[crop] = None
+                continue
+            crop_results[crop] = compute_kc_etc(dates, etrs, kc_curve, crop_date['planting_date'], crop_date['full_cover_date'], crop_date['termination_date'])
+        return crop_results
+
+    def compute_crop_ets(self, hist_station_data, crop_codes, crop_dates=None):
         """
         Computes daily crop coefficient (Kc) and crop evapotranspiration (ETc) for a given crop and weather station data.
         Args:
             hist_station_data: List of tuples or dicts with daily weather data (must include 'Date' and 'ETRS' fields)
             crop_codes: list of strings - crop identifiers (e.g., 'ALFM')
+            crop_dates: optional result of get_crop_dates() for the station; fetched from USBR only when None.
+                        An empty result (e.g. {'crop_dates': []} when USBR is down) is used as is, and
+                        Kc and ETc are then None for every crop.
         Returns:
             results:         results is an array, one element for each day of data in the hist_station_data.  e.g.
                 [{date: 'YYYY-MM-DD', 'crop_results': {crop_code1: {Kc: ..., ETc: ...}, crop_code2: {Kc: ..., ETc: ...}, ...}}]
         """
-        # iterate through dates from historical dataset
-        # for each day (array):
-        #     for each crop (array):
-        #         add dictionary with date, Kc, and ETc for that crop
-        # crops - for each crop, get kc_curve and growth stage days
-        # kc_curve should be a list of 21 Kc values, indexed 0..20
-        i=0
-
-        def to_date(date_str):
-            """Convert date string to datetime.date object."""
-            if isinstance(date_str, datetime.date):
-                return date_str
-            return datetime.datetime.strptime(date_str, '%Y-%m-%d').date()
-
         if not hist_station_data:
             return []
         
         station = hist_station_data[0][0]
-        crop_dates = self.get_crop_dates(station)
+        if crop_dates is None:
+            crop_dates = self.get_crop_dates(station)
 
-        results = []
-        for row in hist_station_data:
-            date_str = row[1]
-            etrs = row[3]
-            if not date_str or not etrs:
-                continue
+        # keep only days with a date and an ETrs value
+        rows = [row for row in hist_station_data if row[1] and row[3]]
+        date_strs = [str(row[1])[:10] for row in rows]
+        dates = np.array(date_strs, dtype='datetime64[D]')
+        etrs = np.array([_to_float(row[3]) for row in rows], dtype=np.float64)
+
+        crop_results = self.compute_crop_kc_etc(dates, etrs, crop_codes, crop_dates)
 
+        results = []
+        for i, date_str in enumerate(date_strs):
             crop_result = {}  # key= crop_code, value = {'Kc': ..., 'ETc': ...}
-            date = to_date(date_str)  # Convert date string to datetime.date object 
-            
-            for crop in crop_codes:
-                kc_curve = self.get_coefficients_from_database(crop)
-
-                # Calculate the number of days in each growth stage
-                _crop_dates = crop_dates['crop_dates']
-                # find the crop dates for this crop
-                crop_date = next(filter(lambda x: x['crop_code'] == crop, _crop_dates), None)
-
-                if crop_date != None and crop_date['planting_date'] is not None and crop_date['full_cover_date'] is not None and crop_date['termination_date'] is not None:
-                    planting_date = crop_date['planting_date']
-                    planting_date = datetime.datetime.strptime(planting_date, '%m/%d').date()
-                    
-                    full_cover_date = crop_date['full_cover_date']
-                    full_cover_date = datetime.datetime.strptime(full_cover_date, '%m/%d').date()
-                    termination_date = crop_date['termination_date']
-                    termination_date = datetime.datetime.strptime(termination_date, '%m/%d').date()
-
-                    total_days = (termination_date - planting_date).days
-                    cover_days = (full_cover_date - planting_date).days
-                    term_days = (termination_date - full_cover_date).days
-                
-                    if date < planting_date or date > termination_date:
-                        gs_percent = 0
-                    
-                    else:
-                        # Determine growth stage percent (0-200)
-                        if date <= full_cover_date:
-                            # From planting to full cover: 0% to 100%
-                            gs_percent = 100 * (date - planting_date).days / cover_days if cover_days > 0 else 0
-                        else:
-                            # From full cover to terminate: 100% to 200%
-                            gs_percent = 100 + 100 * (date - full_cover_date).days / term_days if term_days > 0 else 100
-
-                    # Clamp percent to [0, 200]
-                    gs_percent = max(0, min(200, gs_percent))
-
-                    # Interpolate Kc from kc_curve (21 points: 0, 10, ..., 200)
-                    idx_float = gs_percent / 10
-                    idx_low = int(idx_float)
-                    idx_high = min(idx_low + 1, 20)
-                    kc_low = kc_curve[idx_low]
-                    kc_high = kc_curve[idx_high]
-                    kc = kc_low + (kc_high - kc_low) * (idx_float - idx_low)
-
-                    # Compute ETc
-                    try:
-                        etrs_val = float(etrs)
-                    except Exception:
-                        continue
-                    etc = etrs_val * kc  # ETrs is in in/day, Kc is unitless, this is for the day being processed only.
-
-                    # Append result for this crop
-                    crop_result[crop] = {
-                        'Kc': round(kc, 4),
-                        'ETc': round(etc, 4)
-                    }
+            for crop, kc_etc in crop_results.items():
+                if kc_etc is None or np.isnan(kc_etc[1][i]):
+                    crop_result[crop] = {'Kc': None, 'ETc': None}
                 else:
-                    crop_result[crop] = {
-                        'Kc': None,
-                        'ETc': None
-                    }
+                    crop_result[crop] = {'Kc': round(float(kc_etc[0][i]), 4), 'ETc': round(float(kc_etc[1][i]), 4)}
 
             # Append the date and crop results to the final results
-            results.append({date: date_str, 'crop_results':crop_result})  # append array of crop results for this date
+            results.append({'date': date_str, 'crop_results': crop_result})  # append array of crop results for this date
 
         return results   # results: [{date: 'YYYY-MM-DD', 'crop_results': {crop_code1: {Kc: ..., ETc: ...}, crop_code2: {Kc: ..., ETc: ...}, ...}}]
 
 
     def __len__(self) -> int:
         """Return the number of crop coefficient curves loaded."""
-        if self.data is None:
-            return 0
-        return len(self.data['by_crop_code'])
+        return len(self._row_by_code)
     
     def __contains__(self, crop_code: str) -> bool:
         """Check if a crop code exists in the loaded data."""
-        if self.data is None:
-            return False
-        return crop_code in self.data['by_crop_code']
+        return crop_code in self._row_by_code
     
     def __getitem__(self, crop_code: str) -> Dict:
         """Allow dictionary-style access to crop information."""
@@ -623,15 +818,14 @@ class CropCoefficients:
     
     def __repr__(self) -> str:
         """Return a string representation of the CropCoefficients object."""
-        num_crops = len(self) if self.data else 0
-        return f"CropCoefficients(file_path='{self.file_path}', crops_loaded={num_crops})"
+        return f"CropCoefficients(file_path='{self.file_path}', crops_loaded={len(self)})"
 
 
 # Example usage and testing
 if __name__ == "__main__":
     try:
         # Initialize the crop coefficients
-        cc = CropCoefficients()
+        cc = CropCoefficients(use_file=True)
         
         cc.save_to_database()  # Save to database for the first time
         # Load from database
@@ -0,0 +1,281 @@
+"""
+Multi-year ETc reanalysis job.
+
+Recomputes daily Kc and ETc for every station in crops_by_station.json and every crop grown
+there, over the full daily_climate_data history, and bulk-writes the results to the
+daily_crop_et table of the AgriMet database. Run it after Kc curves or crop calendars change.
+
+The crop calendars are read from each station's USBR crop chart up front, and together with the Kc
+curves they determine the default run id. Work is partitioned by station across a process pool. Each worker pages through its station's
+climate rows in date order, chunk_size rows at a time, computes ETc for all of its crops with the
+vectorized compute_kc_etc(), and writes the chunk's results together with its checkpoint in one
+transaction. An interrupted run picks up after the last committed chunk when started again with
+the same run id.
+
+Usage:
+    python -m agrimet.etc_reanalysis --db d:/Websites/AgWaterAPI/sqliteDBs/agrimet.db --workers 4
+    python -m agrimet.etc_reanalysis --stations abei,crvo --run-id kc-2025 --restart
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from agrimet.crop_coefficients import CropCoefficients, compute_kc_etc, _to_float
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.environ.get('AGRIMET_DB_PATH', 'd:/Websites/AgWaterAPI/sqliteDBs/agrimet.db')
+CROPS_BY_STATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crops_by_station.json')
+DEFAULT_CHUNK_SIZE = 5000
+CALENDAR_FETCH_THREADS = 8
+
+RESULTS_TABLE = 'daily_crop_et'
+CHECKPOINT_TABLE = 'etc_reanalysis_checkpoints'
+
+
+def ensure_tables(db_path):
+    """Create the results and checkpoint tables if they don't exist."""
+    conn = sqlite3.connect(db_path, timeout=60)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {RESULTS_TABLE} (
+                Station TEXT NOT NULL,
+                Date TEXT NOT NULL,
+                crop_code TEXT NOT NULL,
+                Kc REAL,
+                ETc REAL,
+                PRIMARY KEY (Station, Date, crop_code)
+            )
+        """)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+                run_id TEXT NOT NULL,
+                station TEXT NOT NULL,
+                last_date TEXT,
+                rows_written INTEGER DEFAULT 0,
+                status TEXT NOT NULL,
+                message TEXT,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (run_id, station)
+            )
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def load_crops_by_station(path=CROPS_BY_STATION_PATH):
+    """Returns {station: [crop codes]} from crops_by_station.json."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_crop_calendars(crops_by_station, kc_curves):
+    """
+    Returns {station: {crop code: (planting, full cover, termination)}} from each station's USBR crop
+    chart, for the crops grown there that have a Kc curve, or None for a station whose chart is unavailable.
+    """
+    def calendar(station, crop_codes):
+        crop_dates = CropCoefficients().get_crop_dates(station)
+        if not crop_dates:
+            return None
+        return {
+            cd['crop_code']: (cd['planting_date'], cd['full_cover_date'], cd['termination_date'])
+            for cd in crop_dates['crop_dates']
+            if cd['crop_code'] in crop_codes and cd['crop_code'] in kc_curves
+        }
+
+    with ThreadPoolExecutor(max_workers=CALENDAR_FETCH_THREADS) as pool:
+        futures = {station: pool.submit(calendar, station, crop_codes) for station, crop_codes in crops_by_station.items()}
+    return {station: future.result() for station, future in futures.items()}
+
+
+def default_run_id(kc_curves, crop_calendars):
+    """A run id derived from the Kc curves and crop calendars, so changing either starts a fresh run."""
+    digest = hashlib.sha1(json.dumps([kc_curves, crop_calendars], sort_keys=True).encode('utf-8')).hexdigest()
+    return f"kc-{digest[:12]}"
+
+
+def _save_checkpoint(conn, run_id, station, last_date, rows_written, status, message=None):
+    conn.execute(
+        f"INSERT OR REPLACE INTO {CHECKPOINT_TABLE} (run_id, station, last_date, rows_written, status, message, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+        (run_id, station, last_date, rows_written, status, message),
+    )
+
+
+def reanalyze_station(db_path, run_id, station, seasons, kc_curves, chunk_size=DEFAULT_CHUNK_SIZE,
+                      start_date=None, end_date=None):
+    """
+    Recompute Kc/ETc for one station. Runs in a worker process.
+
+    Args:
+        seasons (dict): The station's crop calendar (see load_crop_calendars), or None if it is unavailable
+
+    Returns:
+        dict: {'station', 'status' ('done', 'skipped' or 'failed'), 'rows_written', 'message'}
+    """
+    rows_written = 0
+    last_date = None
+    conn = sqlite3.connect(db_path, timeout=60)
+    try:
+        row = conn.execute(
+            f"SELECT last_date, rows_written, status FROM {CHECKPOINT_TABLE} WHERE run_id = ? AND station = ?",
+            (run_id, station),
+        ).fetchone()
+        if row is not None and row[2] == 'done':
+            return {'station': station, 'status': 'skipped', 'rows_written': row[1], 'message': 'already done'}
+        if row is not None:
+            last_date, rows_written = row[0], row[1] or 0
+
+        # The crop calendar (planting, full cover, termination) comes from the station's USBR chart
+        if seasons is None:
+            message = 'crop dates unavailable from USBR'
+            _save_checkpoint(conn, run_id, station, last_date, rows_written, 'failed', message)
+            conn.commit()
+            return {'station': station, 'status': 'failed', 'rows_written': rows_written, 'message': message}
+
+        # resume strictly after the last committed date, otherwise start at start_date (inclusive)
+        bound_op, bound = ('>', last_date) if last_date else ('>=', start_date or '')
+        # Date is stored as 'YYYY-MM-DD HH:MM:SS', so a bare end date would leave out its own day
+        end_clause = " AND Date <= ?" if end_date else ""
+        end_params = [end_date[:10] + " 23:59:59"] if end_date else []
+
+        while True:
+            # keyset pagination: each chunk is a short read starting after the last committed date
+            query = (f"SELECT Date, ETRS FROM daily_climate_data WHERE Station = ? AND Date {bound_op} ?{end_clause} "
+                     "ORDER BY Date ASC LIMIT ?")
+            chunk = conn.execute(query, [station, bound] + end_params + [chunk_size]).fetchall()
+            if not chunk:
+                break
+
+            date_strs = [str(r[0])[:10] for r in chunk]
+            dates = np.array(date_strs, dtype='datetime64[D]')
+            etrs = np.array([_to_float(r[1]) for r in chunk], dtype=np.float64)
+
+            results = []
+            for crop, (planting, cover, termination) in seasons.items():
+                kc, etc = compute_kc_etc(dates, etrs, kc_curves[crop], planting, cover, termination)
+                kc = np.round(kc, 4)
+                etc = np.round(etc, 4)
+                results.extend(
+                    (station, d, crop, k, None if np.isnan(e) else e)
+                    for d, k, e in zip(date_strs, kc.tolist(), etc.tolist())
+                )
+
+            last_date = str(chunk[-1][0])
+            rows_written += len(results)
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {RESULTS_TABLE} (Station, Date, crop_code, Kc, ETc) VALUES (?, ?, ?, ?, ?)",
+                    results,
+                )
+                _save_checkpoint(conn, run_id, station, last_date, rows_written, 'running')
+
+            bound_op, bound = '>', last_date
+
+        _save_checkpoint(conn, run_id, station, last_date, rows_written, 'done')
+        conn.commit()
+        return {'station': station, 'status': 'done', 'rows_written': rows_written, 'message': None}
+
+    except Exception as e:
+        try:
+            conn.rollback()
+            _save_checkpoint(conn, run_id, station, last_date, rows_written, 'failed', str(e))
+            conn.commit()
+        except sqlite3.Error:
+            pass
+        return {'station': station, 'status': 'failed', 'rows_written': rows_written, 'message': str(e)}
+    finally:
+        conn.close()
+
+
+def run(db_path=DEFAULT_DB_PATH, stations=None, workers=None, run_id=None, restart=False,
+        chunk_size=DEFAULT_CHUNK_SIZE, start_date=None, end_date=None):
+    """
+    Run the reanalysis across a process pool, one station per task.
+
+    Args:
+        db_path (str): Path to the AgriMet SQLite database
+        stations (list[str], optional): Stations to process. Defaults to every station in crops_by_station.json
+        workers (int, optional): Number of worker processes. Defaults to os.cpu_count()
+        run_id (str, optional): Checkpoint namespace. Defaults to a hash of the current Kc curves and crop calendars
+        restart (bool): Discard this run's checkpoints and start over
+        chunk_size (int): Climate rows per chunk
+        start_date, end_date (str, optional): Limit the reanalysis to a 'YYYY-MM-DD' date range
+
+    Returns:
+        list[dict]: one summary per station
+    """
+    ensure_tables(db_path)
+    crops_by_station = load_crops_by_station()
+    if stations:
+        crops_by_station = {s: crops_by_station[s] for s in stations if s in crops_by_station}
+
+    kc_curves = CropCoefficients().get_all_coefficients_from_database(db_path)
+    crop_calendars = load_crop_calendars(crops_by_station, kc_curves)
+    run_id = run_id or default_run_id(kc_curves, crop_calendars)
+
+    if restart:
+        conn = sqlite3.connect(db_path, timeout=60)
+        with conn:
+            conn.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE run_id = ?", (run_id,))
+        conn.close()
+
+    logger.info(f"ETc reanalysis run {run_id}: {len(crops_by_station)} stations, {workers or os.cpu_count()} workers")
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(reanalyze_station, db_path, run_id, station, crop_calendars[station], kc_curves,
+                        chunk_size, start_date, end_date)
+            for station in crops_by_station
+        ]
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries.append(summary)
+            logger.info(f"{summary['station']}: {summary['status']}, {summary['rows_written']} rows"
+                        + (f" ({summary['message']})" if summary['message'] else ''))
+
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute multi-year daily crop ETc for AgriMet stations.")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="Path to the AgriMet SQLite database")
+    parser.add_argument('--stations', help="Comma-separated station ids (default: all in crops_by_station.json)")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--run-id', default=None, help="Checkpoint run id (default: derived from the Kc curves and crop calendars)")
+    parser.add_argument('--restart', action='store_true', help="Ignore existing checkpoints for this run id")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Climate rows per chunk")
+    parser.add_argument('--start-date', default=None, help="First date to recompute (YYYY-MM-DD)")
+    parser.add_argument('--end-date', default=None, help="Last date to recompute (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    summaries = run(
+        db_path=args.db,
+        stations=args.stations.split(',') if args.stations else None,
+        workers=args.workers,
+        run_id=args.run_id,
+        restart=args.restart,
+        chunk_size=args.chunk_size,
+        start_date=args.start_date,
+        end_date=args.end_date,
+    )
+    failed = [s for s in summaries if s['status'] == 'failed']
+    print(f"Reanalysis finished: {len(summaries) - len(failed)} stations ok, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,224 @@
+"""
+Incremental regeneration of the multi-year daily ETc summaries in histEtSummaries.
+
+Each <station>_summary.csv holds, for every MM/DD of the growing season, the average daily ETc of
+each crop grown at the station over all available years. The summaries are rebuilt from the
+daily_climate_data table of the AgriMet database.
+
+A consolidated manifest.json in the output directory records the last climate date and row count
+each summary was built from. Only stations whose climate data has changed since then are rebuilt
+(all of them with --force). Work is partitioned by station across a process pool; each worker
+computes in-season ETc for all of its crops with the vectorized compute_kc_etc() and averages it
+by day of year with one grouped aggregation. CSVs and the manifest are written atomically, so
+readers never see a partially written file.
+
+Usage:
+    python -m agrimet.hist_et_summaries --db d:/Websites/AgWaterAPI/sqliteDBs/agrimet.db --workers 4
+    python -m agrimet.hist_et_summaries --stations abei,crvo --force
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from agrimet.crop_coefficients import CropCoefficients, compute_kc_etc, growth_stage_percent, _to_float
+from agrimet.etc_reanalysis import DEFAULT_DB_PATH, load_crops_by_station
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT_DIR = os.environ.get(
+    'AGRIMET_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'histEtSummaries')
+)
+MANIFEST_FILE = 'manifest.json'
+DECIMALS = 3
+
+
+def _write_atomic(path, text):
+    """Write text to path via a temporary file and an atomic rename."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(output_dir=DEFAULT_OUTPUT_DIR):
+    """Returns the manifest ({'generated', 'stations': {station: {...}}}), or an empty one."""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'generated': None, 'stations': {}}
+
+
+def get_station_data_versions(db_path, stations):
+    """Returns {station: (last_date, row_count)} of the daily_climate_data rows for each station."""
+    conn = sqlite3.connect(db_path, timeout=60)
+    try:
+        placeholders = ','.join('?' * len(stations))
+        rows = conn.execute(
+            f"SELECT Station, MAX(Date), COUNT(*) FROM daily_climate_data WHERE Station IN ({placeholders}) GROUP BY Station",
+            list(stations),
+        ).fetchall()
+    finally:
+        conn.close()
+    return {station: (str(last_date)[:10], count) for station, last_date, count in rows}
+
+
+def summarize_station(db_path, output_dir, station, crop_codes, kc_curves):
+    """
+    Rebuild one station's summary CSV. Runs in a worker process.
+
+    Returns:
+        dict: {'station', 'status' ('done' or 'failed'), 'crops', 'days', 'file', 'message'}
+    """
+    file_name = f"{station}_summary.csv"
+    try:
+        # The crop calendar (planting, full cover, termination) comes from the station's USBR chart
+        crop_dates = CropCoefficients().get_crop_dates(station)
+        if not crop_dates:
+            return {'station': station, 'status': 'failed', 'crops': [], 'days': 0, 'file': file_name,
+                    'message': 'crop dates unavailable from USBR'}
+
+        conn = sqlite3.connect(db_path, timeout=60)
+        try:
+            rows = conn.execute(
+                "SELECT Date, ETRS FROM daily_climate_data WHERE Station = ? ORDER BY Date ASC", (station,)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        dates = np.array([str(r[0])[:10] for r in rows], dtype='datetime64[D]')
+        etrs = np.array([_to_float(r[1]) for r in rows], dtype=np.float64)
+
+        # one column per crop: ETc on in-season days, NaN elsewhere, so the averages cover the season only
+        columns = {}
+        for cd in crop_dates['crop_dates']:
+            crop = cd['crop_code']
+            if crop not in crop_codes or crop not in kc_curves:
+                continue
+            season = (cd['planting_date'], cd['full_cover_date'], cd['termination_date'])
+            _, etc = compute_kc_etc(dates, etrs, kc_curves[crop], *season)
+            _, in_season = growth_stage_percent(dates, *season)
+            columns[crop] = np.where(in_season, etc, np.nan)
+
+        crops = sorted(columns)
+        df = pd.DataFrame({crop: columns[crop] for crop in crops})
+        df['DATE'] = pd.to_datetime(dates).strftime('%m/%d')
+        summary = df.groupby('DATE', sort=True)[crops].mean().round(DECIMALS).dropna(how='all')
+
+        header = (
+            f"# Station Code,{station}\n"
+            "# Type,Multi-year daily averages\n"
+            f"# Generated,{datetime.datetime.now():%Y-%m-%d %H:%M:%S}\n"
+            "# Note,Averages calculated from all available years\n"
+            "\n"
+        )
+        _write_atomic(os.path.join(output_dir, file_name), header + summary.to_csv(lineterminator='\n'))
+
+        return {'station': station, 'status': 'done', 'crops': crops, 'days': len(summary), 'file': file_name,
+                'message': None}
+
+    except Exception as e:
+        return {'station': station, 'status': 'failed', 'crops': [], 'days': 0, 'file': file_name, 'message': str(e)}
+
+
+def run(db_path=DEFAULT_DB_PATH, output_dir=DEFAULT_OUTPUT_DIR, stations=None, workers=None, force=False):
+    """
+    Rebuild the summaries of stations whose climate data changed since the last run.
+
+    Args:
+        db_path (str): Path to the AgriMet SQLite database
+        output_dir (str): Directory holding the summary CSVs and manifest.json
+        stations (list[str], optional): Stations to consider. Defaults to every station in crops_by_station.json
+        workers (int, optional): Number of worker processes. Defaults to os.cpu_count()
+        force (bool): Rebuild every station regardless of the manifest
+
+    Returns:
+        list[dict]: one summary per rebuilt station
+    """
+    crops_by_station = load_crops_by_station()
+    if stations:
+        crops_by_station = {s: crops_by_station[s] for s in stations if s in crops_by_station}
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    versions = get_station_data_versions(db_path, crops_by_station)
+
+    pending = {}
+    for station, crop_codes in crops_by_station.items():
+        if station not in versions:
+            continue
+        last_date, row_count = versions[station]
+        entry = manifest['stations'].get(station)
+        if force or entry is None or (entry.get('last_date'), entry.get('row_count')) != (last_date, row_count) \
+                or not os.path.exists(os.path.join(output_dir, entry.get('file', ''))):
+            pending[station] = crop_codes
+
+    logger.info(f"ETc summaries: {len(pending)} of {len(crops_by_station)} stations need rebuilding, "
+                f"{workers or os.cpu_count()} workers")
+    if not pending:
+        return []
+
+    kc_curves = CropCoefficients().get_all_coefficients_from_database(db_path)
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(summarize_station, db_path, output_dir, station, crop_codes, kc_curves)
+            for station, crop_codes in pending.items()
+        ]
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries.append(summary)
+            logger.info(f"{summary['station']}: {summary['status']}, {summary['days']} days"
+                        + (f" ({summary['message']})" if summary['message'] else ''))
+
+            if summary['status'] == 'done':
+                last_date, row_count = versions[summary['station']]
+                manifest['stations'][summary['station']] = {
+                    'last_date': last_date,
+                    'row_count': row_count,
+                    'generated': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'crops': summary['crops'],
+                    'file': summary['file'],
+                }
+
+    manifest['generated'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    manifest['stations'] = dict(sorted(manifest['stations'].items()))
+    _write_atomic(os.path.join(output_dir, MANIFEST_FILE), json.dumps(manifest, indent=2))
+
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regenerate the multi-year daily ETc summary CSVs for AgriMet stations.")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="Path to the AgriMet SQLite database")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help="Directory for the summary CSVs and manifest")
+    parser.add_argument('--stations', help="Comma-separated station ids (default: all in crops_by_station.json)")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="Rebuild every station, not only those with new data")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    summaries = run(
+        db_path=args.db,
+        output_dir=args.output_dir,
+        stations=args.stations.split(',') if args.stations else None,
+        workers=args.workers,
+        force=args.force,
+    )
+    failed = [s for s in summaries if s['status'] == 'failed']
+    print(f"ETc summaries finished: {len(summaries) - len(failed)} stations rebuilt, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,6 +2,7 @@ from flask import Flask, request
 import os
 from routes import misc_bp, email_bp, agrimet_bp, llm_bp, articles_bp, data_bp, cms_bp
 from config import config_by_name
+from services.llm_service import start_model_manager, migrate_llm_schema, get_rating_writer, resume_ingest_jobs
 from dotenv import load_dotenv
 import globals
 
@@ -38,6 +39,22 @@ app.register_blueprint(misc_bp)
 app.register_blueprint(cms_bp)
 app.register_blueprint(agrimet_bp)
 
+# Create or upgrade the LLM tables, re-queue source ingestion abandoned by an earlier run, and start the
+# rating writer (which replays ratings spooled by an earlier run)
+with app.app_context():
+    try:
+        migrate_llm_schema()
+    except Exception as e:
+        globals.llm_logger.error(f"LLM schema migration failed: {e}")
+    try:
+        resume_ingest_jobs()
+    except Exception as e:
+        globals.llm_logger.error(f"Could not resume LLM ingest jobs: {e}")
+    get_rating_writer()
+
+# Warm up the default LLM in the background so the first chat request doesn't pay the model load
+start_model_manager(app)
+
 @app.route('/')
 def index():
     return "Welcome to the Ag Water API!"
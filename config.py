@@ -1,4 +1,5 @@
 import os
+import json
 
 class Config:
     """Base configuration with default settings."""
@@ -14,6 +15,115 @@ class Config:
     AGRIMET_DB_PATH = os.environ.get('AGRIMET_DB_PATH', 'd:/Websites/AgWaterAPI/sqliteDBs/Agrimet.db')
     AGRIMET_DATA_DIR = os.environ.get('AGRIMET_DATA_DIR', 'd:/Websites/AgWaterAPI/agrimet/histEtSummaries')
     IRRIGATION_DB_PATH = os.environ.get('IRRIGATION_DB_PATH', 'D:/Websites/AgWaterWebsite/src/pages/IrrigUseNW/Data/IrrigUse.sqlite')
+    USBR_MAP_PATH = os.environ.get('USBR_MAP_PATH', 'd:/Websites/AgWaterAPI/agrimet/usbr_map.json')
+    CROPS_BY_STATION_PATH = os.environ.get('CROPS_BY_STATION_PATH', 'd:/Websites/AgWaterAPI/agrimet/crops_by_station.json')
+
+    # Interpolated ETc (/agrimet/etc_at): neighbor count and fractional ETc change per 1000 ft of elevation difference
+    ETC_INTERPOLATION_NEIGHBORS = int(os.environ.get('ETC_INTERPOLATION_NEIGHBORS', 4))
+    ETC_ELEVATION_FACTOR = float(os.environ.get('ETC_ELEVATION_FACTOR', -0.01))
+
+    # Forecast ETc projection: ratio applied to the (grass reference) Hargreaves estimate to get alfalfa reference ETrs
+    HARGREAVES_ETR_RATIO = float(os.environ.get('HARGREAVES_ETR_RATIO', 1.2))
+
+    # Upstream (USBR AgriMet, api.weather.gov) timeouts, circuit breakers and stale-while-revalidate caching
+    UPSTREAM_TIMEOUT = float(os.environ.get('UPSTREAM_TIMEOUT', 10))
+    UPSTREAM_FAILURE_THRESHOLD = int(os.environ.get('UPSTREAM_FAILURE_THRESHOLD', 3))
+    UPSTREAM_RESET_SECONDS = float(os.environ.get('UPSTREAM_RESET_SECONDS', 60))
+    UPSTREAM_MAX_STALE_SECONDS = int(os.environ.get('UPSTREAM_MAX_STALE_SECONDS', 86400))
+    NWS_FORECAST_TTL = int(os.environ.get('NWS_FORECAST_TTL', 1800))
+    USBR_CHART_TTL = int(os.environ.get('USBR_CHART_TTL', 3600))
+
+    # ChromaDB vector database used for LLM retrieval
+    CHROMADB_HOST = os.environ.get('CHROMADB_HOST', 'localhost')
+    CHROMADB_PORT = int(os.environ.get('CHROMADB_PORT', 8100))
+    CHROMADB_HEALTHCHECK_SECONDS = float(os.environ.get('CHROMADB_HEALTHCHECK_SECONDS', 30))
+
+    # Cache of retrieval results (query -> chunks), in memory and in a SQLite file shared by worker processes
+    RETRIEVAL_CACHE_ENABLED = os.environ.get('RETRIEVAL_CACHE_ENABLED', '1') == '1'
+    RETRIEVAL_CACHE_PATH = os.environ.get('RETRIEVAL_CACHE_PATH', 'D:/AgWaterLLM/retrieval_cache.db')
+    RETRIEVAL_CACHE_SIZE = int(os.environ.get('RETRIEVAL_CACHE_SIZE', 1024))
+
+    # RAG retrieval: chunks per prompt, and hybrid vector + BM25 keyword search with reciprocal-rank fusion
+    RAG_TOP_N = int(os.environ.get('RAG_TOP_N', 6))
+    HYBRID_RETRIEVAL_ENABLED = os.environ.get('HYBRID_RETRIEVAL_ENABLED', '1') == '1'
+    HYBRID_CANDIDATE_MULTIPLIER = int(os.environ.get('HYBRID_CANDIDATE_MULTIPLIER', 3))
+    HYBRID_RRF_K = int(os.environ.get('HYBRID_RRF_K', 60))
+
+    # Prompt token budgets (estimated tokens) for RAG chat, per model name with a default; the last
+    # LLM_RECENT_TURNS question/answer pairs are kept verbatim, older ones are summarized or dropped
+    LLM_PROMPT_TOKEN_BUDGET = int(os.environ.get('LLM_PROMPT_TOKEN_BUDGET', 3000))
+    LLM_PROMPT_TOKEN_BUDGETS = json.loads(os.environ.get('LLM_PROMPT_TOKEN_BUDGETS', '{}'))
+    LLM_RECENT_TURNS = int(os.environ.get('LLM_RECENT_TURNS', 2))
+
+    # Opt-in cache of LLM answers for identical (model, prompt, context, history, query); answers rated
+    # at or below ANSWER_CACHE_MIN_RATING are evicted
+    ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', '0') == '1'
+    ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', 500))
+    ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', 86400))
+    ANSWER_CACHE_MIN_RATING = int(os.environ.get('ANSWER_CACHE_MIN_RATING', 2))
+    ANSWER_CACHE_RATING_CHECK_SECONDS = float(os.environ.get('ANSWER_CACHE_RATING_CHECK_SECONDS', 60))
+
+    # Seconds before the in-memory LLM_Sources catalog (titles and tags by filename) is reloaded
+    SOURCES_CATALOG_TTL = int(os.environ.get('SOURCES_CATALOG_TTL', 300))
+
+    # /llm/source serves PDFs from LLM_SOURCE_MATERIALS_DIR, resolving names through an index of the directory
+    # (rebuilt every LLM_SOURCE_INDEX_TTL seconds); browsers may cache them for LLM_SOURCE_MAX_AGE seconds and
+    # revalidate with the ETag. USE_X_SENDFILE=1 hands the transfer to a front-end server that supports X-Sendfile
+    LLM_SOURCE_MATERIALS_DIR = os.environ.get('LLM_SOURCE_MATERIALS_DIR', 'D:/AgWaterLLM/source_materials')
+    # Uploaded sources are stored in LLM_UPLOAD_FOLDER as <source id>_<filename> and served from there too
+    LLM_UPLOAD_FOLDER = os.environ.get('LLM_UPLOAD_FOLDER', 'D:\\AgWaterLLM\\uploads')
+    LLM_SOURCE_INDEX_TTL = int(os.environ.get('LLM_SOURCE_INDEX_TTL', 300))
+    LLM_SOURCE_MAX_AGE = int(os.environ.get('LLM_SOURCE_MAX_AGE', 604800))
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '0') == '1'
+
+    # Ingestion of uploaded sources: characters per chunk, overlap between consecutive chunks, and
+    # chunks embedded and upserted into ChromaDB per batch
+    INGEST_CHUNK_CHARS = int(os.environ.get('INGEST_CHUNK_CHARS', 1000))
+    INGEST_CHUNK_OVERLAP = int(os.environ.get('INGEST_CHUNK_OVERLAP', 200))
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 64))
+    # Jobs left queued or running without an update for this long are re-queued at startup (their worker exited)
+    INGEST_JOB_STALE_SECONDS = int(os.environ.get('INGEST_JOB_STALE_SECONDS', 3600))
+
+    # Ratings are written in the background, one transaction per LLM_RATINGS_FLUSH_MS or LLM_RATINGS_BATCH_SIZE
+    # rows; batches that can't be written are kept in the spool file and retried
+    LLM_RATINGS_FLUSH_MS = int(os.environ.get('LLM_RATINGS_FLUSH_MS', 200))
+    LLM_RATINGS_BATCH_SIZE = int(os.environ.get('LLM_RATINGS_BATCH_SIZE', 100))
+    LLM_RATINGS_SPOOL_PATH = os.environ.get('LLM_RATINGS_SPOOL_PATH', 'D:/AgWaterLLM/ratings.spool')
+
+    # Admission control for LLM generation (per worker process): concurrent ollama.chat calls, how many
+    # requests may wait per queue (streaming chat, non-streaming chat, /llm/test) before new ones get a 429,
+    # and how long a queued request waits before giving up with a 503
+    LLM_MAX_CONCURRENT_GENERATIONS = int(os.environ.get('LLM_MAX_CONCURRENT_GENERATIONS', 2))
+    LLM_MAX_QUEUED_STREAM = int(os.environ.get('LLM_MAX_QUEUED_STREAM', 16))
+    LLM_MAX_QUEUED_SYNC = int(os.environ.get('LLM_MAX_QUEUED_SYNC', 16))
+    LLM_MAX_QUEUED_TEST = int(os.environ.get('LLM_MAX_QUEUED_TEST', 2))
+    LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', 120))
+    LLM_QUEUE_STATUS_INTERVAL = float(os.environ.get('LLM_QUEUE_STATUS_INTERVAL', 1.0))
+
+    # Streamed answers: tokens are merged into one frame per LLM_STREAM_FLUSH_MS milliseconds or
+    # LLM_STREAM_FLUSH_BYTES bytes (0 and 0 send every token as its own frame)
+    LLM_STREAM_FLUSH_MS = int(os.environ.get('LLM_STREAM_FLUSH_MS', 50))
+    LLM_STREAM_FLUSH_BYTES = int(os.environ.get('LLM_STREAM_FLUSH_BYTES', 512))
+
+    # Request timings (/llm/metrics): requests taking LLM_SLOW_REQUEST_SECONDS or longer are written to
+    # logfiles/llm_slow.log, a fraction LLM_SLOW_REQUEST_SAMPLE_RATE of them (0 turns the log off)
+    LLM_SLOW_REQUEST_SECONDS = float(os.environ.get('LLM_SLOW_REQUEST_SECONDS', 20))
+    LLM_SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get('LLM_SLOW_REQUEST_SAMPLE_RATE', 1.0))
+
+    # Ollama model residency: DEFAULT_LLM and LLM_PINNED_MODELS (comma separated) are warmed up at startup
+    # and never unloaded; other models get LLM_KEEP_ALIVE_BY_MODEL (JSON, e.g. '{"mistral": "30m"}') or
+    # LLM_KEEP_ALIVE, and are unloaded when idle or when more than LLM_MAX_RESIDENT_MODELS are loaded
+    LLM_WARMUP_ENABLED = os.environ.get('LLM_WARMUP_ENABLED', '1') == '1'
+    LLM_PINNED_MODELS = [name for name in os.environ.get('LLM_PINNED_MODELS', '').split(',') if name]
+    LLM_KEEP_ALIVE = os.environ.get('LLM_KEEP_ALIVE', '10m')
+    LLM_KEEP_ALIVE_BY_MODEL = json.loads(os.environ.get('LLM_KEEP_ALIVE_BY_MODEL', '{}'))
+    LLM_MODEL_IDLE_UNLOAD_SECONDS = int(os.environ.get('LLM_MODEL_IDLE_UNLOAD_SECONDS', 1800))
+    LLM_MAX_RESIDENT_MODELS = int(os.environ.get('LLM_MAX_RESIDENT_MODELS', 2))
+    LLM_MODEL_SWEEP_SECONDS = int(os.environ.get('LLM_MODEL_SWEEP_SECONDS', 300))
+
+    # Seconds the /llm/models list is served from cache before it is refreshed in the background
+    LLM_MODELS_CACHE_TTL = int(os.environ.get('LLM_MODELS_CACHE_TTL', 60))
+    LLM_MODELS_MAX_STALE_SECONDS = int(os.environ.get('LLM_MODELS_MAX_STALE_SECONDS', 86400))
 
     # Email settings
     SMTP_SERVER = os.environ.get('SMTP_SERVER', 'mail.engr.oregonstate.edu')
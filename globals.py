@@ -3,11 +3,12 @@ import logging
 # Global logger variables
 main_logger = None
 llm_logger = None
+llm_slow_logger = None
 agrimet_logger = None
 articles_logger = None
 
 def init():
-    global main_logger, llm_logger, agrimet_logger, articles_logger
+    global main_logger, llm_logger, llm_slow_logger, agrimet_logger, articles_logger
     
     # Set up main logging
     logging.basicConfig(
@@ -25,6 +26,15 @@ def init():
     llm_handler.setFormatter(llm_formatter)
     llm_logger.addHandler(llm_handler)
     llm_logger.setLevel(logging.INFO)
+
+    # Timings of slow LLM requests (one JSON object per line), kept out of llm.log
+    llm_slow_logger = logging.getLogger('llm_slow')
+    llm_slow_handler = logging.FileHandler('./logfiles/llm_slow.log')
+    llm_slow_handler.setLevel(logging.INFO)
+    llm_slow_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    llm_slow_logger.addHandler(llm_slow_handler)
+    llm_slow_logger.setLevel(logging.INFO)
+    llm_slow_logger.propagate = False
     
     # Set up Agrimet-specific logging
     agrimet_logger = logging.getLogger('agrimet')
@@ -0,0 +1,14 @@
+"""
+Local stand-ins for Ollama and ChromaDB, and a load generator for the /llm routes.
+
+Run the fake servers, point the API at them and drive it with the load generator:
+
+    python -m loadtest.fake_ollama --port 11435 --tokens-per-second 40 --first-token-ms 300
+    python -m loadtest.fake_chroma --port 8101 --documents 2000 --query-ms 30
+    OLLAMA_HOST=http://127.0.0.1:11435 CHROMADB_PORT=8101 LLM_WARMUP_ENABLED=0 python app.py
+    python -m loadtest.load_generator --url http://127.0.0.1:5000 --concurrency 8 --requests 200
+
+The fake servers only speak the parts of the two APIs that services/llm_service.py uses. Query
+texts are still embedded by ChromaDB's default embedding function in the API process, so the full
+chromadb package (and its cached embedding model) is needed there, as in production.
+"""
@@ -0,0 +1,195 @@
+"""
+A stand-in for the ChromaDB HTTP server holding a synthetic collection.
+
+Speaks the requests chromadb.HttpClient makes for llm_service: heartbeat, version and pre-flight
+checks, tenant/database/collection lookup, and a collection's count, query and get (which the BM25
+index pages through). Query results are picked deterministically from the query embedding, so
+repeated questions get the same chunks, and each query waits query_ms. Writes are not supported.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, unquote
+
+WORDS = ('irrigation', 'soil', 'moisture', 'evapotranspiration', 'crop', 'water', 'alfalfa', 'drip',
+         'sprinkler', 'schedule', 'field', 'yield', 'deficit', 'canal', 'pivot', 'wheat', 'potato',
+         'mint', 'hops', 'orchard', 'reservoir', 'allocation', 'well', 'runoff', 'salinity', 'Oregon')
+
+_COLLECTION_PATH = re.compile(r'^(?:/tenants/([^/]+)/databases/([^/]+))?/collections/([^/]+)(?:/(count|query|get))?$')
+
+
+class FakeChroma:
+    """
+    Example:
+        >>> server = FakeChroma(documents=2000, query_ms=30).serve(8101)
+        >>> threading.Thread(target=server.serve_forever, daemon=True).start()
+    """
+
+    def __init__(self, collection='encodings', documents=1000, sources=50, chunk_words=150, query_ms=20, seed=0):
+        self.collection_name = collection
+        self.collection_id = str(uuid.uuid5(uuid.NAMESPACE_URL, collection))
+        self.query_ms = query_ms
+        rng = random.Random(seed)
+        self.ids, self.documents, self.metadatas = [], [], []
+        for n in range(documents):
+            source = f"source_{n % sources:03d}.pdf"
+            text = ' '.join(rng.choice(WORDS) for _ in range(chunk_words))
+            self.ids.append(f"{source}:{n // sources}")
+            self.documents.append(text)
+            self.metadatas.append({'source_file': source, 'page': n // sources + 1,
+                                   'chunk_hash': hashlib.sha1(text.encode('utf-8')).hexdigest()})
+
+    def collection(self, tenant='default_tenant', database='default_database'):
+        return {
+            'id': self.collection_id, 'name': self.collection_name, 'metadata': None, 'dimension': 384,
+            'tenant': tenant, 'database': database, 'version': 0, 'log_position': 0,
+            'configuration_json': {
+                '_type': 'CollectionConfigurationInternal',
+                'hnsw_configuration': {'_type': 'HNSWConfigurationInternal', 'space': 'l2', 'ef_construction': 100,
+                                       'ef_search': 10, 'num_threads': 4, 'M': 16, 'resize_factor': 1.2,
+                                       'batch_size': 100, 'sync_threshold': 1000},
+            },
+        }
+
+    def _matches(self, metadata, where):
+        for key, condition in (where or {}).items():
+            if isinstance(condition, dict):
+                if '$in' in condition and metadata.get(key) not in condition['$in']:
+                    return False
+                if '$eq' in condition and metadata.get(key) != condition['$eq']:
+                    return False
+            elif metadata.get(key) != condition:
+                return False
+        return True
+
+    def _fields(self, indexes, include):
+        return {
+            'ids': [self.ids[i] for i in indexes],
+            'documents': [self.documents[i] for i in indexes] if 'documents' in include else None,
+            'metadatas': [self.metadatas[i] for i in indexes] if 'metadatas' in include else None,
+            'embeddings': None, 'uris': None, 'data': None, 'included': include,
+        }
+
+    def query(self, body):
+        time.sleep(self.query_ms / 1000)
+        include = body.get('include') or ['metadatas', 'documents', 'distances']
+        n_results = body.get('n_results', 10)
+        candidates = [i for i in range(len(self.ids)) if self._matches(self.metadatas[i], body.get('where'))]
+        results = {key: [] for key in ('ids', 'documents', 'metadatas', 'distances')}
+        for embedding in body.get('query_embeddings') or [[]]:
+            seed = hashlib.sha1(json.dumps(embedding[:16]).encode('utf-8')).hexdigest()
+            picked = random.Random(seed).sample(candidates, min(n_results, len(candidates)))
+            fields = self._fields(picked, include)
+            for key in ('ids', 'documents', 'metadatas'):
+                results[key].append(fields[key])
+            results['distances'].append([0.5 + 0.05 * rank for rank in range(len(picked))])
+        if 'distances' not in include:
+            results['distances'] = None
+        return dict(results, embeddings=None, uris=None, data=None, included=include)
+
+    def get(self, body):
+        include = body.get('include') or ['metadatas', 'documents']
+        wanted = set(body.get('ids') or [])
+        indexes = [i for i in range(len(self.ids))
+                   if (not wanted or self.ids[i] in wanted) and self._matches(self.metadatas[i], body.get('where'))]
+        offset = body.get('offset') or 0
+        limit = body.get('limit')
+        indexes = indexes[offset:offset + limit if limit is not None else None]
+        return self._fields(indexes, include)
+
+    def serve(self, port, host='127.0.0.1'):
+        fake = self
+
+        class Handler(_Handler):
+            chroma = fake
+
+        return ThreadingHTTPServer((host, port), Handler)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    chroma = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self, message=None):
+        self._send_json({'error': 'NotFoundError', 'message': message or f"not found: {self.path}"}, 404)
+
+    def _route(self):
+        """The request path without the /api/v1 or /api/v2 prefix."""
+        path = unquote(urlsplit(self.path).path)
+        return re.sub(r'^/api/v\d+', '', path).rstrip('/')
+
+    def do_GET(self):
+        path = self._route()
+        if path == '/heartbeat':
+            self._send_json({'nanosecond heartbeat': time.time_ns()})
+        elif path == '/version':
+            self._send_json('0.5.23')
+        elif path == '/pre-flight-checks':
+            self._send_json({'max_batch_size': 5461})
+        elif path == '/auth/identity':
+            self._send_json({'user_id': '', 'tenant': 'default_tenant', 'databases': ['default_database']})
+        elif re.match(r'^/tenants/[^/]+$', path):
+            self._send_json({'name': path.split('/')[2]})
+        elif re.match(r'^/tenants/[^/]+/databases/[^/]+$', path):
+            _, _, tenant, _, database = path.split('/')
+            self._send_json({'id': str(uuid.uuid5(uuid.NAMESPACE_URL, database)), 'name': database, 'tenant': tenant})
+        else:
+            self._collection_request(path, 'GET')
+
+    def do_POST(self):
+        self._collection_request(self._route(), 'POST')
+
+    def _collection_request(self, path, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}') if method == 'POST' else {}
+        match = _COLLECTION_PATH.match(path)
+        chroma = self.chroma
+        if not match or match.group(3) not in (chroma.collection_name, chroma.collection_id):
+            return self._not_found(f"Collection {match.group(3) if match else path} does not exist.")
+        tenant, database, _, action = match.groups()
+        if action is None and method == 'GET':
+            return self._send_json(chroma.collection(tenant or 'default_tenant', database or 'default_database'))
+        if action == 'count':
+            return self._send_json(len(chroma.ids))
+        if action == 'query':
+            return self._send_json(chroma.query(body))
+        if action == 'get':
+            return self._send_json(chroma.get(body))
+        self._send_json({'error': 'InvalidArgumentError', 'message': 'the fake ChromaDB server is read-only'}, 400)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8101)
+    parser.add_argument('--collection', default='encodings')
+    parser.add_argument('--documents', type=int, default=1000, help='chunks in the synthetic collection')
+    parser.add_argument('--sources', type=int, default=50, help='source files the chunks are spread over')
+    parser.add_argument('--query-ms', type=float, default=20, help='latency added to each query')
+    args = parser.parse_args()
+
+    server = FakeChroma(collection=args.collection, documents=args.documents, sources=args.sources,
+                        query_ms=args.query_ms).serve(args.port, args.host)
+    print(f"Fake ChromaDB listening on http://{args.host}:{args.port} ({args.documents} chunks)")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
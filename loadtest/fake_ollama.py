@@ -0,0 +1,216 @@
+"""
+A stand-in for the Ollama HTTP API with a configurable token rate and latency.
+
+Speaks /api/chat (streamed as NDJSON or not), /api/generate (model warm-up and unload), /api/tags,
+/api/ps, /api/pull and /api/version, which is what the ollama client calls from llm_service. Each
+chat waits first_token_ms (prompt evaluation), then emits answer_tokens tokens at tokens_per_second;
+the first request for a model that isn't loaded also waits load_ms. The final response carries the
+same token counts and durations (in ns) as a real Ollama response.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ('irrigation', 'soil', 'moisture', 'evapotranspiration', 'crop', 'water', 'alfalfa', 'drip',
+         'sprinkler', 'schedule', 'the', 'and', 'of', 'to', 'in', 'field', 'yield', 'deficit', 'Oregon')
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _model_name(name):
+    return name if ':' in name else f"{name}:latest"
+
+
+class FakeOllama:
+    """
+    Example:
+        >>> server = FakeOllama(models=['llama3.2'], tokens_per_second=40, first_token_ms=300).serve(11435)
+        >>> threading.Thread(target=server.serve_forever, daemon=True).start()
+    """
+
+    def __init__(self, models=('llama3.2',), tokens_per_second=30.0, first_token_ms=250, load_ms=0,
+                 answer_tokens=120, jitter=0.1):
+        self.models = [_model_name(name) for name in models]
+        self.tokens_per_second = tokens_per_second
+        self.first_token_ms = first_token_ms
+        self.load_ms = load_ms
+        self.answer_tokens = answer_tokens
+        self.jitter = jitter
+        self.loaded = {}    # model -> expiry (time.time()), or None to stay loaded
+        self._lock = threading.Lock()
+
+    def _sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _load(self, model, keep_alive):
+        """Loads the model if needed (sleeping load_ms) and returns the load duration in seconds."""
+        with self._lock:
+            expiry = self.loaded.get(model, 0)
+            resident = model in self.loaded and (expiry is None or expiry > time.time())
+        started = time.monotonic()
+        if not resident:
+            self._sleep(self.load_ms / 1000)
+        with self._lock:
+            if keep_alive in (0, '0', '0s'):
+                self.loaded.pop(model, None)
+            elif keep_alive in (-1, '-1'):
+                self.loaded[model] = None
+            else:
+                self.loaded[model] = time.time() + 300
+        return time.monotonic() - started
+
+    def _tokens(self, count):
+        return [random.choice(WORDS) + ' ' for _ in range(count)]
+
+    def chat(self, body):
+        """Yields the response chunks for a chat request; timing happens as the caller iterates."""
+        model = _model_name(body.get('model', ''))
+        prompt_tokens = sum(len(str(message.get('content', ''))) for message in body.get('messages', [])) // 4
+        load_seconds = self._load(model, body.get('keep_alive'))
+        self._sleep(self.first_token_ms / 1000)
+        prompt_seconds = self.first_token_ms / 1000
+        started = time.monotonic()
+        for token in self._tokens(self.answer_tokens):
+            yield {'model': model, 'created_at': _now(), 'message': {'role': 'assistant', 'content': token},
+                   'done': False}
+            self._sleep(1 / self.tokens_per_second)
+        eval_seconds = time.monotonic() - started
+        yield {
+            'model': model, 'created_at': _now(), 'message': {'role': 'assistant', 'content': ''},
+            'done': True, 'done_reason': 'stop',
+            'total_duration': int((load_seconds + prompt_seconds + eval_seconds) * 1e9),
+            'load_duration': int(load_seconds * 1e9),
+            'prompt_eval_count': prompt_tokens, 'prompt_eval_duration': int(prompt_seconds * 1e9),
+            'eval_count': self.answer_tokens, 'eval_duration': int(eval_seconds * 1e9),
+        }
+
+    def generate(self, body):
+        model = _model_name(body.get('model', ''))
+        load_seconds = self._load(model, body.get('keep_alive'))
+        return {'model': model, 'created_at': _now(), 'response': '', 'done': True,
+                'done_reason': 'unload' if body.get('keep_alive') in (0, '0', '0s') else 'load',
+                'load_duration': int(load_seconds * 1e9), 'total_duration': int(load_seconds * 1e9)}
+
+    def _details(self):
+        return {'parent_model': '', 'format': 'gguf', 'family': 'llama', 'families': ['llama'],
+                'parameter_size': '3.2B', 'quantization_level': 'Q4_K_M'}
+
+    def tags(self):
+        return {'models': [{'name': model, 'model': model, 'modified_at': _now(), 'size': 2019393189,
+                            'digest': f"{abs(hash(model)):064x}"[:64], 'details': self._details()}
+                           for model in self.models]}
+
+    def ps(self):
+        now = time.time()
+        with self._lock:
+            loaded = [(model, expiry) for model, expiry in self.loaded.items() if expiry is None or expiry > now]
+        return {'models': [{'name': model, 'model': model, 'size': 2019393189, 'size_vram': 2019393189,
+                            'digest': f"{abs(hash(model)):064x}"[:64], 'details': self._details(),
+                            'expires_at': datetime.fromtimestamp(expiry or now + 10 ** 8, timezone.utc).isoformat()}
+                           for model, expiry in loaded]}
+
+    def serve(self, port, host='127.0.0.1'):
+        fake = self
+
+        class Handler(_Handler):
+            ollama = fake
+
+        return ThreadingHTTPServer((host, port), Handler)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    ollama = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json(self.ollama.tags())
+        elif self.path == '/api/ps':
+            self._send_json(self.ollama.ps())
+        elif self.path == '/api/version':
+            self._send_json({'version': '0.0.0-fake'})
+        elif self.path == '/':
+            self._send_json('Ollama is running')
+        else:
+            self._send_json({'error': f"not found: {self.path}"}, 404)
+
+    def do_POST(self):
+        body = self._body()
+        if self.path == '/api/chat':
+            if _model_name(body.get('model', '')) not in self.ollama.models:
+                self._send_json({'error': f"model '{body.get('model')}' not found"}, 404)
+            elif body.get('stream', True):
+                self._stream(self.ollama.chat(body))
+            else:
+                chunks = list(self.ollama.chat(body))
+                final = chunks[-1]
+                final['message']['content'] = ''.join(chunk['message']['content'] for chunk in chunks)
+                self._send_json(final)
+        elif self.path == '/api/generate':
+            self._send_json(self.ollama.generate(body))
+        elif self.path == '/api/pull':
+            self._send_json({'status': 'success'})
+        else:
+            self._send_json({'error': f"not found: {self.path}"}, 404)
+
+    def _stream(self, chunks):
+        """Writes each chunk as an NDJSON line in its own HTTP chunk, as Ollama does."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                line = (json.dumps(chunk) + '\n').encode('utf-8')
+                self.wfile.write(f"{len(line):x}\r\n".encode('ascii') + line + b'\r\n')
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--models', default='llama3.2', help='comma separated model names')
+    parser.add_argument('--tokens-per-second', type=float, default=30.0)
+    parser.add_argument('--first-token-ms', type=float, default=250, help='prompt evaluation time')
+    parser.add_argument('--load-ms', type=float, default=0, help='model load time, paid when a model is not resident')
+    parser.add_argument('--answer-tokens', type=int, default=120)
+    parser.add_argument('--jitter', type=float, default=0.1, help='random +/- fraction applied to every delay')
+    args = parser.parse_args()
+
+    server = FakeOllama(
+        models=args.models.split(','), tokens_per_second=args.tokens_per_second, first_token_ms=args.first_token_ms,
+        load_ms=args.load_ms, answer_tokens=args.answer_tokens, jitter=args.jitter,
+    ).serve(args.port, args.host)
+    print(f"Fake Ollama listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
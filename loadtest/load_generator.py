@@ -0,0 +1,135 @@
+"""
+Drives /llm/chat on a running API with concurrent clients and reports throughput and latency.
+
+Each worker posts questions back to back (streamed by default) and times the first answer frame
+(TTFT) and the whole response; 429/503 refusals from the generation scheduler are counted
+separately from errors. Questions get a numbered suffix unless --repeat-questions is given, so
+the retrieval and answer caches don't turn the run into a cache benchmark.
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+QUESTIONS = (
+    'How often should I irrigate alfalfa in central Oregon?',
+    'What is the difference between drip and sprinkler irrigation?',
+    'How do I estimate crop evapotranspiration from AgriMet data?',
+    'What soil moisture level should trigger irrigation for potatoes?',
+    'How does deficit irrigation affect wheat yield?',
+    'What is a crop coefficient?',
+)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of values (None if there are none)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def chat_once(url, question, model, stream, use_rag, timeout):
+    """
+    Posts one question. Returns {'status', 'ttft', 'total', 'frames', 'chars'}; status is the HTTP
+    status, or 'error' for a connection failure or an error frame in the stream.
+    """
+    body = json.dumps({'query': question, 'model': model, 'stream': stream, 'use_RAG': use_rag,
+                       'chat_history': []}).encode('utf-8')
+    request = urllib.request.Request(f"{url}/llm/chat", data=body, headers={'Content-Type': 'application/json'})
+    started = time.monotonic()
+    result = {'status': None, 'ttft': None, 'total': None, 'frames': 0, 'chars': 0}
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result['status'] = response.status
+            if not stream:
+                answer = json.loads(response.read())
+                result['ttft'] = time.monotonic() - started
+                result['frames'] = 1
+                result['chars'] = len(answer.get('llm_response', ''))
+            for line in response if stream else ():
+                if not line.strip():
+                    continue
+                frame = json.loads(line)
+                if frame.get('content_type') == 'error':
+                    result['status'] = 'error'
+                elif frame.get('content_type') == 'llm_response':
+                    if result['ttft'] is None:
+                        result['ttft'] = time.monotonic() - started
+                    result['frames'] += 1
+                    result['chars'] += len(frame['llm_response'])
+    except urllib.error.HTTPError as e:
+        result['status'] = e.code
+    except (urllib.error.URLError, OSError, ValueError):
+        result['status'] = 'error'
+    result['total'] = time.monotonic() - started
+    return result
+
+
+def run(url, requests, concurrency, model, stream=True, use_rag=True, timeout=300, repeat_questions=False):
+    """Sends requests questions from concurrency threads; returns the per-request results and the wall time."""
+    results = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            question = QUESTIONS[n % len(QUESTIONS)]
+            if not repeat_questions:
+                question = f"{question} ({n})"
+            result = chat_once(url, question, model, stream, use_rag, timeout)
+            with lock:
+                results.append(result)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.monotonic() - started
+
+
+def summarize(results, elapsed):
+    ok = [result for result in results if result['status'] == 200]
+    summary = {
+        'requests': len(results),
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else None,
+        'statuses': dict(Counter(str(result['status']) for result in results)),
+        'frames_per_response': round(sum(result['frames'] for result in ok) / len(ok), 1) if ok else None,
+    }
+    for name in ('ttft', 'total'):
+        values = [result[name] for result in ok if result[name] is not None]
+        summary[name] = {f"p{q}": round(percentile(values, q), 3) if values else None for q in (50, 90, 95, 99)}
+        summary[name]['max'] = round(max(values), 3) if values else None
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='base URL of the API')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--model', default='llama3.2')
+    parser.add_argument('--no-stream', action='store_true', help='request non-streamed answers')
+    parser.add_argument('--no-rag', action='store_true', help='use the chat route without retrieval')
+    parser.add_argument('--repeat-questions', action='store_true', help='reuse identical questions (exercises the caches)')
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    results, elapsed = run(args.url, args.requests, args.concurrency, args.model, stream=not args.no_stream,
+                           use_rag=not args.no_rag, timeout=args.timeout, repeat_questions=args.repeat_questions)
+    print(json.dumps(summarize(results, elapsed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
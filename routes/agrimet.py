@@ -1,9 +1,11 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response
 import requests
 import globals
 from datetime import datetime, timedelta
+from flask import current_app
 from services.agrimet_service import get_agrimet_crop_coefficients, get_crop_water_use_chart_data, get_crop_dates
-from services.agrimet_service import get_agrimet_station_crop_data
+from services.agrimet_service import get_agrimet_station_crop_data, get_upstream_status, get_interpolated_etc
+from services.station_service import get_station_geojson_payload
 #import sqlite3
 from agrimet.crop_coefficients import CropCoefficients
 
@@ -21,7 +23,8 @@ def agrimet_index():
 @bp.route("/agrimet/cwu_chart_data")
 def agrimet_crop_water_use_chart_data_route():
     """
-    Retrieves the past five days of Crop ET for the given station (all crops for that station).
+    Retrieves the past five days of Crop ET for the given station (all crops for that station),
+    plus a 7-day ETc projection derived from the NWS forecast ('projection', null when the forecast is unavailable).
     """
     try:
         station = request.args.get('station', '')
@@ -37,8 +40,9 @@ def agrimet_crop_water_use_chart_data_route():
         data = get_crop_water_use_chart_data(station, start_date, end_date)
         # data is a dictionary of column names with associated data for each date
        
-        # Check if data is empty
-        if not data or not data.get('crop_codes') or not data.get('station_crop_data') or not data.get('data') or not data.get('nws_forecast'):
+        # Check if data is empty. The NWS forecast and USBR crop data may be missing when those upstreams
+        # are down; the chart is still returned and the missing parts are listed in 'degraded'
+        if not isinstance(data, dict) or not data.get('crop_codes') or not data.get('data'):
             globals.agrimet_logger.info(f"No data found for station {station}")
             return jsonify({'success': False, 'error': 'No data found for the specified station'}), 404
         
@@ -50,12 +54,23 @@ def agrimet_crop_water_use_chart_data_route():
             'station_crop_data': data['station_crop_data'], 
             'chart_data': data['data'],
             'nws_forecast': data['nws_forecast'],
+            'projection': data['projection'],
+            'stale': data['stale'],
+            'degraded': data['degraded'],
         }), 200
 
     except requests.RequestException as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@bp.route("/agrimet/upstream_status")
+def agrimet_upstream_status_route():
+    """
+    Reports the circuit breaker state ('closed', 'open' or 'half_open') of each upstream (USBR, NWS).
+    """
+    return jsonify({'success': True, 'upstreams': get_upstream_status()}), 200
+
+
 @bp.route("/agrimet/crop_dates")
 def agrimet_crop_dates_route():
     """
@@ -71,6 +86,8 @@ def agrimet_crop_dates_route():
             return jsonify({'success': False, 'error': 'crop parameter is required'}), 400
 
         dates = get_crop_dates(station, crop)
+        if dates and dates.get('unavailable'):
+            return jsonify({'success': False, 'error': 'USBR crop chart is unavailable'}), 503
         if not dates:
             return jsonify({'success': False, 'error': 'No crop dates found for the specified station and crop'}), 404
 
@@ -123,6 +140,108 @@ def agrimet_station_crop_info_route():
         globals.agrimet_logger.error(f"Error fetching Agrimet Station Crop Information: {str(e)}")
         return jsonify({'success': False, 'error': 'An error occurred'}), 500
 
+@bp.route("/agrimet/stations")
+def agrimet_stations_route():
+    """
+    Returns the AgriMet station GeoJSON (usbr_map.json) from memory.
+    Optional filters: state, program, region (comma-separated lists), bbox=minLon,minLat,maxLon,maxLat,
+    and fields (comma-separated property names to keep). Responses carry a strong ETag and are served
+    gzip or brotli compressed when the client accepts it; If-None-Match gets a 304.
+    """
+    try:
+        def split_arg(name):
+            value = request.args.get(name, '')
+            return [v for v in value.split(',') if v.strip()] if value else None
+
+        bbox = split_arg('bbox')
+        if bbox is not None:
+            try:
+                bbox = [float(v) for v in bbox]
+            except ValueError:
+                bbox = []
+            if len(bbox) != 4:
+                return jsonify({'success': False, 'error': 'bbox must be minLon,minLat,maxLon,maxLat'}), 400
+
+        payload = get_station_geojson_payload(
+            states=split_arg('state'),
+            programs=split_arg('program'),
+            regions=split_arg('region'),
+            bbox=bbox,
+            fields=split_arg('fields'),
+        )
+
+        encoding = next(
+            (e for e in ('br', 'gzip') if e in payload['variants'] and request.accept_encodings[e]),
+            'identity',
+        )
+        headers = {
+            'ETag': payload['etags'][encoding],
+            'Cache-Control': 'public, max-age=3600',
+            'Vary': 'Accept-Encoding',
+        }
+        if request.if_none_match.contains(payload['etags'][encoding].strip('"')):
+            return Response(status=304, headers=headers)
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(payload['variants'][encoding], status=200, headers=headers, mimetype='application/geo+json')
+
+    except FileNotFoundError:
+        globals.agrimet_logger.error("usbr_map.json not found")
+        return jsonify({'success': False, 'error': 'Station map not found'}), 500
+    except Exception as e:
+        globals.agrimet_logger.error(f"Error fetching Agrimet stations: {str(e)}")
+        return jsonify({'success': False, 'error': 'An error occurred'}), 500
+
+
+@bp.route("/agrimet/etc_at")
+def agrimet_etc_at_route():
+    """
+    Retrieves daily ETc for a crop at an arbitrary coordinate, interpolated (inverse distance weighting)
+    from the nearest AgriMet stations that grow the crop.
+    Parameters: lat, lon, crop, start, end (YYYY-MM-DD), optional k (number of stations) and elev (ft).
+    """
+    try:
+        try:
+            lat = float(request.args.get('lat', ''))
+            lon = float(request.args.get('lon', ''))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'lat and lon parameters are required and must be numbers'}), 400
+        if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+            return jsonify({'success': False, 'error': 'lat or lon out of range'}), 400
+
+        crop = request.args.get('crop', '')
+        if crop == '':
+            return jsonify({'success': False, 'error': 'crop parameter is required'}), 400
+
+        try:
+            start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d')
+            end = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'success': False, 'error': 'start and end parameters are required (YYYY-MM-DD)'}), 400
+        if end < start or (end - start).days > 366:
+            return jsonify({'success': False, 'error': 'end must be on or after start, and at most 366 days later'}), 400
+
+        try:
+            k = int(request.args.get('k', current_app.config.get('ETC_INTERPOLATION_NEIGHBORS', 4)))
+            elevation = request.args.get('elev')
+            elevation = float(elevation) if elevation not in (None, '') else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'k must be an integer and elev a number'}), 400
+        k = max(1, min(k, 10))
+
+        globals.agrimet_logger.info(f"Interpolating ETc for crop {crop} at {lat}, {lon} from {start:%Y-%m-%d} to {end:%Y-%m-%d}")
+
+        result = get_interpolated_etc(lat, lon, crop, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'), k=k, elevation=elevation)
+        if result is None:
+            return jsonify({'success': False, 'error': f'No stations found for crop {crop}'}), 404
+
+        return jsonify({'success': True, 'crop': crop, 'lat': lat, 'lon': lon, **result}), 200
+
+    except Exception as e:
+        globals.agrimet_logger.error(f"Error interpolating ETc: {str(e)}")
+        return jsonify({'success': False, 'error': 'An error occurred'}), 500
+
 '''
 
 @bp.route("/agrimet/histET")
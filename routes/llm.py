@@ -1,13 +1,27 @@
-import os
 import json
 import logging
 import globals
-from flask import Blueprint, request, Response, jsonify, send_file, stream_with_context
+from flask import Blueprint, current_app, request, Response, jsonify, send_file, stream_with_context
 from services.llm_service import get_llm_output, get_llm_output_stream, get_llm_output_without_RAG, get_llm_output_stream_without_RAG 
-from services.llm_service import get_llm_models, put_llm_source, get_titles_from_filenames, DEFAULT_LLM
+from services.llm_service import get_llm_model_details, put_llm_source, get_titles_from_filenames, DEFAULT_LLM
 from services.llm_service import get_llm_sources, test_llm, test_llm_streaming, put_llm_rating 
+from services.llm_service import get_ingest_job, get_ratings_summary
+from services.llm_service import get_retrieval_cache, get_answer_cache, get_generation_scheduler, get_model_manager
+from services.llm_service import get_request_metrics, get_source_file_index, get_upload_file_index
+from utils.generation_scheduler import QueueFullError, GenerationTimeoutError
+from utils.stream_coalescer import sse_frames
 
 bp = Blueprint('llm', __name__)
+
+
+def _generation_unavailable_response(error, status):
+    """
+    429 (queue full) or 503 (timed out waiting) for a request the generation scheduler couldn't serve,
+    with a Retry-After header so clients back off instead of retrying immediately.
+    """
+    globals.llm_logger.warning(f"Generation request refused ({status}): {error}")
+    return jsonify({'error': str(error), 'retry_after': error.retry_after}), status, {'Retry-After': str(error.retry_after)}
+
 #        user_query (str): The user's question to be processed by the LLM.
 #        llm_model (str): The name of the LLM model to use. Defaults to DEFAULT_LLM.
 #        stream (bool): Whether to stream the response from the LLM. Defaults to False.
@@ -38,6 +52,12 @@ def llm_test_route():
 
     if not query:
         return {"error": "Prompt cannot be empty"}, 400
+
+    # Test traffic has its own (small) queue so it can't crowd out chat requests
+    try:
+        ticket = get_generation_scheduler().submit('test')
+    except QueueFullError as e:
+        return _generation_unavailable_response(e, 429)
     
     if stream:
         # If streaming is enabled, we need to return a streaming response
@@ -46,17 +66,27 @@ def llm_test_route():
             'llm_model': model,
             #'chat_history': json.loads(chat_history),
             'chat_history': history,
+            'ticket': ticket,
         })
-        return Response(response, mimetype='application/json')
+        response = Response(response, mimetype='application/json')
+        response.call_on_close(ticket.release)
+        return response
         #return Response(stream_with_context(response), mimetype='text/plain')
     else:
-        response = test_llm({
-            'user_query': query,
-            'llm_model': model,
-            #'chat_history': json.loads(chat_history),
-            'chat_history': history,
-        })
-
+        try:
+            response = test_llm({
+                'user_query': query,
+                'llm_model': model,
+                #'chat_history': json.loads(chat_history),
+                'chat_history': history,
+                'ticket': ticket,
+            })
+        finally:
+            ticket.release()
+
+        if isinstance(response, tuple):
+            # (error body, status) for bad input or a failed generation
+            return response
         return Response(response, mimetype='application/json')
         #return Response(jsonify(response), mimetype='application/json')
 
@@ -102,6 +132,10 @@ def llm_chat_route():
     # to generate a more informed response.
     use_RAG = request.get_json().get('use_RAG', True)
 
+    # Streamed responses are newline-delimited JSON frames by default; clients that ask for
+    # text/event-stream (or send "sse": true) get the same frames as Server-Sent Events instead
+    sse = request.get_json().get('sse', False) or 'text/event-stream' in request.headers.get('Accept', '')
+
     # Print the chat history for debugging purposes
     globals.llm_logger.info(f"llm_chat_route: query: {query}, model: {model}, chat_history: {history}, stream: {stream}")
 
@@ -115,25 +149,46 @@ def llm_chat_route():
     # Assuming parameters is a JSON string, we can parse it directly
 
 
+    # Admission control: take a place in the generation queue before starting the response, so a full
+    # queue can still be refused with a proper status code. The ticket is handed to the service, which
+    # waits for its turn (streams report their queue position meanwhile) and releases it when done.
+    try:
+        ticket = get_generation_scheduler().submit('stream' if stream else 'sync')
+    except QueueFullError as e:
+        return _generation_unavailable_response(e, 429)
+
     if stream:
         globals.llm_logger.info("Streaming response enabled")
         # If streaming is enabled, we need to return a streaming response
         if use_RAG:
             # If RAG is enabled, we use the get_llm_output_stream function
             globals.llm_logger.info("RAG enabled, using get_llm_output_stream")
-            return Response(stream_with_context(get_llm_output_stream({
+            frames = get_llm_output_stream({
                 'user_query': query,
                 'llm_model': model,
                 'chat_history': history,
-            })), mimetype='application/json')
+                'ticket': ticket,
+            })
         else:
             # If RAG is not enabled, we use the get_llm_output_stream_without_RAG function
             globals.llm_logger.info("RAG disabled, using get_llm_output_stream_without_RAG")
-            return Response(stream_with_context(get_llm_output_stream_without_RAG({
+            frames = get_llm_output_stream_without_RAG({
                 'user_query': query,
                 'llm_model': model,
                 'chat_history': history,
-            })), mimetype='application/json') #, content_type='application/json')
+                'ticket': ticket,
+            })
+
+        if sse:
+            # no-cache and X-Accel-Buffering keep proxies from holding events back
+            response = Response(stream_with_context(sse_frames(frames)), mimetype='text/event-stream',
+                                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        else:
+            response = Response(stream_with_context(frames), mimetype='application/json') #, content_type='application/json')
+
+        # Also frees the slot if the client goes away before the generator ever runs
+        response.call_on_close(ticket.release)
+        return response
 
 
     # If streaming is not enabled, we can return a regular response
@@ -147,6 +202,7 @@ def llm_chat_route():
                     'user_query': query,
                     'llm_model': model,
                     'chat_history': history,
+                    'ticket': ticket,
                 })
             else:
                 # If RAG is not enabled, we use the get_llm_output_without_RAG function
@@ -155,6 +211,7 @@ def llm_chat_route():
                     'user_query': query,
                     'llm_model': model,
                     'chat_history': history,
+                    'ticket': ticket,
                 })
 
             #json_response = json.loads(response)
@@ -162,14 +219,69 @@ def llm_chat_route():
             #return {"success": "Success", "response": json_response}, 200
             return Response(response, mimetype='application/json') #, content_type='application/json')
 
+        except GenerationTimeoutError as e:
+            return _generation_unavailable_response(e, 503)
+
         except Exception as ollama_error:
             return {"error": f"Ollama Error: {str(ollama_error)}"}, 500
 
+        finally:
+            ticket.release()
+
 
 @bp.route("/llm/models")
 def llm_models_route():
-    models = get_llm_models()
-    return {"success": True, "models": models}, 200
+    # 'models' keeps the plain list of names; 'details' adds parameter size, quantization and whether each model is loaded
+    details = get_llm_model_details()
+    models = [model['name'] for model in details]
+    return {"success": True, "models": models, "details": details}, 200
+
+
+@bp.route("/llm/retrieval_cache")
+def llm_retrieval_cache_route():
+    """
+    Route to report the retrieval cache's hit ratio and size for this worker process.
+    """
+    cache = get_retrieval_cache()
+    if cache is None:
+        return jsonify({'success': True, 'enabled': False}), 200
+    return jsonify({'success': True, 'enabled': True, 'stats': cache.stats()}), 200
+
+
+@bp.route("/llm/answer_cache")
+def llm_answer_cache_route():
+    """
+    Route to report the answer cache's hit ratio, size and evictions for this worker process.
+    """
+    cache = get_answer_cache()
+    if cache is None:
+        return jsonify({'success': True, 'enabled': False}), 200
+    return jsonify({'success': True, 'enabled': True, 'stats': cache.stats()}), 200
+
+
+@bp.route("/llm/generation_queue")
+def llm_generation_queue_route():
+    """
+    Route to report the generation scheduler's running and queued requests for this worker process.
+    """
+    return jsonify({'success': True, 'stats': get_generation_scheduler().stats()}), 200
+
+
+@bp.route("/llm/metrics")
+def llm_metrics_route():
+    """
+    Route to report, per model, latency histograms of each request stage (queue, retrieval, titles,
+    prompt, ttft, generation, total), generation speed and token counts for this worker process.
+    """
+    return jsonify({'success': True, 'models': get_request_metrics().snapshot()}), 200
+
+
+@bp.route("/llm/resident_models")
+def llm_resident_models_route():
+    """
+    Route to report, per model, whether it is pinned and loaded, its keep_alive, uses and load times.
+    """
+    return jsonify({'success': True, 'models': get_model_manager().stats()}), 200
 
 
 @bp.route("/llm/submit_source", methods=["POST"])
@@ -202,6 +314,23 @@ def llm_submit_source_route():
     return put_llm_source(title, file, tags)
 
 
+@bp.route("/llm/ingest_status", methods=["GET"])
+def llm_ingest_status_route():
+    """
+    Route to report the progress of a source ingestion job.
+    Expects 'job_id' (returned by /llm/submit_source) as a query parameter.
+    """
+    job_id = request.args.get('job_id')
+    if not job_id:
+        return jsonify({'error': 'Missing job_id'}), 400
+
+    job = get_ingest_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': f'No ingestion job {job_id}'}), 404
+
+    return jsonify({'success': True, 'job': job}), 200
+
+
 @bp.route("/llm/titles_from_filenames", methods=["GET"])
 def llm_titles_from_filenames_route():
     """
@@ -249,20 +378,26 @@ def llm_get_source_route():
 
     globals.llm_logger.info(f"llm_get_source_route: filename: {filename}")
 
-    # Adjust the path as needed to your PDF storage directory
-    pdf_dir = "D:\\AgWaterLLM\\source_materials"
-    pdf_path = os.path.join(pdf_dir, filename)
-
-    if not os.path.isfile(pdf_path):
-        return {"error": f"File {pdf_path} not found."}, 404
+    # Only files found in the source materials directory, or uploads stored under their source id, can be
+    # served; the name is looked up in an index of each directory rather than joined onto its path
+    source = get_source_file_index().lookup(filename) or get_upload_file_index().lookup(filename)
+    if source is None:
+        return {"error": f"File {filename} not found."}, 404
 
-    globals.llm_logger.info(f"llm_get_source_route: Returning PDF file: {pdf_path}")
+    globals.llm_logger.info(f"llm_get_source_route: Returning PDF file: {source.path}")
 
-    # Use Flask's send_file to return the PDF file with the correct MIME type
-    # This will also handle setting the correct headers for downloading the file
-    # and ensure that the file is served as a binary stream.
-    # The mimetype 'application/pdf' is set to indicate that the file is a PDF.
-    return send_file(pdf_path, mimetype='application/pdf')
+    # conditional=True answers If-None-Match/If-Modified-Since with 304 and Range requests with 206,
+    # so PDF viewers can fetch pages on demand and re-use what they already have. The strong ETag
+    # comes from the file's size and mtime. With USE_X_SENDFILE the front-end server sends the file;
+    # otherwise it goes through wsgi.file_wrapper when the server provides one.
+    return send_file(
+        source.path,
+        mimetype='application/pdf',
+        conditional=True,
+        etag=source.etag,
+        last_modified=source.mtime,
+        max_age=current_app.config.get('LLM_SOURCE_MAX_AGE', 604800),
+    )
 
 
 @bp.route("/llm/rating", methods=["POST"])
@@ -297,5 +432,27 @@ def llm_put_rating_route():
     # add the rating to a database or some storage
     result = put_llm_rating(question, answer, rating, model, comment, submitted_by)  # returns {"success": True, "message": "LLM rating saved successfully"}
     globals.llm_logger.info(json.dumps(result))
+
+    if isinstance(result, tuple):   # ({"success": False, "message": ...}, status)
+        return jsonify(result[0]), result[1]
    
     return jsonify(result), 200
+
+
+@bp.route("/llm/ratings/summary", methods=["GET"])
+def llm_ratings_summary_route():
+    """
+    Route to summarize answer ratings per model and per model and day: count, mean rating and a
+    histogram of ratings. Optional query parameters: 'model', 'start' and 'end' (YYYY-MM-DD, inclusive).
+    """
+    model = request.args.get('model')
+    start = request.args.get('start')
+    end = request.args.get('end')
+
+    try:
+        summary = get_ratings_summary(model, start, end)
+    except Exception as e:
+        globals.llm_logger.error(f"llm_ratings_summary_route: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+    return jsonify({'success': True, **summary}), 200
@@ -1,4 +1,4 @@
-from flask import json, jsonify, current_app
+from flask import jsonify, current_app
 import os, sys
 
 sys.path.append("/Websites/AgWaterAPI")
@@ -8,7 +8,13 @@ import pandas as pd
 import requests
 import globals
 import sqlite3
+import threading
+import numpy as np
 from agrimet.crop_coefficients import CropCoefficients
+from agrimet.crop_coefficients import compute_kc_etc, _to_float
+from agrimet.reference_et import hargreaves_etrs, ETRS_TO_ETOS_RATIO
+from utils.resilience import CircuitBreaker, CircuitOpenError, StaleCache
+from services.station_service import get_station_coordinates, get_neighbor_weights
 
 # AGRIMET_DATA_DIR = "d:\\Websites\\AgWaterAPI\\agrimet\\histEtSummaries"
 
@@ -77,6 +83,108 @@ etCols = [
     "Daily Penman ET (in)",
 ]
 
+NWS_HEADERS = {
+    "User-Agent": "(AgWaterAPI, contact@agwater.org)"  # NWS requires a User-Agent
+}
+
+# Per-upstream circuit breakers and stale-while-revalidate caches, created on first use
+# from the app config (see UPSTREAM_* settings in config.py)
+_breakers = {}
+_caches = {}
+_resilience_lock = threading.Lock()
+
+# NWS grid (office, x, y) for each forecast point; a point's grid never changes
+_nws_grid_by_point = {}
+
+
+def _get_breaker(upstream):
+    """Returns the process-wide circuit breaker for an upstream ('usbr' or 'nws')."""
+    with _resilience_lock:
+        if upstream not in _breakers:
+            _breakers[upstream] = CircuitBreaker(
+                upstream,
+                failure_threshold=current_app.config.get('UPSTREAM_FAILURE_THRESHOLD', 3),
+                reset_timeout=current_app.config.get('UPSTREAM_RESET_SECONDS', 60),
+            )
+        return _breakers[upstream]
+
+
+def _get_cache(name, ttl_key, default_ttl):
+    """Returns the process-wide stale-while-revalidate cache with the given name."""
+    with _resilience_lock:
+        if name not in _caches:
+            _caches[name] = StaleCache(
+                name,
+                ttl=current_app.config.get(ttl_key, default_ttl),
+                max_stale=current_app.config.get('UPSTREAM_MAX_STALE_SECONDS', 86400),
+            )
+        return _caches[name]
+
+
+def get_upstream_status():
+    """Returns the current circuit state of each upstream, e.g. {'usbr': 'closed', 'nws': 'open'}"""
+    with _resilience_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.state for breaker in breakers}
+
+
+def _upstream_get(url, **kwargs):
+    """
+    requests.get for calls made through a circuit breaker: 5xx and 429 responses raise here, inside
+    breaker.call, so an upstream that answers but is failing counts against the breaker. Other 4xx
+    responses are returned for the caller's raise_for_status().
+    """
+    response = requests.get(url, **kwargs)
+    if response.status_code >= 500 or response.status_code == 429:
+        response.raise_for_status()
+    return response
+
+
+def _fetch_usbr_chart_rows(station, breaker, timeout):
+    """
+    Fetches the USBR AgriMet crop chart for a station and splits it into one token list per crop, e.g.
+    ['ALFP', '04/01', '0.35', '0.35', '0.33', '0.33', '0.34', '06/01', '10/05', '26.3', '2.4', '4.9']
+    """
+    url = f"https://www.usbr.gov/pn/agrimet/chart/{station}ch.txt"
+
+    response = breaker.call(_upstream_get, url, timeout=timeout)
+    response.raise_for_status()
+    content = response.text
+
+    # Split the content into lines and filter out comment lines (starting with #)
+    data = [
+        line
+        for line in content.splitlines()
+        if line.strip() and not line.strip().startswith("#")
+    ]
+
+    data = data[12:]  # Skip the header line s
+    # Extract every other line, starting with the first
+    data = data[::2]  # each line is a crop
+
+    # Split each line using '*' as a delimiter and strip whitespace from each part
+    data = [line.split("*") for line in data]
+    data = [line[1:] for line in data]
+
+    # for each line, flatten the line and split by whitespace to get individual data points
+    _data = []
+    for line in data:
+        line = " ".join(line).strip()
+        _data.append(line.split())
+    return _data
+
+
+def get_usbr_chart_rows(station):
+    """
+    Returns (rows, is_stale) for the station's USBR crop chart, served through the 'usbr' circuit
+    breaker and the chart cache. Stale rows are returned (and refreshed in the background) when the
+    cached copy has expired. Raises if nothing is cached and the upstream call fails.
+    """
+    breaker = _get_breaker('usbr')
+    timeout = current_app.config.get('UPSTREAM_TIMEOUT', 10)
+    cache = _get_cache('usbr_chart', 'USBR_CHART_TTL', 3600)
+    return cache.get(station, lambda: _fetch_usbr_chart_rows(station, breaker, timeout))
+
 '''
 def get_crop_water_use(station):
     """
@@ -207,43 +315,19 @@ def get_crop_water_use(station):
 def get_crop_dates(station):
     """
     Retrieves the planting_date, full_cover, and termination_date for the given crop and station.
+    When the USBR crop chart can't be fetched (and isn't cached), returns empty lists with
+    "unavailable": True rather than None, so callers such as compute_crop_ets() don't fall back to
+    fetching the chart themselves, outside the circuit breaker.
     """
     try:
-        url = f"https://www.usbr.gov/pn/agrimet/chart/{station}ch.txt"
-
-        response = requests.get(url)
-        response.raise_for_status()
-        content = response.text
+        # each row is a crop. These represent the crop code, planting date, full cover date, and termination date among others
+        # for the crops grown near this station
+        # e.g.  * ALFP 04/01* 0.35 0.35 0.33 0.33 * 0.34 *06/01*10/05* 26.3 * 2.4* 4.9 *
+        _data, stale = get_usbr_chart_rows(station)
         globals.agrimet_logger.info(
             f"Fetched Crop Water Use data for station {station}"
         )
 
-        # Split the content into lines and filter out comment lines (starting with #)
-        data = [
-            line
-            for line in content.splitlines()
-            if line.strip() and not line.strip().startswith("#")
-        ]
-
-        data = data[12:]  # Skip the header line s
-        # Extract every other line, starting with the first
-        data = data[::2]  # each line is a crop
-
-        # Split each line using '*' as a delimiter and strip whitespace from each part
-        data = [line.split("*") for line in data]
-        data = [line[1:] for line in data]
-
-        # for each line, flatten the line and split by whitespace to get individual data points
-        # these represent the crop code, planting date, full cover date, and termination date among others
-        # for the crops grown near this station
-        # e.g.  * ALFP 04/01* 0.35 0.35 0.33 0.33 * 0.34 *06/01*10/05* 26.3 * 2.4* 4.9 *
-        _data = []
-        for line in data:
-            line = " ".join(line).strip()
-            _data.append(line.split())
-
-        __data = []
-
         crop_codes = [
             row[0] for row in _data
         ]  # extract crop codes * ALFP 04/01* 0.35 0.35 0.33 0.33 * 0.34 *06/01*10/05* 26.3 * 2.4* 4.9 *ap crop code to crop name
@@ -256,11 +340,11 @@ def get_crop_dates(station):
             }
             for row in _data
         ]
-        return {"crop_codes": crop_codes, "crop_dates": crop_dates}
+        return {"crop_codes": crop_codes, "crop_dates": crop_dates, "stale": stale}
 
     except Exception as e:
-        # globals.agrimet_logger.error(f"Error fetching Crop Water Use data for station {station}: {str(e)}")
-        return None
+        globals.agrimet_logger.warning(f"Crop dates unavailable for station {station}: {str(e)}")
+        return {"crop_codes": [], "crop_dates": [], "stale": False, "unavailable": True}
 
 '''
 def get_station_summary_data(station_id, start_date, end_date):
@@ -337,35 +421,9 @@ def get_agrimet_station_crop_data(station):
     Retrieves the past five days of Crop ET for the given station (all crops for that station).
     """
     try:
-        url = f"https://www.usbr.gov/pn/agrimet/chart/{station}ch.txt"
-
-        response = requests.get(url)
-        response.raise_for_status()
-        content = response.text
+        _data, stale = get_usbr_chart_rows(station)
         #globals.agrimet_logger.info(f"Fetched Crop Water Use data for station {station}")
 
-        # Split the content into lines and filter out comment lines (starting with #)
-        data = [
-            line
-            for line in content.splitlines()
-            if line.strip() and not line.strip().startswith("#")
-        ]
-
-        data = data[12:]  # Skip the header line s
-        # Extract every other line, starting with the first
-        data = data[::2]
-
-        # Split each line using '*' as a delimiter and strip whitespace from each part
-        data = [line.split("*") for line in data]
-        data = [line[1:] for line in data]
-
-        # for each line, flatten the line
-        # and split by whitespace to get individual data points
-        _data = []
-        for line in data:
-            line = " ".join(line).strip()
-            _data.append(line.split())
-
         # Optionally, convert to a pandas DataFrame for structured data
         df = pd.DataFrame(
             _data,
@@ -404,7 +462,7 @@ def get_agrimet_station_crop_data(station):
             _crop["14DayUse"] = row["14 Day Use"]
             crops.append(_crop)
 
-        return {"crops": crops}
+        return {"crops": crops, "stale": stale}
     
     except Exception as e:
         #globals.agrimet_logger.error(f"Error fetching Crop Water Use data for station {station}: {str(e)}")
@@ -482,7 +540,9 @@ def get_crop_water_use_chart_data(station_id, start_date, end_date):
 
             crop_codes = cropCodes.keys()
             ccs = CropCoefficients()
-            et_results = ccs.compute_crop_ets(hist_station_data, crop_codes)
+            # pass in the (cached, circuit-broken) crop dates so compute_crop_ets doesn't hit USBR again
+            crop_dates = get_crop_dates(station_id)
+            et_results = ccs.compute_crop_ets(hist_station_data, crop_codes, crop_dates=crop_dates)
             if et_results:
                 crop_ET_data = et_results
             else:
@@ -528,43 +588,53 @@ def get_crop_water_use_chart_data(station_id, start_date, end_date):
             
     #globals.agrimet_logger.error(f"Fetching crop data for station {station_id}")
     station_crop_data = get_agrimet_station_crop_data(station_id)
+    degraded = []
+    if "crops" not in station_crop_data:
+        globals.agrimet_logger.warning(f"USBR crop chart unavailable for station {station_id}: {station_crop_data.get('error')}")
+        degraded.append("usbr")
     
     
     # Next,get the NWS forecast for the station's latitude and longitude.  Get the latitude and longitude
-    # from a json file 'usbr_map.json' using the feature.geometry.coordinates property
-    # open json file
+    # from 'usbr_map.json' (feature.geometry.coordinates), held in memory by the station service
+    forecast = {"success": False, "error": f"Station {station_id} not found in usbr_map.json"}
     try:
-        with open(
-            "/Websites/AgWaterAPI/agrimet/usbr_map.json", "r", encoding="utf-8"
-        ) as f:
-            usbr_map = json.load(f)
-        # Find the station in the usbr_map
-        station_data = next((
-            item for item in usbr_map["features"]
-            if item["properties"]["siteid"] == station_id
-        ), None)
-        if station_data:
+        coordinates = get_station_coordinates(station_id)
+        if coordinates:
             # Extract latitude and longitude from the station data
-            latitude = station_data["geometry"]["coordinates"][1]
-            longitude = station_data["geometry"]["coordinates"][0]
+            latitude, longitude = coordinates
             #globals.agrimet_logger.info(f"Found coordinates for {station_id}: {latitude}, {longitude}")
 
             forecast = get_nws_forecast(latitude, longitude)
 
-        if not forecast["success"]:
-            #globals.agrimet_logger.error(f"Error fetching NWS forecast: {forecast['error']}")
-            return jsonify({"success": False, "error": forecast["error"]}), 500 
-
     except FileNotFoundError as e:
         #globals.agrimet_logger.error(f"Error loading usbr_map.json: {str(e)}")
         return jsonify({"success": False, "error": "usbr_map.json not found"}), 500   
-            
+
+    # A failed forecast no longer fails the whole chart; the chart is returned without it and flagged
+    if not forecast["success"]:
+        globals.agrimet_logger.warning(f"NWS forecast unavailable for station {station_id}: {forecast['error']}")
+        degraded.append("nws")
+
+    # 7-day ETc projection from the forecast fetched above (no further upstream calls)
+    projection = None
+    if forecast["success"]:
+        try:
+            projection = get_forecast_etc_projection(forecast, crop_codes, crop_dates)
+        except Exception as e:
+            globals.agrimet_logger.warning(f"ETc projection failed for station {station_id}: {str(e)}")
+
     return {
         "success": True, 
         "data": combined_data, 
         "crop_codes": cropCodes, 
-        "station_crop_data": station_crop_data['crops'],
-        "nws_forecast": forecast["forecast"]["properties"],  # NWS forecast periods
+        "station_crop_data": station_crop_data.get('crops', []),
+        "nws_forecast": forecast["forecast"]["properties"] if forecast["success"] else None,  # NWS forecast periods
+        "projection": projection,  # projected daily ETc for the forecast days
+        "stale": {
+            "station_crop_data": station_crop_data.get("stale", False),
+            "nws_forecast": forecast.get("stale", False),
+        },
+        "degraded": degraded,
     }
     
     # The combined_data will have the following structure:
@@ -577,63 +647,280 @@ def get_crop_water_use_chart_data(station_id, start_date, end_date):
     # }
 
 
-def get_nws_forecast(latitude, longitude):
+def _forecast_daily_temperatures(periods, days):
     """
-    Get National Weather Service forecast for a given latitude/longitude coordinate.
+    Collapses NWS forecast periods (alternating day/night, 12 hours each) into daily max/min temperatures (F).
+    A day's max is its daytime period; its min is the overnight period ending that morning, falling back
+    to the night that follows it (the first forecast day usually has no preceding night).
+
+    Returns:
+        (dates, tmax, tmin): 'YYYY-MM-DD' strings and float arrays (NaN where missing), at most `days` long
+    """
+    highs, lows = {}, {}
+    for period in periods:
+        temperature = period.get("temperature")
+        if temperature is None:
+            continue
+        if period.get("temperatureUnit", "F") == "C":
+            temperature = temperature * 9 / 5 + 32
+        day = datetime.fromisoformat(period["startTime"]).date()
+        if period.get("isDaytime"):
+            highs[day] = float(temperature)
+        else:
+            lows[day] = float(temperature)
+
+    dates = sorted(highs)[:days]
+    tmax = np.array([highs[d] for d in dates], dtype=np.float64)
+    tmin = np.array(
+        [lows.get(d - timedelta(days=1), lows.get(d, np.nan)) for d in dates], dtype=np.float64
+    )
+    return [d.strftime("%Y-%m-%d") for d in dates], tmax, tmin
+
+
+def get_forecast_etc_projection(forecast, crop_codes, crop_dates, days=7):
+    """
+    Projects daily ETc for the next `days` days from an already-fetched NWS forecast (see get_nws_forecast),
+    so it makes no upstream calls of its own. Reference ET is estimated with Hargreaves from the forecast
+    max/min temperatures, then each crop's Kc is applied through the same vectorized path as the
+    historic ETc (CropCoefficients.compute_crop_kc_etc).
 
     Args:
-        latitude (float): Latitude coordinate
-        longitude (float): Longitude coordinate
+        forecast (dict): a successful get_nws_forecast() result
+        crop_codes: crop codes to project
+        crop_dates (dict): get_crop_dates() result for the station
 
     Returns:
-        dict: Dictionary containing forecast data or error information
+        dict: {column_name: daily values}, with 'Date', 'Max Temperature (F)', 'Min Temperature (F)',
+              'ETrs Hargreaves (in)' and one 'ETc (crop_code)' column per crop; None if the forecast
+              has no usable periods
 
     Example:
-        >>> forecast = get_nws_forecast(45.5152, -122.6784)  # Portland, OR
-        >>> print(forecast['properties']['periods'][0]['detailedForecast'])
+        >>> projection = get_forecast_etc_projection(get_nws_forecast(44.63, -123.19), ['ALFM'], get_crop_dates('crvo'))
+        >>> projection['ETc (ALFM)']
+        [0.29, 0.31, ...]
     """
+    dates, tmax, tmin = _forecast_daily_temperatures(forecast["forecast"]["properties"].get("periods", []), days)
+    if not dates:
+        return None
+
+    etrs = hargreaves_etrs(dates, tmax, tmin, forecast["location"]["latitude"],
+                           current_app.config.get('HARGREAVES_ETR_RATIO', ETRS_TO_ETOS_RATIO))
+
+    def to_list(values):
+        return [None if np.isnan(v) else round(v, 4) for v in values.tolist()]
+
+    projection = {
+        "Date": dates,
+        "Max Temperature (F)": to_list(tmax),
+        "Min Temperature (F)": to_list(tmin),
+        "ETrs Hargreaves (in)": to_list(etrs),
+    }
+    for crop, kc_etc in CropCoefficients().compute_crop_kc_etc(dates, etrs, crop_codes, crop_dates).items():
+        projection[f"ETc ({crop})"] = to_list(kc_etc[1]) if kc_etc is not None else [None] * len(dates)
+    return projection
+
+
+def _get_station_etc_matrix(station_ids, crop, start_date, end_date):
+    """
+    Daily ETc for a crop at several stations as a (stations x days) array, NaN where missing.
+
+    ETc comes from the daily_crop_et table (filled by agrimet/etc_reanalysis.py) with one query for
+    all stations. The (station, day) cells it doesn't cover, e.g. recent days the reanalysis hasn't
+    reached yet, are computed from daily_climate_data ETrs with the same vectorized Kc/ETc path,
+    again with a single query for all the stations that have gaps.
+
+    Returns:
+        (dates, matrix): list of 'YYYY-MM-DD' strings and the ETc array
+    """
+    days = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + np.timedelta64(1, 'D'))
+    dates = [str(d) for d in days]
+    day_index = {d: i for i, d in enumerate(dates)}
+    row_index = {s: i for i, s in enumerate(station_ids)}
+    matrix = np.full((len(station_ids), len(dates)), np.nan)
+
+    db_path = current_app.config.get('AGRIMET_DB_PATH', '/Websites/AgWaterAPI/sqliteDBs/agrimet.db')
+    placeholders = ", ".join("?" * len(station_ids))
+    conn = sqlite3.connect(db_path)
     try:
-        # globals.agrimet_logger.info(f"Fetching NWS forecast for coordinates: {latitude}, {longitude}")
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"SELECT Station, Date, ETc FROM daily_crop_et WHERE crop_code = ? AND Station IN ({placeholders}) AND Date BETWEEN ? AND ?",
+                [crop] + list(station_ids) + [dates[0], dates[-1]],
+            )
+            precomputed = cursor.fetchall()
+        except sqlite3.OperationalError:
+            precomputed = []  # reanalysis table not created yet
+
+        for station, date, etc in precomputed:
+            i = day_index.get(str(date)[:10])
+            if i is not None and etc is not None:
+                matrix[row_index[station], i] = etc
+
+        # stations with at least one day not covered by the reanalysis
+        missing = [s for s in station_ids if np.isnan(matrix[row_index[s]]).any()]
+        if missing:
+            placeholders = ", ".join("?" * len(missing))
+            cursor.execute(
+                f"SELECT Station, Date, ETRS FROM daily_climate_data WHERE Station IN ({placeholders}) AND Date BETWEEN ? AND ?",
+                list(missing) + [dates[0], dates[-1] + " 23:59:59"],
+            )
+            etrs = np.full((len(missing), len(dates)), np.nan)
+            missing_index = {s: i for i, s in enumerate(missing)}
+            for station, date, value in cursor.fetchall():
+                i = day_index.get(str(date)[:10])
+                if i is not None:
+                    etrs[missing_index[station], i] = _to_float(value)
+    finally:
+        conn.close()
 
-        # Step 1: Get grid information from coordinates
-        points_url = f"https://api.weather.gov/points/{latitude},{longitude}"
+    if missing:
+        kc_curve = CropCoefficients().get_all_coefficients_from_database(db_path).get(crop)
+        for station in missing:
+            crop_dates = get_crop_dates(station)
+            crop_date = next((cd for cd in crop_dates["crop_dates"] if cd["crop_code"] == crop), None) if crop_dates else None
+            if kc_curve is None or crop_date is None:
+                continue
+            _, etc = compute_kc_etc(days, etrs[missing_index[station]], kc_curve,
+                                    crop_date["planting_date"], crop_date["full_cover_date"], crop_date["termination_date"])
+            # only fill the gaps; precomputed days are kept
+            row = matrix[row_index[station]]
+            gaps = np.isnan(row)
+            row[gaps] = etc[gaps]
+
+    return dates, matrix
+
+
+def get_interpolated_etc(latitude, longitude, crop, start_date, end_date, k=4, elevation=None):
+    """
+    Daily ETc for a crop at an arbitrary coordinate, interpolated from the k nearest stations
+    that grow the crop using inverse distance weighting.
 
-        headers = {
-            "User-Agent": "(AgWaterAPI, contact@agwater.org)"  # NWS requires a User-Agent
-        }
+    The interpolation is vectorized over days. On days where some neighbors have no data, the
+    remaining neighbors' weights are renormalized. When the point's elevation (ft) is given and a
+    neighbor's elevation is known, that neighbor's ETc is scaled by
+    1 + ETC_ELEVATION_FACTOR * (point elevation - station elevation) / 1000.
 
-        points_response = requests.get(points_url, headers=headers, timeout=10)
+    Args:
+        latitude (float), longitude (float): The point to interpolate at
+        crop (str): Crop code, e.g. 'ALFM'
+        start_date (str), end_date (str): 'YYYY-MM-DD', inclusive
+        k (int): Number of neighboring stations
+        elevation (float, optional): Elevation of the point in feet
+
+    Returns:
+        dict: {'dates': [...], 'etc': [...], 'neighbors': [...]}, or None if no station grows the crop
+    """
+    neighbors = get_neighbor_weights(latitude, longitude, crop, k=k)
+    if not neighbors:
+        return None
+
+    station_ids = [n["siteid"] for n in neighbors]
+    weights = np.array([n["weight"] for n in neighbors])
+    dates, matrix = _get_station_etc_matrix(station_ids, crop, start_date, end_date)
+
+    if elevation is not None:
+        factor = current_app.config.get('ETC_ELEVATION_FACTOR', -0.01)
+        station_elevations = np.array([np.nan if n["elevation"] is None else n["elevation"] for n in neighbors])
+        correction = np.where(np.isnan(station_elevations), 1.0, 1.0 + factor * (elevation - station_elevations) / 1000.0)
+        matrix = matrix * correction[:, None]
+
+    # weighted mean over stations, renormalizing the weights per day over stations with data
+    has_data = ~np.isnan(matrix)
+    weighted = np.where(has_data, matrix, 0.0) * weights[:, None]
+    weight_sums = (has_data * weights[:, None]).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        etc = np.where(weight_sums > 0, weighted.sum(axis=0) / weight_sums, np.nan)
+
+    return {
+        "dates": dates,
+        "etc": [None if np.isnan(v) else round(float(v), 4) for v in etc],
+        "neighbors": neighbors,
+    }
+
+
+def _fetch_nws_forecast(latitude, longitude, breaker, timeout):
+    """
+    Fetches the NWS forecast for a coordinate through the 'nws' circuit breaker.
+    Raises on any HTTP or format error.
+    """
+    # Step 1: Get grid information from coordinates
+    grid = _nws_grid_by_point.get((latitude, longitude))
+    if grid is None:
+        points_url = f"https://api.weather.gov/points/{latitude},{longitude}"
+
+        points_response = breaker.call(_upstream_get, points_url, headers=NWS_HEADERS, timeout=timeout)
         points_response.raise_for_status()
         points_data = points_response.json()
 
         # Extract grid information
-        grid_office = points_data["properties"]["gridId"]
-        grid_x = points_data["properties"]["gridX"]
-        grid_y = points_data["properties"]["gridY"]
+        grid = (
+            points_data["properties"]["gridId"],
+            points_data["properties"]["gridX"],
+            points_data["properties"]["gridY"],
+        )
+        _nws_grid_by_point[(latitude, longitude)] = grid
 
-        # globals.agrimet_logger.info(f"Grid info: Office={grid_office}, X={grid_x}, Y={grid_y}")
+    grid_office, grid_x, grid_y = grid
+    # globals.agrimet_logger.info(f"Grid info: Office={grid_office}, X={grid_x}, Y={grid_y}")
 
-        # Step 2: Get forecast data using grid information
-        forecast_url = f"https://api.weather.gov/gridpoints/{grid_office}/{grid_x},{grid_y}/forecast"
+    # Step 2: Get forecast data using grid information
+    forecast_url = f"https://api.weather.gov/gridpoints/{grid_office}/{grid_x},{grid_y}/forecast"
 
-        forecast_response = requests.get(forecast_url, headers=headers, timeout=10)
-        forecast_response.raise_for_status()
-        forecast_data = forecast_response.json()
+    forecast_response = breaker.call(_upstream_get, forecast_url, headers=NWS_HEADERS, timeout=timeout)
+    forecast_response.raise_for_status()
+    forecast_data = forecast_response.json()
+    if "properties" not in forecast_data:
+        raise KeyError("properties")
 
-        # globals.agrimet_logger.info(f"Successfully retrieved NWS forecast for {latitude}, {longitude}")
+    return {
+        "success": True,
+        "location": {
+            "latitude": latitude,
+            "longitude": longitude,
+            "grid_office": grid_office,
+            "grid_x": grid_x,
+            "grid_y": grid_y,
+        },
+        "forecast": forecast_data,
+    }
 
-        return {
-            "success": True,
-            "location": {
-                "latitude": latitude,
-                "longitude": longitude,
-                "grid_office": grid_office,
-                "grid_x": grid_x,
-                "grid_y": grid_y,
-            },
-            "forecast": forecast_data,
-        }
 
+def get_nws_forecast(latitude, longitude):
+    """
+    Get National Weather Service forecast for a given latitude/longitude coordinate.
+
+    Forecasts are cached (NWS_FORECAST_TTL). Once a cached forecast expires it is still served,
+    with "stale": True, while a background refresh retries api.weather.gov. When the 'nws' circuit
+    is open and nothing is cached, this fails fast instead of waiting on the upstream.
+
+    Args:
+        latitude (float): Latitude coordinate
+        longitude (float): Longitude coordinate
+
+    Returns:
+        dict: Dictionary containing forecast data or error information
+
+    Example:
+        >>> forecast = get_nws_forecast(45.5152, -122.6784)  # Portland, OR
+        >>> print(forecast['forecast']['properties']['periods'][0]['detailedForecast'])
+    """
+    try:
+        # globals.agrimet_logger.info(f"Fetching NWS forecast for coordinates: {latitude}, {longitude}")
+        breaker = _get_breaker('nws')
+        timeout = current_app.config.get('UPSTREAM_TIMEOUT', 10)
+        cache = _get_cache('nws_forecast', 'NWS_FORECAST_TTL', 1800)
+
+        forecast, stale = cache.get(
+            (latitude, longitude),
+            lambda: _fetch_nws_forecast(latitude, longitude, breaker, timeout),
+        )
+        # globals.agrimet_logger.info(f"Successfully retrieved NWS forecast for {latitude}, {longitude}")
+        return dict(forecast, stale=stale)
+
+    except CircuitOpenError as e:
+        globals.agrimet_logger.warning(f"Skipping NWS forecast: {str(e)}")
+        return {"success": False, "error": f"Upstream unavailable: {str(e)}"}
     except requests.RequestException as e:
         globals.agrimet_logger.error(f"HTTP error fetching NWS forecast: {str(e)}")
         return {"success": False, "error": f"HTTP error: {str(e)}"}
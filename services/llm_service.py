@@ -1,9 +1,28 @@
 import os
 import globals
+import hashlib
 import ollama
 import chromadb
 import json
 import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context
+from utils.retrieval_cache import RetrievalCache
+from utils.answer_cache import AnswerCache, replay_tokens
+from utils.hybrid_search import BM25Index, reciprocal_rank_fusion, rerank
+from utils.prompt_assembler import assemble_prompt
+from utils.generation_scheduler import GenerationScheduler, GenerationTimeoutError
+from utils.model_manager import ModelManager, model_name
+from utils.resilience import StaleCache
+from utils.batch_writer import BatchWriter
+from utils.stream_coalescer import TokenCoalescer
+from utils.request_metrics import MetricsRegistry, RequestTrace
+from utils.file_index import FileIndex
+from utils.pdf_ingest import count_pdf_pages, iter_pdf_pages, chunk_pages, chunk_hash, batched
 
 
 # Save the host name and port for the server that will be running the Ollama API and the ChromaDB vector database.
@@ -22,6 +41,428 @@ CHROMADB_COLLECTION_NAME = "encodings"
 # Set the path to the SQLite database file
 DB_PATH = "D:\\Websites\\AgWaterAPI\\sqliteDBs\\agWater.db"
 
+# Process-wide ChromaDB client and collection handle, created on first use (see get_chroma_collection)
+_chroma_client = None
+_chroma_collection = None
+_chroma_checked_at = 0.0
+_chroma_lock = threading.Lock()
+
+# Retrieval results (see get_retrieval_cache); the collection's document count at the last health check
+_retrieval_cache = None
+_retrieval_cache_lock = threading.Lock()
+_chroma_document_count = None
+
+# Answers to repeated questions (see get_answer_cache); opt-in with ANSWER_CACHE_ENABLED
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+_rating_sweep = {"checked_at": 0.0, "last_id": None}
+
+# In-memory copy of LLM_Sources (see get_sources_catalog), by reference name and by source id
+_sources_catalog = None
+_sources_by_id = {}
+_sources_catalog_loaded_at = 0.0
+_sources_catalog_lock = threading.Lock()
+
+# Keyword (BM25) index over the collection's chunks for hybrid retrieval (see get_bm25_index)
+_bm25 = {"index": None, "chunks": None, "building": False, "stale": False}
+_bm25_lock = threading.Lock()
+
+# Admission control for ollama.chat (see get_generation_scheduler)
+_generation_scheduler = None
+_generation_scheduler_lock = threading.Lock()
+
+# Resident Ollama models and their keep_alive (see get_model_manager)
+_model_manager = None
+_model_manager_lock = threading.Lock()
+_model_manager_thread = None
+
+# Uploaded sources are chunked and added to the collection one at a time, in the background (see submit_ingest_job)
+_ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-ingest")
+
+# Ratings are written to LLM_Ratings in batches by a background thread (see get_rating_writer)
+_rating_writer = None
+_rating_writer_lock = threading.Lock()
+
+# Parsed ollama.list() for /llm/models (see get_llm_model_details)
+_models_cache = None
+_models_cache_lock = threading.Lock()
+
+# Per-model latency histograms and token counts for /llm/metrics (see get_request_metrics)
+_request_metrics = None
+_request_metrics_lock = threading.Lock()
+
+# Allowlist of the PDFs /llm/source may serve (see get_source_file_index)
+_source_file_index = None
+_source_file_index_lock = threading.Lock()
+_upload_file_index = None
+_upload_file_index_lock = threading.Lock()
+
+# Title lookups that run alongside generation in the streaming path (see _lookup_titles_async)
+_title_lookup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm-titles")
+
+
+def _config(key, default):
+    """Returns an app config value, or the default when called outside an app context (e.g. worker threads)."""
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return default
+
+
+def _check_document_count():
+    """Invalidates the retrieval cache when the collection's size changed, e.g. after an offline ingestion run."""
+    global _chroma_document_count
+    try:
+        count = _chroma_collection.count()
+    except Exception as e:
+        globals.llm_logger.warning(f" - Could not count ChromaDB collection {CHROMADB_COLLECTION_NAME}: {e}")
+        return
+    if _chroma_document_count is not None and count != _chroma_document_count:
+        globals.llm_logger.info(f" - ChromaDB collection size changed ({_chroma_document_count} -> {count})")
+        bump_collection_version()
+    _chroma_document_count = count
+
+
+def _connect_chroma():
+    global _chroma_client, _chroma_collection, _chroma_checked_at
+    host = _config('CHROMADB_HOST', 'localhost')
+    port = _config('CHROMADB_PORT', 8100)
+    _chroma_client = chromadb.HttpClient(host=host, port=port)  # Use the HTTP client to connect to ChromaDB. Preferred for production use
+    _chroma_collection = _chroma_client.get_collection(name=CHROMADB_COLLECTION_NAME)
+    _chroma_checked_at = time.monotonic()
+    _check_document_count()
+    globals.llm_logger.info(f" - Connected to ChromaDB collection {CHROMADB_COLLECTION_NAME} at {host}:{port}")
+
+
+def get_chroma_collection(reconnect=False):
+    """
+    Returns the process-wide handle to the ChromaDB collection, connecting on first use.
+
+    The connection is health-checked (heartbeat) at most every CHROMADB_HEALTHCHECK_SECONDS and
+    re-established when the check fails or when reconnect=True, so a restarted ChromaDB server is
+    picked up without restarting the API.
+    """
+    global _chroma_client, _chroma_collection, _chroma_checked_at
+    with _chroma_lock:
+        if reconnect or _chroma_collection is None:
+            _connect_chroma()
+        elif time.monotonic() - _chroma_checked_at >= _config('CHROMADB_HEALTHCHECK_SECONDS', 30):
+            try:
+                _chroma_client.heartbeat()
+                _chroma_checked_at = time.monotonic()
+                _check_document_count()
+            except Exception as e:
+                globals.llm_logger.warning(f" - ChromaDB heartbeat failed, reconnecting: {e}")
+                _connect_chroma()
+        return _chroma_collection
+
+
+def get_retrieval_cache():
+    """Returns the process-wide retrieval result cache, or None when RETRIEVAL_CACHE_ENABLED is off."""
+    global _retrieval_cache
+    if not _config('RETRIEVAL_CACHE_ENABLED', True):
+        return None
+    if _retrieval_cache is None:
+        with _retrieval_cache_lock:
+            if _retrieval_cache is None:
+                _retrieval_cache = RetrievalCache(
+                    _config('RETRIEVAL_CACHE_PATH', 'D:\\AgWaterLLM\\retrieval_cache.db'),
+                    max_entries=_config('RETRIEVAL_CACHE_SIZE', 1024),
+                )
+    return _retrieval_cache
+
+
+def bump_collection_version():
+    """Invalidates cached retrieval results. Call after documents are added to or removed from the collection."""
+    cache = get_retrieval_cache()
+    if cache is not None:
+        return cache.bump_version()
+    return None
+
+
+def get_answer_cache():
+    """
+    Returns the process-wide answer cache, or None unless ANSWER_CACHE_ENABLED is on.
+    Answers rated poorly in LLM_Ratings since the last check are evicted first.
+    """
+    global _answer_cache
+    if not _config('ANSWER_CACHE_ENABLED', False):
+        return None
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache(
+                    max_entries=_config('ANSWER_CACHE_SIZE', 500),
+                    ttl=_config('ANSWER_CACHE_TTL', 86400),
+                )
+    _evict_poorly_rated_answers(_answer_cache)
+    return _answer_cache
+
+
+def _evict_poorly_rated_answers(cache):
+    """
+    Evicts cached answers rated at or below ANSWER_CACHE_MIN_RATING. Ratings may be submitted to another
+    worker process, so LLM_Ratings is checked for new ones at most every ANSWER_CACHE_RATING_CHECK_SECONDS.
+    New ratings are found by id rather than updated_at, which only has second resolution and is set before
+    the rating writer commits its batch. Ratings are written with INSERT OR REPLACE, so a changed rating
+    gets a new id too.
+    """
+    now = time.monotonic()
+    with _answer_cache_lock:
+        if now - _rating_sweep["checked_at"] < _config('ANSWER_CACHE_RATING_CHECK_SECONDS', 60):
+            return
+        _rating_sweep["checked_at"] = now
+        last_id = _rating_sweep["last_id"]
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute("SELECT MAX(id) FROM LLM_Ratings")
+        newest = c.fetchone()[0] or 0
+        if last_id is None:
+            # first check: nothing is cached yet, only remember where to start from
+            rows = []
+        else:
+            c.execute("SELECT answer, model FROM LLM_Ratings WHERE id > ? AND id <= ? AND rating <= ?",
+                      (last_id, newest, _config('ANSWER_CACHE_MIN_RATING', 2)))
+            rows = c.fetchall()
+    except sqlite3.Error as e:
+        globals.llm_logger.warning(f" - Could not check LLM_Ratings for poorly rated answers: {e}")
+        return
+    finally:
+        conn.close()
+
+    with _answer_cache_lock:
+        _rating_sweep["last_id"] = newest
+    evicted = sum(cache.evict_answer(model, answer) for answer, model in rows)
+    if evicted:
+        globals.llm_logger.info(f" - Evicted {evicted} poorly rated answers from the answer cache")
+
+
+def get_generation_scheduler():
+    """
+    Returns the process-wide scheduler that limits concurrent ollama.chat calls. Requests queue per
+    class ('stream', 'sync' and 'test', served in that order) and are refused when their queue is full.
+    """
+    global _generation_scheduler
+    if _generation_scheduler is None:
+        with _generation_scheduler_lock:
+            if _generation_scheduler is None:
+                _generation_scheduler = GenerationScheduler(
+                    max_concurrent=_config('LLM_MAX_CONCURRENT_GENERATIONS', 2),
+                    max_queued={
+                        'stream': _config('LLM_MAX_QUEUED_STREAM', 16),
+                        'sync': _config('LLM_MAX_QUEUED_SYNC', 16),
+                        'test': _config('LLM_MAX_QUEUED_TEST', 2),
+                    },
+                )
+    return _generation_scheduler
+
+
+def get_request_metrics():
+    """
+    Returns the process-wide registry of request timings. Requests taking LLM_SLOW_REQUEST_SECONDS or
+    longer are also written (a LLM_SLOW_REQUEST_SAMPLE_RATE fraction of them) to the slow request log.
+    """
+    global _request_metrics
+    if _request_metrics is None:
+        with _request_metrics_lock:
+            if _request_metrics is None:
+                _request_metrics = MetricsRegistry(
+                    slow_threshold=_config('LLM_SLOW_REQUEST_SECONDS', 20),
+                    slow_sample_rate=_config('LLM_SLOW_REQUEST_SAMPLE_RATE', 1.0),
+                    slow_logger=globals.llm_slow_logger,
+                )
+    return _request_metrics
+
+
+def _start_trace(llm_model, kind):
+    return RequestTrace(model_name(llm_model), kind)
+
+
+def _wait_for_generation_slot(ticket):
+    """Blocks until the ticket is granted a generation slot; gives up after LLM_QUEUE_TIMEOUT seconds."""
+    if not ticket.wait(timeout=_config('LLM_QUEUE_TIMEOUT', 120)):
+        ticket.release()
+        raise GenerationTimeoutError(ticket.queue, ticket.scheduler.retry_after())
+
+
+def _stream_generation_slot(ticket):
+    """
+    Streaming version of _wait_for_generation_slot: while the ticket waits, yields a queue_status frame
+    with its queue position every LLM_QUEUE_STATUS_INTERVAL seconds. Yields nothing if a slot is free.
+    """
+    deadline = time.monotonic() + _config('LLM_QUEUE_TIMEOUT', 120)
+    interval = _config('LLM_QUEUE_STATUS_INTERVAL', 1.0)
+    while not ticket.wait(timeout=interval):
+        if time.monotonic() >= deadline:
+            ticket.release()
+            raise GenerationTimeoutError(ticket.queue, ticket.scheduler.retry_after())
+        yield json.dumps({"content_type": "queue_status", "queue_position": ticket.position()}) + "\n"
+
+
+def get_model_manager():
+    """
+    Returns the process-wide ModelManager, which sets the keep_alive of every chat request.
+    DEFAULT_LLM and the LLM_PINNED_MODELS are kept loaded; other models use LLM_KEEP_ALIVE_BY_MODEL
+    or LLM_KEEP_ALIVE and are unloaded by the sweep in start_model_manager when rarely used.
+    """
+    global _model_manager
+    if _model_manager is None:
+        with _model_manager_lock:
+            if _model_manager is None:
+                _model_manager = ModelManager(
+                    ollama,
+                    pinned=[DEFAULT_LLM] + _config('LLM_PINNED_MODELS', []),
+                    keep_alive=_config('LLM_KEEP_ALIVE_BY_MODEL', {}),
+                    default_keep_alive=_config('LLM_KEEP_ALIVE', '10m'),
+                    idle_unload_seconds=_config('LLM_MODEL_IDLE_UNLOAD_SECONDS', 1800),
+                    max_resident=_config('LLM_MAX_RESIDENT_MODELS', 2),
+                )
+                _model_manager.add_listener(lambda name: invalidate_llm_models_cache())
+    return _model_manager
+
+
+def _manage_models(app):
+    """Background thread: warms up the pinned models, then sweeps idle models every LLM_MODEL_SWEEP_SECONDS."""
+    with app.app_context():
+        manager = get_model_manager()
+        if _config('LLM_WARMUP_ENABLED', True):
+            for name in sorted(manager.pinned):
+                try:
+                    manager.warm_up(name)
+                except Exception as e:
+                    globals.llm_logger.warning(f" - Could not warm up model {name}: {e}")
+
+        interval = _config('LLM_MODEL_SWEEP_SECONDS', 300)
+        while interval > 0:
+            time.sleep(interval)
+            try:
+                unloaded = manager.sweep()
+                if unloaded:
+                    globals.llm_logger.info(f" - Unloaded rarely used models: {unloaded}")
+            except Exception as e:
+                globals.llm_logger.warning(f" - Model sweep failed: {e}")
+
+
+def start_model_manager(app):
+    """Starts model warm-up and the idle-model sweep in the background. Called once at app startup."""
+    global _model_manager_thread
+    with _model_manager_lock:
+        if _model_manager_thread is None:
+            _model_manager_thread = threading.Thread(target=_manage_models, args=(app,), name="llm-models", daemon=True)
+            _model_manager_thread.start()
+
+
+def _token_coalescer():
+    """Merges streamed tokens into frames sent every LLM_STREAM_FLUSH_MS milliseconds or LLM_STREAM_FLUSH_BYTES bytes."""
+    return TokenCoalescer(_config('LLM_STREAM_FLUSH_MS', 50) / 1000, _config('LLM_STREAM_FLUSH_BYTES', 512))
+
+
+def _lookup_titles_async(filenames, trace):
+    """Runs get_titles_from_filenames on a worker thread (in this app's context) and returns its Future."""
+    app = current_app._get_current_object()
+
+    def lookup():
+        with app.app_context(), trace.span('titles'):
+            return get_titles_from_filenames(filenames)
+
+    return _title_lookup_executor.submit(lookup)
+
+
+def collection_changed():
+    """
+    Call after writing to the ChromaDB collection: invalidates cached retrieval results and has the
+    BM25 index rebuilt on next use.
+    """
+    global _chroma_document_count
+    collection = get_chroma_collection()
+    with _chroma_lock:
+        _chroma_document_count = collection.count()
+    with _bm25_lock:
+        _bm25["stale"] = True
+    bump_collection_version()
+
+
+def reset_chroma_connection():
+    """Drops the cached ChromaDB client so the next call to get_chroma_collection reconnects."""
+    global _chroma_client, _chroma_collection
+    with _chroma_lock:
+        _chroma_client = None
+        _chroma_collection = None
+
+
+def _build_bm25_index(app):
+    """Reads every chunk from the ChromaDB collection and builds the BM25 index. Runs in a background thread."""
+    try:
+        with app.app_context():
+            collection = get_chroma_collection()
+            ids, documents, metadatas = [], [], []
+            page_size = 5000
+            while True:
+                page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=len(ids))
+                if not page['ids']:
+                    break
+                ids.extend(page['ids'])
+                documents.extend(page['documents'])
+                metadatas.extend(page['metadatas'])
+                if len(page['ids']) < page_size:
+                    break
+
+        index = BM25Index(ids, documents)
+        with _bm25_lock:
+            _bm25["index"] = index
+            _bm25["chunks"] = dict(zip(ids, zip(documents, metadatas)))
+        globals.llm_logger.info(f" - Built BM25 index over {len(ids)} chunks")
+    except Exception as e:
+        globals.llm_logger.error(f" - Building the BM25 index failed: {e}")
+    finally:
+        with _bm25_lock:
+            _bm25["building"] = False
+
+
+def get_bm25_index():
+    """
+    Returns (index, {chunk id: (document, metadata)}) for keyword search over the collection.
+
+    The index is built in a background thread on first use and rebuilt when the collection's document
+    count changes; until the first build finishes this returns (None, None) and retrieval is vector-only.
+    """
+    with _bm25_lock:
+        index = _bm25["index"]
+        stale = index is None or _bm25["stale"] or (_chroma_document_count is not None and len(index) != _chroma_document_count)
+        if stale and not _bm25["building"]:
+            _bm25["building"] = True
+            _bm25["stale"] = False
+            threading.Thread(
+                target=_build_bm25_index, args=(current_app._get_current_object(),), name="bm25-build", daemon=True
+            ).start()
+        return index, _bm25["chunks"]
+
+
+def _hybrid_rank(query_string, query_results, top_n, n_candidates):
+    """Fuses the vector results with BM25 results (reciprocal-rank fusion), then reranks and de-duplicates them."""
+    chunks = {
+        chunk_id: (document, metadata)
+        for chunk_id, document, metadata in zip(query_results['ids'][0], query_results['documents'][0], query_results['metadatas'][0])
+    }
+    rankings = [list(query_results['ids'][0])]
+
+    index, indexed_chunks = get_bm25_index()
+    if index is not None:
+        keyword_ids = [chunk_id for chunk_id, _ in index.search(query_string, n_candidates)]
+        rankings.append(keyword_ids)
+        for chunk_id in keyword_ids:
+            chunks.setdefault(chunk_id, indexed_chunks[chunk_id])
+
+    fused = reciprocal_rank_fusion(rankings, k=_config('HYBRID_RRF_K', 60))[:2 * top_n]
+    return rerank(query_string, [(chunk_id, score, *chunks[chunk_id]) for chunk_id, score in fused], top_n)
+
+
+def get_prompt_token_budget(llm_model):
+    """Prompt token budget for a model: LLM_PROMPT_TOKEN_BUDGETS[model] (by name, without the tag), else LLM_PROMPT_TOKEN_BUDGET."""
+    budgets = _config('LLM_PROMPT_TOKEN_BUDGETS', {})
+    return budgets.get(llm_model, budgets.get(llm_model.split(':')[0], _config('LLM_PROMPT_TOKEN_BUDGET', 3000)))
+
 
 def retrieve_relevant_chunks(query_string, top_n=3):
     """
@@ -32,6 +473,10 @@ def retrieve_relevant_chunks(query_string, top_n=3):
     - query_string (str): The query string to search for in the Qdrant vector database.
     - top_n (int): The number of most relevant chunks to return. Default is 3.
 
+    With HYBRID_RETRIEVAL_ENABLED, top_n * HYBRID_CANDIDATE_MULTIPLIER vector results are fused with a
+    local BM25 keyword search over the same chunks, reranked, and near-duplicates dropped, so fewer
+    chunks give better context.
+
     Output:
     - scored_points (list): A list of the most relevant chunks and their similarity scores.
     """
@@ -39,19 +484,33 @@ def retrieve_relevant_chunks(query_string, top_n=3):
     # Generate the embedding for the query string using Ollama's embedding model.
     # ChromaDB automatically handles embedding generation, so we can use it directly.
 
-    # Open our ChromaDB vector database
-    #chroma_client = chromadb.PersistentClient(path=CHROMADB_PATH)
-    chroma_client = chromadb.HttpClient(host="localhost", port=8100)  # Use the HTTP client to connect to ChromaDB. Preferred for production use
+    # Repeated questions are answered from the retrieval cache (memory, then disk) without querying ChromaDB
+    hybrid = _config('HYBRID_RETRIEVAL_ENABLED', True)
+    n_candidates = top_n * _config('HYBRID_CANDIDATE_MULTIPLIER', 3) if hybrid else top_n
+    cache_variant = f"{top_n}-hybrid" if hybrid else top_n
 
-    #globals.llm_logger.info(f" - retrieve_relevant_chunks: Connected to ChromaDB collection {CHROMADB_COLLECTION_NAME}")
-    chroma_collection = chroma_client.get_collection(name=CHROMADB_COLLECTION_NAME)
+    cache = get_retrieval_cache()
+    if cache is not None:
+        cached_chunks = cache.get(query_string, cache_variant)
+        if cached_chunks is not None:
+            return cached_chunks
 
-    # Search the ChromaDB collection for the most relevant chunks
-    query_results = chroma_collection.query(
-        query_texts=[query_string],  # The query string to search for. Automatically encoded by ChromaDB
-        n_results=top_n,  # The number of most relevant chunks to return
-        include=["documents", "metadatas"]  # Include the documents and metadata in the results
-    )
+    # Use the shared ChromaDB collection handle; the client and collection are reused across requests
+    #chroma_client = chromadb.PersistentClient(path=CHROMADB_PATH)
+    def query(collection):
+        # Search the ChromaDB collection for the most relevant chunks
+        return collection.query(
+            query_texts=[query_string],  # The query string to search for. Automatically encoded by ChromaDB
+            n_results=n_candidates,  # The number of most relevant chunks to return
+            include=["documents", "metadatas"]  # Include the documents and metadata in the results
+        )
+
+    try:
+        query_results = query(get_chroma_collection())
+    except Exception as e:
+        # The server may have restarted since the last health check; reconnect and retry once
+        globals.llm_logger.warning(f" - retrieve_relevant_chunks: ChromaDB query failed, reconnecting: {e}")
+        query_results = query(get_chroma_collection(reconnect=True))
 
 
     #globals.llm_logger.info(f" - retrieve_relevant_chunks: Query successful! Query results: {query_results}")
@@ -64,7 +523,12 @@ def retrieve_relevant_chunks(query_string, top_n=3):
     _qrd0 = list(qrd0)  # Convert the documents to a list
     _qrm0 = list(qrm0)  # Convert the metadata to a list
     
-    scored_points = list(zip(_qrd0, _qrm0))
+    if hybrid:
+        scored_points = _hybrid_rank(query_string, query_results, top_n, n_candidates)
+    else:
+        scored_points = list(zip(_qrd0, _qrm0))
+    if cache is not None:
+        cache.set(query_string, cache_variant, scored_points)
     #globals.llm_logger.info(f" - scored_points is {scored_points}")
 
     # With the scored_points gathered, we can now return those points to be
@@ -110,68 +574,96 @@ def get_llm_output(parameters):
     globals.llm_logger.info(f" - get_llm_output: User query: {user_query}")
     globals.llm_logger.info(f" - get_llm_output: Chat history: {chat_history}")
     globals.llm_logger.info(f" - get_llm_output: LLM model: {llm_model}")
+    trace = _start_trace(llm_model, 'chat')
 
     #stream = parameters['stream']  # if 'stream' in parameters else False  # Whether to stream the response from the LLM, default is False
     # globals.llm_logger.info("get_llm_output: Retrieving relevant chunks for the user query. Calling retrieve_relevant_chunks()")
-    # IMPORTANT: We are using a top_n of 6 to retrieve the most relevant chunks from the Chroma database.
+    # IMPORTANT: We are using a top_n of 6 (RAG_TOP_N) to retrieve the most relevant chunks from the Chroma database.
     # This can be adjusted based on the use case and the amount of context needed for the LLM to generate a response.
     # HOWEVER, if we attempt to use too many context chunks, the LLM may not be able to process them all, or may not be able to reference the chat history either.
     # When top_n < 6, the LLM is not provided enough context to generate an informative response.
-    context_chunks = retrieve_relevant_chunks(user_query, top_n=10)
+    with trace.span('retrieval'):
+        context_chunks = retrieve_relevant_chunks(user_query, top_n=_config('RAG_TOP_N', 6))
 
     # context_chunks will be a list of tuples (text, metadata) where
     # text is the text chunk and metadata is a dictionary containing
     # the filename and other relevant information.
     # For example, context_chunks = [(text_chunk_1, {'source_file': 'file1.txt'}), (text_chunk_2, {'source_file': 'file2.txt'})]
 
-    # Save the file name for each point in a set to use to generate our references
-    referenced_documents = set()
-
-    # Iterate through the retrieved context chunks and store the text and metadata
-    # in a list of tuples (text, file_name).
-    for _, metadata in context_chunks:
-        # Store the text and file name in the list of context chunks
-        # The metadata is a dictionary containing the document ID and other relevant information.
-        referenced_documents.add(metadata['source_file'])
-        #context_chunks.append((text, metadata['source_file']))
-
-
-    # instruction_prompt = f'''You are a helpful chatbot that only answers questions related to agriculture and water management.
-    # Use the previous conversation history and the following pieces of context to answer the question.
-    # {'\n'.join([f' - {doc}' for doc, _ in context_chunks])}
-    # '''
-
     # AgWater specific instruction prompt for the chatbot. Still needs further work
     # to ensure that the chatbot only answers questions related to agriculture and water management.
-    instruction_prompt = f'''You are a helpful chatbot that only answers questions related to agriculture and water management.
+    instructions = '''You are a helpful chatbot that only answers questions related to agriculture and water management.
     Use the previous conversation history and the following pieces of context to answer the question. If the answer is not in the context, state that the answer is not available.
-    Don't make up any new information and strictly only rely on the sources provided and the chat history:
-    {'\n'.join([f' - {doc}' for doc, _ in context_chunks])}
-    '''
-
-
-    #globals.llm_logger.info(f"after setting instruction prompt - user_query={user_query}, llm_model={llm_model}, stream={stream}")
-
-    ollama_messages = chat_history + [
-        {'role': 'system', 'content': instruction_prompt},
-        {'role': 'user', 'content': user_query}
-    ]
-
+    Don't make up any new information and strictly only rely on the sources provided and the chat history:'''
+
+    # Fit the prompt to the model's token budget: recent turns verbatim, older turns summarized,
+    # and the context chunks picked by MMR so overlapping chunks don't crowd out distinct ones
+    with trace.span('prompt'):
+        prompt = assemble_prompt(
+            instructions, context_chunks, chat_history, user_query,
+            budget_tokens=get_prompt_token_budget(llm_model),
+            recent_turns=_config('LLM_RECENT_TURNS', 2),
+        )
+    instruction_prompt = prompt['instruction_prompt']
+    context_chunks = prompt['context_chunks']
+    chat_history = prompt['chat_history']
+    ollama_messages = prompt['messages']
+    globals.llm_logger.info(f" - get_llm_output: Prompt of ~{prompt['estimated_tokens']} tokens, {len(context_chunks)} chunks, {len(chat_history)} history messages")
 
-    # Use the Ollama API to chat with the chatbot
-    response = ollama.chat(
-        model = llm_model,  # Use the specified LLM model
-        # messages = chat_history + [
-        #     {'role': 'system', 'content': instruction_prompt},
-        #     {'role': 'user', 'content': user_query},
-        # ],
-        messages = ollama_messages,
-        stream = False,  # Set to True for streaming response
-    )
+    # Save the file name for each chunk used in the prompt to generate our references
+    referenced_documents = set()
+    for _, metadata in context_chunks:
+        # The metadata is a dictionary containing the document ID and other relevant information.
+        referenced_documents.add(_reference_name(metadata))
+
+
+    # Reuse the answer if this model already answered the same question with the same context and history
+    answer_cache = get_answer_cache()
+    cache_key = None
+    llm_response = None
+    if answer_cache is not None:
+        cache_key = answer_cache.make_key(llm_model, instruction_prompt, context_chunks, chat_history, user_query)
+        llm_response = answer_cache.get(cache_key)
+
+    if llm_response is None:
+        # Wait for a generation slot; the route passes in the ticket it was admitted with
+        ticket = parameters.get('ticket') or get_generation_scheduler().submit('sync')
+        try:
+            with trace.span('queue'):
+                _wait_for_generation_slot(ticket)
+        except GenerationTimeoutError:
+            trace.finish('timeout')
+            get_request_metrics().record(trace)
+            raise
+        trace.generation_started()
+        try:
+            # Use the Ollama API to chat with the chatbot
+            response = ollama.chat(
+                model = llm_model,  # Use the specified LLM model
+                # messages = chat_history + [
+                #     {'role': 'system', 'content': instruction_prompt},
+                #     {'role': 'user', 'content': user_query},
+                # ],
+                messages = ollama_messages,
+                stream = False,  # Set to True for streaming response
+                keep_alive = get_model_manager().keep_alive_for(llm_model),
+            )
+        finally:
+            ticket.release()
+        get_model_manager().record_use(llm_model, response)
+        trace.generation_finished(response)
+        llm_response = response['message']['content']
+        if answer_cache is not None:
+            answer_cache.set(cache_key, llm_model, llm_response)
+    else:
+        trace.status = 'cached'
 
     #
     rds = list(referenced_documents)
-    rts, _ = get_titles_from_filenames(rds)  # Get the titles for the referenced documents
+    with trace.span('titles'):
+        rts, _ = get_titles_from_filenames(rds)  # Get the titles for the referenced documents
+    trace.finish(trace.status)
+    get_request_metrics().record(trace)
 
     # Check if the response is being streamed or not. If it is being streamed, we need to handle the resulting ChatResponse Generator object
     # if stream:
@@ -189,7 +681,7 @@ def get_llm_output(parameters):
 
     # else:   # If the response is not being streamed, we can return the final response directly
         #globals.llm_logger.info(f" - get_llm_output: Final response: {response['message']['content']}")
-    return json.dumps({"content_type": "llm_response", "llm_response": response['message']['content'], "referenced_documents": rds, 'referenced_titles': rts})
+    return json.dumps({"content_type": "llm_response", "llm_response": llm_response, "referenced_documents": rds, 'referenced_titles': rts})
 
 
 
@@ -215,6 +707,9 @@ def get_llm_output_stream(parameters):
     user_query = parameters['user_query'].strip()  # Get the user query from the parameters and strip any leading/trailing whitespace
     if not user_query:
         return {"error": "User query cannot be empty"}, 400
+
+    # Let the client know right away that the request was accepted; retrieval and generation follow
+    yield json.dumps({"content_type": "accepted"}) + "\n"
     
     chat_history_raw = parameters['chat_history']  # Assuming chat_history is a list of previous messages each stored as a dictionary with "question" and "answer" keys
     # IMPORTANT: In order for the LLM to be able to use the chat history, it must be a list of dictionaries that contains the "role" and "content" keys for both
@@ -226,81 +721,162 @@ def get_llm_output_stream(parameters):
         chat_history.append({"role": "assistant", "content": msg["answer"]})
 
     llm_model = parameters['llm_model']  # if 'llm_model' in parameters else DEFAULT_LLM  # Use the specified LLM model or default to DEFAULT_LLM if not provided
+    trace = _start_trace(llm_model, 'chat_stream')
     
     #stream = parameters['stream']  # if 'stream' in parameters else False  # Whether to stream the response from the LLM, default is False
 
     # globals.llm_logger.info("get_llm_output: Retrieving relevant chunks for the user query. Calling retrieve_relevant_chunks()")
-    # IMPORTANT: We are using a top_n of 3 to retrieve the most relevant chunks from the Chroma database.
+    # IMPORTANT: We are using a top_n of 6 (RAG_TOP_N) to retrieve the most relevant chunks from the Chroma database.
     # This can be adjusted based on the use case and the amount of context needed for the LLM to generate a response.
     # HOWEVER, if we attempt to use too many context chunks, the LLM may not be able to process them all, or may not be able to reference the chat history either.
-    context_chunks = retrieve_relevant_chunks(user_query, top_n=10)
+    with trace.span('retrieval'):
+        context_chunks = retrieve_relevant_chunks(user_query, top_n=_config('RAG_TOP_N', 6))
 
     # context_chunks will be a list of tuples (text, metadata) where
     # text is the text chunk and metadata is a dictionary containing
     # the filename and other relevant information.
     # For example, context_chunks = [(text_chunk_1, {'source_file': 'file1.txt'}), (text_chunk_2, {'source_file': 'file2.txt'})]
 
-    # Save the file name for each point in a set to use to generate our references
-    referenced_documents = set()
-
-    # Iterate through the retrieved context chunks and store the text and metadata
-    # in a list of tuples (text, file_name).
-    for _, metadata in context_chunks:
-        # Store the text and file name in the list of context chunks
-        # The metadata is a dictionary containing the document ID and other relevant information.
-        referenced_documents.add(metadata['source_file'])
-        #context_chunks.append((text, metadata['source_file']))
-
-    # instruction_prompt = f'''You are a helpful chatbot that only answers questions related to agriculture and water management.
-    # Use the previous conversation history and the following pieces of context to answer the question.
-    # {'\n'.join([f' - {doc}' for doc, _ in context_chunks])}
-    # '''
-
     # AgWater specific instruction prompt for the chatbot. Still needs further work
     # to ensure that the chatbot only answers questions related to agriculture and water management.
-    instruction_prompt = f'''You are a helpful chatbot that only answers questions related to agriculture and water management.
+    instructions = '''You are a helpful chatbot that only answers questions related to agriculture and water management.
     Use only the previous conversation history and the following pieces of context to answer the question. If the answer is not in the context, state that the answer is not available.
-    Don't make up any new information and strictly only rely on the sources provided and the chat history:
-    {'\n'.join([f' - {doc}' for doc, _ in context_chunks])}
-    '''
-
-
-    #globals.llm_logger.info(f"after setting instruction prompt - user_query={user_query}, llm_model={llm_model}, stream={stream}")
-
-    ollama_messages = chat_history + [
-        {'role': 'system', 'content': instruction_prompt},
-        {'role': 'user', 'content': user_query}
-    ]
+    Don't make up any new information and strictly only rely on the sources provided and the chat history:'''
+
+    # Fit the prompt to the model's token budget: recent turns verbatim, older turns summarized,
+    # and the context chunks picked by MMR so overlapping chunks don't crowd out distinct ones
+    with trace.span('prompt'):
+        prompt = assemble_prompt(
+            instructions, context_chunks, chat_history, user_query,
+            budget_tokens=get_prompt_token_budget(llm_model),
+            recent_turns=_config('LLM_RECENT_TURNS', 2),
+        )
+    instruction_prompt = prompt['instruction_prompt']
+    context_chunks = prompt['context_chunks']
+    chat_history = prompt['chat_history']
+    ollama_messages = prompt['messages']
+    globals.llm_logger.info(f" - get_llm_output_stream: Prompt of ~{prompt['estimated_tokens']} tokens, {len(context_chunks)} chunks, {len(chat_history)} history messages")
 
+    # Save the file name for each chunk used in the prompt to generate our references
+    referenced_documents = set()
+    for _, metadata in context_chunks:
+        # The metadata is a dictionary containing the document ID and other relevant information.
+        referenced_documents.add(_reference_name(metadata))
 
-    # Use the Ollama API to chat with the chatbot
-    response = ollama.chat(
-        model = llm_model,  # Use the specified LLM model
-        # messages = chat_history + [
-        #     {'role': 'system', 'content': instruction_prompt},
-        #     {'role': 'user', 'content': user_query},
-        # ],
-        messages = ollama_messages,
-        stream = True,  # Set to True for streaming response
-    )
 
-    #
+    # Look up the titles of the referenced documents while the answer is being generated;
+    # the document_info frame is sent as soon as they are ready
     rds = list(referenced_documents)
-    rts, _ = get_titles_from_filenames(rds)  # Get the titles for the referenced documents
+    titles_future = _lookup_titles_async(rds, trace)
+
+    def document_info_frame():
+        rts, _ = titles_future.result()  # Get the titles for the referenced documents
+        return json.dumps({"content_type": "document_info", "referenced_documents": rds, "referenced_titles": rts}) + "\n"
+
+    # A cached answer (see get_llm_output) is replayed token by token instead of generating it again
+    answer_cache = get_answer_cache()
+    cache_key = None
+    cached_answer = None
+    if answer_cache is not None:
+        cache_key = answer_cache.make_key(llm_model, instruction_prompt, context_chunks, chat_history, user_query)
+        cached_answer = answer_cache.get(cache_key)
+
+    ticket = parameters.get('ticket')
+    if cached_answer is None:
+        # Wait for a generation slot, telling the client its queue position meanwhile
+        ticket = ticket or get_generation_scheduler().submit('stream')
+        try:
+            with trace.span('queue'):
+                yield from _stream_generation_slot(ticket)
+        except GenerationTimeoutError as e:
+            trace.finish('timeout')
+            get_request_metrics().record(trace)
+            yield json.dumps({"content_type": "error", "error": str(e), "retry_after": e.retry_after}) + "\n"
+            return
+
+        # Use the Ollama API to chat with the chatbot
+        trace.generation_started()
+        response = ollama.chat(
+            model = llm_model,  # Use the specified LLM model
+            # messages = chat_history + [
+            #     {'role': 'system', 'content': instruction_prompt},
+            #     {'role': 'user', 'content': user_query},
+            # ],
+            messages = ollama_messages,
+            stream = True,  # Set to True for streaming response
+            keep_alive = get_model_manager().keep_alive_for(llm_model),
+        )
 
     # Check if the response is being streamed or not. If it is being streamed, we need to handle the resulting ChatResponse Generator object
     # if stream:
     # If the response is being streamed, we need to handle the ChatResponse Generator object
     # and return the responses as they are generated.
 
-    yield json.dumps({"content_type": "document_info", "referenced_documents": rds, "referenced_titles": rts}) + "\n"
+    if cached_answer is not None:
+        if ticket is not None:
+            ticket.release()    # replaying needs no generation slot
+        yield document_info_frame()
+        coalescer = _token_coalescer()
+        for token in replay_tokens(cached_answer):
+            text = coalescer.add(token)
+            if text:
+                trace.first_token()
+                yield json.dumps({"content_type": "llm_response", "llm_response": text}) + "\n"
+        text = coalescer.flush()
+        if text:
+            trace.first_token()
+            yield json.dumps({"content_type": "llm_response", "llm_response": text}) + "\n"
+        trace.finish('cached')
+        get_request_metrics().record(trace)
+        return
+
+    # The slot is held until the last token is out (or the client disconnects and the generator is closed)
+    # Tokens are coalesced into fewer, larger llm_response frames (see TokenCoalescer)
+    answer_parts = []
+    document_info_sent = False
+    chunk = None
+    completed = False
+    coalescer = _token_coalescer()
+    try:
+        # usually ready by now (titles come from the in-memory catalog), so it goes out before prefill finishes
+        if titles_future.done():
+            yield document_info_frame()
+            document_info_sent = True
+        for chunk in response:
+            if not document_info_sent and titles_future.done():
+                text = coalescer.flush()    # keep the frames in order
+                if text:
+                    yield json.dumps({"content_type": "llm_response", "llm_response": text}) + "\n"
+                yield document_info_frame()
+                document_info_sent = True
+            # globals.llm_logger.info(f" - get_llm_output: Streaming response chunk: {chunk['message']['content']}")
+            # This implementation does retrieve each chunk of the response as it is generated,
+            # Return the chunk as a JSON string with the chat response and referenced documents
+            trace.first_token()
+            answer_parts.append(chunk['message']['content'])
+            text = coalescer.add(chunk['message']['content'])
+            if text:
+                yield json.dumps({"content_type": "llm_response", "llm_response": text}) + "\n"  # Yield each chunk of the response as a JSON string, including a newline character for proper streaming
+            #yield chunk['message']['content']
+        text = coalescer.flush()
+        if text:
+            yield json.dumps({"content_type": "llm_response", "llm_response": text}) + "\n"
+        completed = True
+    finally:
+        ticket.release()
+        # the final chunk carries the token counts; a request cut short is recorded as 'aborted'
+        trace.generation_finished(chunk if completed else None)
+        trace.finish('ok' if completed else 'aborted')
+        get_request_metrics().record(trace)
+
+    get_model_manager().record_use(llm_model, chunk)     # the final chunk carries load_duration
+
+    if not document_info_sent:
+        yield document_info_frame()
 
-    for chunk in response:
-        # globals.llm_logger.info(f" - get_llm_output: Streaming response chunk: {chunk['message']['content']}")
-        # This implementation does retrieve each chunk of the response as it is generated,
-        # Return the chunk as a JSON string with the chat response and referenced documents
-        yield json.dumps({"content_type": "llm_response", "llm_response": chunk['message']['content']}) + "\n"  # Yield each chunk of the response as a JSON string, including a newline character for proper streaming
-        #yield chunk['message']['content']
+    # Only complete answers are cached; if the client disconnects the generator is closed before this point
+    if answer_cache is not None:
+        answer_cache.set(cache_key, llm_model, ''.join(answer_parts))
 
     #globals.llm_logger.info(f" - get_llm_output: returning references for the documents: {rds}")
     #yield json.dumps({"done": True, "referenced_documents": rds, "referenced_titles": rts})  # Indicate that the streaming is done
@@ -347,9 +923,11 @@ def get_llm_output_without_RAG(parameters):
         chat_history.append({"role": "assistant", "content": msg["answer"]})
 
     #stream = parameters['stream']  # if 'stream' in parameters else False  # Whether to stream the response from the LLM, default is False
+    trace = _start_trace(llm_model, 'chat_no_rag')
 
     # globals.llm_logger.info("get_llm_output: Retrieving relevant chunks for the user query. Calling retrieve_relevant_chunks()")
-    context_chunks = retrieve_relevant_chunks(user_query, top_n=3)
+    with trace.span('retrieval'):
+        context_chunks = retrieve_relevant_chunks(user_query, top_n=3)
 
     # context_chunks will be a list of tuples (text, metadata) where
     # text is the text chunk and metadata is a dictionary containing
@@ -364,7 +942,7 @@ def get_llm_output_without_RAG(parameters):
     for _, metadata in context_chunks:
         # Store the text and file name in the list of context chunks
         # The metadata is a dictionary containing the document ID and other relevant information.
-        referenced_documents.add(metadata['source_file'])
+        referenced_documents.add(_reference_name(metadata))
         #context_chunks.append((text, metadata['source_file']))
 
 
@@ -378,20 +956,39 @@ def get_llm_output_without_RAG(parameters):
         {'role': 'user', 'content': user_query},
     ]
 
-    # Use the Ollama API to chat with the chatbot
-    response = ollama.chat(
-        model=llm_model,  # Use the specified LLM model
-        # messages=chat_history + [
-        #     {'role': 'system', 'content': instruction_prompt},
-        #     {'role': 'user', 'content': user_query},
-        # ],
-        messages=ollama_messages,
-        stream=False,  # Set to True for streaming response
-    )
+    # Wait for a generation slot; the route passes in the ticket it was admitted with
+    ticket = parameters.get('ticket') or get_generation_scheduler().submit('sync')
+    try:
+        with trace.span('queue'):
+            _wait_for_generation_slot(ticket)
+    except GenerationTimeoutError:
+        trace.finish('timeout')
+        get_request_metrics().record(trace)
+        raise
+    trace.generation_started()
+    try:
+        # Use the Ollama API to chat with the chatbot
+        response = ollama.chat(
+            model=llm_model,  # Use the specified LLM model
+            # messages=chat_history + [
+            #     {'role': 'system', 'content': instruction_prompt},
+            #     {'role': 'user', 'content': user_query},
+            # ],
+            messages=ollama_messages,
+            stream=False,  # Set to True for streaming response
+            keep_alive=get_model_manager().keep_alive_for(llm_model),
+        )
+    finally:
+        ticket.release()
+    get_model_manager().record_use(llm_model, response)
+    trace.generation_finished(response)
 
     #
     rds=list(referenced_documents)
-    rts, _ = get_titles_from_filenames(rds)  # Get the titles for the referenced documents
+    with trace.span('titles'):
+        rts, _ = get_titles_from_filenames(rds)  # Get the titles for the referenced documents
+    trace.finish()
+    get_request_metrics().record(trace)
 
     # If the response is not being streamed, we can return the final response directly
     #globals.llm_logger.info(f" - get_llm_output: Final response: {response['message']['content']}")
@@ -435,9 +1032,11 @@ def get_llm_output_stream_without_RAG(parameters):
         chat_history.append({"role": "assistant", "content": msg["answer"]})
 
     #stream = parameters['stream']  # if 'stream' in parameters else False  # Whether to stream the response from the LLM, default is False
+    trace = _start_trace(llm_model, 'chat_stream_no_rag')
 
     # globals.llm_logger.info("get_llm_output: Retrieving relevant chunks for the user query. Calling retrieve_relevant_chunks()")
-    context_chunks = retrieve_relevant_chunks(user_query, top_n=3)
+    with trace.span('retrieval'):
+        context_chunks = retrieve_relevant_chunks(user_query, top_n=3)
 
     # context_chunks will be a list of tuples (text, metadata) where
     # text is the text chunk and metadata is a dictionary containing
@@ -452,7 +1051,7 @@ def get_llm_output_stream_without_RAG(parameters):
     for _, metadata in context_chunks:
         # Store the text and file name in the list of context chunks
         # The metadata is a dictionary containing the document ID and other relevant information.
-        referenced_documents.add(metadata['source_file'])
+        referenced_documents.add(_reference_name(metadata))
         #context_chunks.append((text, metadata['source_file']))
 
 
@@ -466,7 +1065,19 @@ def get_llm_output_stream_without_RAG(parameters):
         {'role': 'user', 'content': user_query},
     ]
 
+    # Wait for a generation slot, telling the client its queue position meanwhile
+    ticket = parameters.get('ticket') or get_generation_scheduler().submit('stream')
+    try:
+        with trace.span('queue'):
+            yield from _stream_generation_slot(ticket)
+    except GenerationTimeoutError as e:
+        trace.finish('timeout')
+        get_request_metrics().record(trace)
+        yield json.dumps({"content_type": "error", "error": str(e), "retry_after": e.retry_after}) + "\n"
+        return
+
     # Use the Ollama API to chat with the chatbot
+    trace.generation_started()
     response = ollama.chat(
         model=llm_model,  # Use the specified LLM model
         # messages=chat_history + [
@@ -475,45 +1086,91 @@ def get_llm_output_stream_without_RAG(parameters):
         # ],
         messages=ollama_messages,
         stream=True,  # Set to True for streaming response
+        keep_alive=get_model_manager().keep_alive_for(llm_model),
     )
 
     #
     rds=list(referenced_documents)
-    rts, _ = get_titles_from_filenames(rds)  # Get the titles for the referenced documents
+    with trace.span('titles'):
+        rts, _ = get_titles_from_filenames(rds)  # Get the titles for the referenced documents
 
     # If the response is being streamed, we need to handle the ChatResponse Generator object
     # and return the responses as they are generated.
     yield json.dumps({"content_type": "document_info", "referenced_documents": rds, "referenced_titles": rts}) + "\n"  # Indicate that the streaming is done
 
-    for chunk in response:
-        # globals.llm_logger.info(f" - get_llm_output: Streaming response chunk: {chunk['message']['content']}")
-        # This implementation does retrieve each chunk of the response as it is generated,
-        # Return the chunk as a JSON string with the chat response and referenced documents
-        yield json.dumps({"content_type": "llm_response", "llm_response": chunk['message']['content']}) + "\n"
-        #yield chunk['message']['content']
+    chunk = None
+    completed = False
+    coalescer = _token_coalescer()
+    try:
+        for chunk in response:
+            # globals.llm_logger.info(f" - get_llm_output: Streaming response chunk: {chunk['message']['content']}")
+            # This implementation does retrieve each chunk of the response as it is generated,
+            # Return the chunk as a JSON string with the chat response and referenced documents
+            trace.first_token()
+            text = coalescer.add(chunk['message']['content'])
+            if text:
+                yield json.dumps({"content_type": "llm_response", "llm_response": text}) + "\n"
+            #yield chunk['message']['content']
+        text = coalescer.flush()
+        if text:
+            yield json.dumps({"content_type": "llm_response", "llm_response": text}) + "\n"
+        completed = True
+    finally:
+        ticket.release()
+        trace.generation_finished(chunk if completed else None)
+        trace.finish('ok' if completed else 'aborted')
+        get_request_metrics().record(trace)
+    get_model_manager().record_use(llm_model, chunk)
+
+def _load_llm_model_details():
+    """Lists the models installed in Ollama with their size and quantization, and whether they are loaded."""
+    try:
+        resident = set(get_model_manager().resident_models())
+    except Exception as e:
+        globals.llm_logger.warning(f" - _load_llm_model_details: Could not list loaded models: {e}")
+        resident = set()
+
+    details = []
+    for model in ollama.list()['models']:
+        info = model.get('details') or {}
+        name = model_name(model['model'])
+        details.append({
+            "name": model['model'].split(':')[0],  # Extract the model name before any version tag
+            "tag": model['model'],
+            "family": info.get('family'),
+            "parameter_size": info.get('parameter_size'),
+            "quantization_level": info.get('quantization_level'),
+            "size": model.get('size'),
+            "loaded": name in resident,
+        })
+    return details
+
+
+def get_llm_model_details():
+    """
+    Returns the models available in Ollama with their metadata (see _load_llm_model_details).
 
-# This function retrieves the list of LLM models available in Ollama.
-def get_llm_models():
+    The list is cached for LLM_MODELS_CACHE_TTL seconds; after that the cached list is still returned
+    while it is refreshed in the background. The model manager invalidates it when it loads, unloads
+    or pulls a model.
     """
-    This helper function retrieves the list of LLM models available in Ollama.
-    
-    Returns:
-        models (list[dict]): A list of models available in Ollama, including
-                                their names and their parameter sizes.
-    """
-    ollama_models = ollama.list()['models']
-    model_list = []
-    for model in ollama_models:
-        model_list.append(
-            # {
-            #     "name": model['model'],
-            #     "parameter_size": model['details']['parameter_size']
-            # }
-            model['model'].split(':')[0]  # Extract the model name before any version tag
-        )
+    global _models_cache
+    if _models_cache is None:
+        with _models_cache_lock:
+            if _models_cache is None:
+                _models_cache = StaleCache(
+                    'ollama-models',
+                    ttl=_config('LLM_MODELS_CACHE_TTL', 60),
+                    max_stale=_config('LLM_MODELS_MAX_STALE_SECONDS', 86400),
+                    max_entries=1,
+                )
+    details, _ = _models_cache.get('models', _load_llm_model_details)
+    return details
+
 
-    #return ['ollama']
-    return model_list
+def invalidate_llm_models_cache():
+    if _models_cache is not None:
+        _models_cache.invalidate()
 
 
 # DEBUGGING: This function is used to test the LLM service by sending a test query to the LLM model
@@ -530,25 +1187,28 @@ def test_llm(parameters):
     """
     globals.llm_logger.info(f" - test_llm: Querying the LLM model with the following parameters: {parameters}")
 
-    query_string = parameters['user_query'].strip()  # Get the test query string from the parameters
-    if not query_string:
-        return {"error": "Query string cannot be empty"}, 400
-    
-    # Parse the provided chat history if it exists and convert it to a list of dictionaries
-    # with "role" and "content" keys:
+    # The route may already hold a ticket; it is released on every path below, including bad input
+    ticket = parameters.get('ticket') or get_generation_scheduler().submit('test')
+    try:
+        query_string = parameters['user_query'].strip()  # Get the test query string from the parameters
+        if not query_string:
+            return {"error": "Query string cannot be empty"}, 400
 
-    chat_history_raw = parameters['chat_history']
-    chat_history = []
+        # Parse the provided chat history if it exists and convert it to a list of dictionaries
+        # with "role" and "content" keys:
 
-    for msg in chat_history_raw:
-        chat_history.append({"role": "user", "content": msg["question"]})
-        chat_history.append({"role": "assistant", "content": msg["answer"]})
+        chat_history_raw = parameters['chat_history']
+        chat_history = []
 
-    globals.llm_logger.info(f" - test_llm: Chat history: {chat_history}")
+        for msg in chat_history_raw:
+            chat_history.append({"role": "user", "content": msg["question"]})
+            chat_history.append({"role": "assistant", "content": msg["answer"]})
 
-    globals.llm_logger.info(f" - test_llm: Query string: {query_string}")
+        globals.llm_logger.info(f" - test_llm: Chat history: {chat_history}")
 
-    try:
+        globals.llm_logger.info(f" - test_llm: Query string: {query_string}")
+
+        _wait_for_generation_slot(ticket)
         response = ollama.chat(
             model=DEFAULT_LLM,  # Use the default LLM model
             messages=chat_history + [
@@ -556,6 +1216,7 @@ def test_llm(parameters):
                 {'role': 'user', 'content': query_string},
             ],
             stream=False,  # Set to True for streaming response
+            keep_alive=get_model_manager().keep_alive_for(DEFAULT_LLM),
         )
         #globals.llm_logger.info(f" - test_llm: Received response from LLM model: {response}")
         return json.dumps({"llm_response": response['message']['content'], "references": ["These", "are", "test", "documents"]})
@@ -565,6 +1226,8 @@ def test_llm(parameters):
         globals.llm_logger.error(f" - test_llm: Error querying the LLM model: {e}")
         return json.dumps({"error": str(e)}), 500
         #return {"error": str(e)}, 500
+    finally:
+        ticket.release()
     
     # If the response is being streamed, we need to handle the ChatResponse Generator object
     # if stream:
@@ -609,7 +1272,9 @@ def test_llm_streaming(parameters):
 
     globals.llm_logger.info(f" - test_llm_streaming: Query string: {query_string}")
 
+    ticket = parameters.get('ticket') or get_generation_scheduler().submit('test')
     try:
+        yield from _stream_generation_slot(ticket)
         response = ollama.chat(
             model=DEFAULT_LLM,  # Use the default LLM model
             messages=chat_history + [
@@ -617,6 +1282,7 @@ def test_llm_streaming(parameters):
                 {'role': 'user', 'content': query_string},
             ],
             stream=True,  # Set to True for streaming response
+            keep_alive=get_model_manager().keep_alive_for(DEFAULT_LLM),
         )
 
         # If the response is being streamed, we need to handle the ChatResponse Generator object
@@ -632,6 +1298,8 @@ def test_llm_streaming(parameters):
         globals.llm_logger.error(f" - test_llm_streaming: Error querying the LLM model: {e}")
         yield json.dumps({"error": str(e)}) + "\n"
         #yield {"error": str(e)}, 500
+    finally:
+        ticket.release()
 
 
 
@@ -646,10 +1314,167 @@ def test_llm_streaming(parameters):
 #     yield "Generator completed.\n"
 
 
+def _add_column(c, table, column, definition):
+    if column not in [row[1] for row in c.execute(f"PRAGMA table_info({table})")]:
+        try:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        except sqlite3.OperationalError as e:
+            if 'duplicate column' not in str(e):    # another worker process added it first
+                raise
+
+
+def migrate_llm_schema():
+    """
+    Creates the LLM tables and indexes, and upgrades older versions of them. Every step is idempotent;
+    it runs once per process at startup so request handlers don't have to. The whole migration is one
+    (immediate) transaction, so worker processes starting together apply it one at a time.
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        with conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS LLM_Sources (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    tags TEXT
+                )
+            """)
+            _add_column(c, 'LLM_Sources', 'content_hash', 'TEXT')
+            # name of the stored upload in LLM_UPLOAD_FOLDER; NULL for sources added before uploads were stored by id
+            _add_column(c, 'LLM_Sources', 'stored_name', 'TEXT')
+            # sources submitted before hashing have no hash (NULL), which the unique index allows any number of
+            c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_llm_sources_content_hash ON LLM_Sources (content_hash)")
+
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS LLM_Ratings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    rating INTEGER NOT NULL,
+                    model TEXT NOT NULL,
+                    comment TEXT,
+                    submitted_by TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(question, answer, model)
+                )
+            """)
+            # the answer cache polls for new poor ratings by id now (see _evict_poorly_rated_answers), so this
+            # index, created by earlier versions, only slowed down rating writes
+            c.execute("DROP INDEX IF EXISTS idx_llm_ratings_updated_at")
+            _migrate_ratings_summary(c)
+
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS LLM_Ingest_Jobs (
+                    id TEXT PRIMARY KEY,
+                    source_id INTEGER,
+                    filename TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    pages_total INTEGER,
+                    pages_done INTEGER DEFAULT 0,
+                    chunks_done INTEGER DEFAULT 0,
+                    error TEXT,
+                    created_at TEXT,
+                    updated_at TEXT
+                )
+            """)
+        globals.llm_logger.info(" - migrate_llm_schema: LLM tables are up to date")
+    finally:
+        conn.close()
+
+
+def _migrate_ratings_summary(c):
+    """
+    LLM_Ratings_Daily holds the number of ratings per (model, day, rating) and is kept current by
+    triggers on LLM_Ratings, so /llm/ratings/summary never scans the raw table. It is filled from
+    LLM_Ratings when first created.
+
+    INSERT OR REPLACE deletes the row it replaces without firing delete triggers (recursive_triggers
+    is off), so the BEFORE INSERT trigger takes the row about to be replaced out of the counts.
+    """
+    exists = c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'LLM_Ratings_Daily'").fetchone()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS LLM_Ratings_Daily (
+            model TEXT NOT NULL,
+            day TEXT NOT NULL,
+            rating INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (model, day, rating)
+        )
+    """)
+    if not exists:
+        c.execute("""
+            INSERT INTO LLM_Ratings_Daily (model, day, rating, count)
+            SELECT model, date(updated_at), rating, COUNT(*) FROM LLM_Ratings GROUP BY model, date(updated_at), rating
+        """)
+
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_llm_ratings_daily_replace BEFORE INSERT ON LLM_Ratings
+        BEGIN
+            UPDATE LLM_Ratings_Daily SET count = count - 1
+            WHERE (model, day, rating) IN (
+                SELECT model, date(updated_at), rating FROM LLM_Ratings
+                WHERE question = NEW.question AND answer = NEW.answer AND model = NEW.model
+            );
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_llm_ratings_daily_insert AFTER INSERT ON LLM_Ratings
+        BEGIN
+            INSERT INTO LLM_Ratings_Daily (model, day, rating, count) VALUES (NEW.model, date(NEW.updated_at), NEW.rating, 1)
+            ON CONFLICT (model, day, rating) DO UPDATE SET count = count + 1;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_llm_ratings_daily_update AFTER UPDATE OF model, rating, updated_at ON LLM_Ratings
+        BEGIN
+            UPDATE LLM_Ratings_Daily SET count = count - 1
+            WHERE model = OLD.model AND day = date(OLD.updated_at) AND rating = OLD.rating;
+            INSERT INTO LLM_Ratings_Daily (model, day, rating, count) VALUES (NEW.model, date(NEW.updated_at), NEW.rating, 1)
+            ON CONFLICT (model, day, rating) DO UPDATE SET count = count + 1;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_llm_ratings_daily_delete AFTER DELETE ON LLM_Ratings
+        BEGIN
+            UPDATE LLM_Ratings_Daily SET count = count - 1
+            WHERE model = OLD.model AND day = date(OLD.updated_at) AND rating = OLD.rating;
+        END
+    """)
+
+
+def _save_upload_hashed(file, folder):
+    """
+    Streams an uploaded file to a temporary file in folder while computing its SHA-256.
+    Returns (temporary path, hex digest); the caller moves the file into place or deletes it.
+    """
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=folder, suffix='.part', delete=False) as tmp:
+        try:
+            while True:
+                block = file.stream.read(1024 * 1024)
+                if not block:
+                    break
+                digest.update(block)
+                tmp.write(block)
+        except Exception:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    return tmp.name, digest.hexdigest()
+
+
 def put_llm_source(title, file, tags):
     """
     Inserts a new LLM source record into the AgWater SQLite database.
 
+    The file's SHA-256 is computed while it is saved; if a source with the same content was already
+    submitted (under any title or filename), nothing is stored or ingested and the existing source's
+    id is returned with 'duplicate': True.
+
     Args:
         title (str): The title of the source.
         file (File): The source filenames (e.g., URL or file path).
@@ -658,36 +1483,73 @@ def put_llm_source(title, file, tags):
     Returns:
         dict: Result of the operation.
     """
-    UPLOAD_FOLDER='D:\\AgWaterLLM\\uploads'
+    UPLOAD_FOLDER = _config('LLM_UPLOAD_FOLDER', 'D:\\AgWaterLLM\\uploads')
 
     if file.content_type != 'application/pdf':
         return json.dumps({"success": False, "message": "Only PDF files are allowed"}), 400
 
-    # Save the PDF file
-    filename = file.filename
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
+    # Save the PDF file. It is stored under its source id, so a different file uploaded with the same
+    # name (e.g. a revised bulletin) doesn't overwrite this one
+    filename = os.path.basename(file.filename)
+    filepath = None
+    tmp_path = None
 
     conn = sqlite3.connect(DB_PATH)
     try:
+        # Hash the upload while writing it to a temporary file; it is only moved into place if it is new
+        tmp_path, content_hash = _save_upload_hashed(file, UPLOAD_FOLDER)
+
         c = conn.cursor()
-        # Create table if it doesn't exist
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS LLM_Sources (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                filename TEXT NOT NULL,
-                tags TEXT
-            )
-        """)
-        # Insert the record
-        c.execute("""
-            INSERT INTO LLM_Sources (title, filename, tags)
-            VALUES (?, ?, ?)
-        """, (title, filename, ','.join(tags)))
+        c.execute("SELECT id, title, filename, stored_name FROM LLM_Sources WHERE content_hash = ?", (content_hash,))
+        existing = c.fetchone()
+        if existing is None:
+            try:
+                # Insert the record
+                c.execute("""
+                    INSERT INTO LLM_Sources (title, filename, tags, content_hash)
+                    VALUES (?, ?, ?, ?)
+                """, (title, filename, ','.join(tags), content_hash))
+            except sqlite3.IntegrityError:
+                # the same file was submitted concurrently and won the race
+                c.execute("SELECT id, title, filename, stored_name FROM LLM_Sources WHERE content_hash = ?", (content_hash,))
+                existing = c.fetchone()
+
+        if existing is not None:
+            source_id, existing_title, existing_filename, existing_stored_name = existing
+            globals.llm_logger.info(f"Duplicate LLM Source Submission: Title: {title}, File: {filename} matches source {source_id} ({existing_filename})")
+            result = {
+                'success': True,
+                'duplicate': True,
+                'source_id': source_id,
+                'message': f'This file was already submitted as "{existing_title}" ({existing_filename})',
+            }
+            # If the earlier ingest failed or was lost, ingest the source again rather than leaving it out
+            # of the collection for good; a job that is still in progress is reported instead
+            done, job_id = _ingest_state(c, source_id)
+            if not done:
+                if job_id is None:
+                    filepath = os.path.join(UPLOAD_FOLDER, existing_stored_name or existing_filename)
+                    if not os.path.exists(filepath):
+                        os.replace(tmp_path, filepath)
+                        tmp_path = None
+                    job_id = submit_ingest_job(source_id, filepath, existing_filename)
+                    globals.llm_logger.info(f"Re-queued ingestion of LLM source {source_id} ({existing_filename}), job {job_id}")
+                result['job_id'] = job_id
+            return json.dumps(result), 200
+
+        source_id = c.lastrowid
+        stored_name = f"{source_id}_{filename}"
+        c.execute("UPDATE LLM_Sources SET stored_name = ? WHERE id = ?", (stored_name, source_id))
         conn.commit()
-        file.save(filepath)
+        filepath = os.path.join(UPLOAD_FOLDER, stored_name)
+        os.replace(tmp_path, filepath)
+        tmp_path = None
+        get_sources_catalog(refresh=True)
         globals.llm_logger.info(f"Successful LLM Source Submission: Title: {title}, Tags: {tags}, File: {filename}")
 
+        # Chunking and embedding run in the background; the client can poll /llm/ingest_status with the job id
+        job_id = submit_ingest_job(source_id, filepath, filename)
+
     except sqlite3.Error as e:
         globals.llm_logger.error(f"DB Error inserting LLM source: {e}")
         return json.dumps({"success": False, "message": str(e)}), 500
@@ -698,49 +1560,354 @@ def put_llm_source(title, file, tags):
     
     finally:
         conn.close()
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         
-    return json.dumps({'success': True, 'message': 'Sourse submission successful'}), 200
+    return json.dumps({'success': True, 'message': 'Sourse submission successful', 'source_id': source_id, 'job_id': job_id}), 200
 
 
-def get_titles_from_filenames(filenames):
+def _ingest_job_cutoff():
+    """Jobs 'queued' or 'running' that haven't been updated since this time are taken to be abandoned."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - _config('INGEST_JOB_STALE_SECONDS', 3600)))
+
+
+def _ingest_state(c, source_id):
+    """
+    Returns (done, active job id) for a source: whether any of its ingest jobs finished, and the id of
+    one that is still queued or running (None if there is none, or it was abandoned).
     """
-    Query the LLM_Source table for a given filename and return the corresponding title.
+    c.execute("SELECT id, status, updated_at FROM LLM_Ingest_Jobs WHERE source_id = ? ORDER BY created_at DESC", (source_id,))
+    jobs = c.fetchall()
+    if any(status == 'done' for _, status, _ in jobs):
+        return True, None
+    cutoff = _ingest_job_cutoff()
+    active = [job_id for job_id, status, updated_at in jobs if status in ('queued', 'running') and updated_at >= cutoff]
+    return False, active[0] if active else None
 
-    Args:
-        filename (str): The filename string to search for.
 
-    Returns:
-        str or None: The title if found, otherwise None.
+def resume_ingest_jobs():
+    """
+    Re-queues ingest jobs left 'queued' or 'running' by a worker process that exited (restart, recycle
+    or crash), so their sources still get ingested. Runs at startup, in an application context.
+
+    A job counts as abandoned once it hasn't been updated for INGEST_JOB_STALE_SECONDS (a running job
+    updates its row after every batch). Each job is claimed with a conditional update, so only one of
+    several worker processes starting together re-queues it; it keeps its id, so clients polling
+    /llm/ingest_status see it resume. Jobs whose stored upload is gone are marked failed.
+    """
+    upload_folder = _config('LLM_UPLOAD_FOLDER', 'D:\\AgWaterLLM\\uploads')
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute("""
+            SELECT j.id, j.source_id, j.filename, j.updated_at, s.stored_name
+            FROM LLM_Ingest_Jobs j LEFT JOIN LLM_Sources s ON s.id = j.source_id
+            WHERE j.status IN ('queued', 'running') AND j.updated_at < ?
+        """, (_ingest_job_cutoff(),))
+        abandoned = c.fetchall()
+        for job_id, source_id, filename, updated_at, stored_name in abandoned:
+            filepath = os.path.join(upload_folder, stored_name or filename)
+            now = time.strftime('%Y-%m-%d %H:%M:%S')
+            if source_id is None or not os.path.exists(filepath):
+                fields, error = "status = 'failed', error = ?", 'The stored upload is missing'
+            else:
+                fields, error = "status = 'queued', pages_done = 0, chunks_done = 0, error = ?", None
+            with conn:
+                c.execute(
+                    f"UPDATE LLM_Ingest_Jobs SET {fields}, updated_at = ? "
+                    "WHERE id = ? AND updated_at = ? AND status IN ('queued', 'running')",
+                    (error, now, job_id, updated_at),
+                )
+            if c.rowcount != 1:
+                continue    # claimed by another worker process
+            if error is not None:
+                globals.llm_logger.warning(f" - resume_ingest_jobs: Job {job_id} for {filename} failed: {error}")
+                continue
+            _ingest_executor.submit(_ingest_source, current_app._get_current_object(), job_id, source_id, filepath, filename)
+            globals.llm_logger.info(f" - resume_ingest_jobs: Re-queued job {job_id} for {filename}")
+    finally:
+        conn.close()
+
+
+def _update_ingest_job(job_id, **fields):
+    fields['updated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        with conn:
+            conn.execute(
+                f"UPDATE LLM_Ingest_Jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                list(fields.values()) + [job_id],
+            )
+    finally:
+        conn.close()
+
+
+def submit_ingest_job(source_id, filepath, filename):
+    """
+    Queues an uploaded PDF for ingestion into the ChromaDB collection (see _ingest_source) and returns
+    the job id. Job progress is kept in LLM_Ingest_Jobs so any worker process can report it.
+    """
+    job_id = uuid.uuid4().hex
+    now = time.strftime('%Y-%m-%d %H:%M:%S')
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO LLM_Ingest_Jobs (id, source_id, filename, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, source_id, filename, now, now),
+            )
+    finally:
+        conn.close()
+
+    _ingest_executor.submit(_ingest_source, current_app._get_current_object(), job_id, source_id, filepath, filename)
+    return job_id
+
+
+def _ingest_source(app, job_id, source_id, filepath, filename):
+    """
+    Ingestion worker: extracts the PDF's text page by page, chunks it and upserts the chunks into the
+    collection in batches of INGEST_BATCH_SIZE, with the same 'source_file' metadata retrieval uses.
+    The collection's embedding function embeds each batch, as it does for queries, except for chunks
+    whose text is already in the collection (same chunk_hash, e.g. from an overlapping bulletin): those
+    reuse the stored embedding. Chunk ids are keyed by source id, so sources that share a filename
+    don't overwrite each other; chunks of this source left over from an earlier, longer run are deleted.
     """
+    with app.app_context():
+        try:
+            pages_total = count_pdf_pages(filepath)
+            _update_ingest_job(job_id, status='running', pages_total=pages_total)
+            globals.llm_logger.info(f" - _ingest_source: Ingesting {filename} ({pages_total} pages), job {job_id}")
+
+            progress = {'pages': 0}
+
+            def pages():
+                for page_number, text in iter_pdf_pages(filepath):
+                    progress['pages'] = page_number
+                    yield page_number, text
+
+            collection = get_chroma_collection()
+            chunks = chunk_pages(pages(), _config('INGEST_CHUNK_CHARS', 1000), _config('INGEST_CHUNK_OVERLAP', 200))
+            chunk_ids = []
+            reused = 0
+            for batch in batched(chunks, _config('INGEST_BATCH_SIZE', 64)):
+                ids = [f"{source_id}:{len(chunk_ids) + i}" for i in range(len(batch))]
+                hashes = [chunk_hash(text) for text, _ in batch]
+                metadatas = [
+                    {'source_file': filename, 'source_id': source_id, 'page': page_number, 'chunk_hash': h}
+                    for (_, page_number), h in zip(batch, hashes)
+                ]
+
+                # Embeddings already stored for identical chunks (of any source) are reused
+                found = collection.get(where={'chunk_hash': {'$in': sorted(set(hashes))}}, include=['metadatas', 'embeddings'])
+                known = {metadata['chunk_hash']: embedding for metadata, embedding in zip(found['metadatas'], found['embeddings'])}
+                new = [i for i, h in enumerate(hashes) if h not in known]
+                old = [i for i, h in enumerate(hashes) if h in known]
+                if new:
+                    collection.upsert(
+                        ids=[ids[i] for i in new],
+                        documents=[batch[i][0] for i in new],
+                        metadatas=[metadatas[i] for i in new],
+                    )
+                if old:
+                    collection.upsert(
+                        ids=[ids[i] for i in old],
+                        documents=[batch[i][0] for i in old],
+                        metadatas=[metadatas[i] for i in old],
+                        embeddings=[known[hashes[i]] for i in old],
+                    )
+                reused += len(old)
+                chunk_ids.extend(ids)
+                _update_ingest_job(job_id, pages_done=progress['pages'], chunks_done=len(chunk_ids))
+
+            existing = collection.get(where={'source_id': source_id}, include=[])['ids']
+            leftover = sorted(set(existing) - set(chunk_ids))
+            if leftover:
+                collection.delete(ids=leftover)
+
+            collection_changed()
+            _update_ingest_job(job_id, status='done', pages_done=pages_total, chunks_done=len(chunk_ids))
+            globals.llm_logger.info(f" - _ingest_source: Ingested {filename}: {len(chunk_ids)} chunks ({reused} with reused embeddings), job {job_id}")
+
+        except Exception as e:
+            globals.llm_logger.error(f" - _ingest_source: Ingesting {filename} failed (job {job_id}): {e}")
+            try:
+                _update_ingest_job(job_id, status='failed', error=str(e))
+            except sqlite3.Error as db_error:
+                globals.llm_logger.error(f" - _ingest_source: Could not record the failure of job {job_id}: {db_error}")
+
+
+def get_ingest_job(job_id):
+    """Returns the ingestion job's status and progress as a dict, or None if there is no such job."""
     conn = sqlite3.connect(DB_PATH)
-    titles = []
     try:
-        for filename in filenames:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM LLM_Ingest_Jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row is not None else None
+
+
+_SOURCE_COLUMNS = "id, title, filename, tags, stored_name"
+
+
+def _source_record(source_id, title, filename, tags, stored_name):
+    return {
+        "source_id": source_id,
+        "title": title,
+        "filename": filename,
+        # uploads are referenced (and served by /llm/source) by their stored name, which is unique;
+        # sources added before uploads were stored by id keep their filename
+        "reference": stored_name or filename,
+        "tags": tags.split(',') if tags else []
+    }
+
+
+def _add_to_catalog(catalog, record):
+    # the first row for a reference name wins, as with the original per-filename lookup
+    catalog.setdefault(record["reference"], record)
+    _sources_by_id[record["source_id"]] = record
+
+
+def get_sources_catalog(refresh=False):
+    """
+    Returns the in-memory catalog of LLM_Sources, {reference name: {'source_id', 'title', 'filename',
+    'reference', 'tags'}}, in insertion order (see _source_record).
+
+    The catalog is loaded on first use and reloaded when refresh=True (put_llm_source does this after
+    inserting) or once it is older than SOURCES_CATALOG_TTL seconds, so sources submitted through another
+    worker process show up too. Raises sqlite3.Error if the table can't be read.
+    """
+    global _sources_catalog, _sources_catalog_loaded_at, _sources_by_id
+    with _sources_catalog_lock:
+        if refresh or _sources_catalog is None or \
+                time.monotonic() - _sources_catalog_loaded_at >= _config('SOURCES_CATALOG_TTL', 300):
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                c = conn.cursor()
+                c.execute(f"SELECT {_SOURCE_COLUMNS} FROM LLM_Sources ORDER BY id")
+                rows = c.fetchall()
+            finally:
+                conn.close()
+            catalog = {}
+            _sources_by_id = {}
+            for row in rows:
+                _add_to_catalog(catalog, _source_record(*row))
+            _sources_catalog = catalog
+            _sources_catalog_loaded_at = time.monotonic()
+        return _sources_catalog
+
+
+def get_source_by_id(source_id):
+    """
+    Returns the catalog record for a source id (see get_sources_catalog), or None if there is no such
+    source. Sources added since the catalog was loaded are looked up in the database.
+    """
+    catalog = get_sources_catalog()
+    record = _sources_by_id.get(source_id)
+    if record is None:
+        conn = sqlite3.connect(DB_PATH)
+        try:
             c = conn.cursor()
-            c.execute("SELECT title FROM 'LLM_Sources' WHERE filename = ?", (filename,))
+            c.execute(f"SELECT {_SOURCE_COLUMNS} FROM LLM_Sources WHERE id = ?", (source_id,))
             row = c.fetchone()
-            if row is not None and row[0] is not None:
-                titles.append(row[0])
-            else:
-                titles.append(None)  # Append None if title not found for this filename
-                
+        finally:
+            conn.close()
+        if row is not None:
+            record = _source_record(*row)
+            with _sources_catalog_lock:
+                _add_to_catalog(catalog, record)
+    return record
+
+
+def _reference_name(metadata):
+    """
+    The name a retrieved chunk's source is referenced by (see _source_record). Chunks of uploaded
+    sources carry their source_id and are resolved through LLM_Sources, so sources that share a
+    filename are told apart; older chunks only have their source_file.
+    """
+    source_id = metadata.get('source_id')
+    if source_id is not None:
+        try:
+            record = get_source_by_id(source_id)
+            if record is not None:
+                return record["reference"]
+        except sqlite3.Error as e:
+            globals.llm_logger.warning(f" - Could not look up LLM source {source_id}: {e}")
+    return metadata['source_file']
+
+
+def get_titles_from_filenames(filenames):
+    """
+    Look up the titles for a list of referenced documents in the LLM_Sources catalog (see get_sources_catalog).
+    Names missing from the catalog are looked up in the database with a single query.
+
+    Args:
+        filenames (list[str]): The reference names to search for (stored upload names, or the filenames
+                               of sources added before uploads were stored by id).
+
+    Returns:
+        (list, str): The titles (None where a name is not found) and "success", or (None, error message).
+    """
+    try:
+        catalog = get_sources_catalog()
+        missing = [filename for filename in set(filenames) if filename not in catalog]
+        if missing:
+            placeholders = ','.join('?' * len(missing))
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                c = conn.cursor()
+                c.execute(
+                    f"SELECT {_SOURCE_COLUMNS} FROM LLM_Sources "
+                    f"WHERE stored_name IN ({placeholders}) OR (stored_name IS NULL AND filename IN ({placeholders})) ORDER BY id",
+                    missing + missing,
+                )
+                rows = c.fetchall()
+            finally:
+                conn.close()
+            with _sources_catalog_lock:
+                for row in rows:
+                    _add_to_catalog(catalog, _source_record(*row))
+
     except sqlite3.Error as e:
         return None, str(e)
 
     except Exception as e:
         return None, str(e)
 
-    finally:
-        conn.close()
-
+    titles = [catalog[filename]["title"] if filename in catalog else None for filename in filenames]
     return titles, "success"
 
 
 
+def get_rating_writer():
+    """
+    Returns the process-wide BatchWriter for LLM_Ratings, started on first use. Ratings are committed
+    every LLM_RATINGS_FLUSH_MS milliseconds or LLM_RATINGS_BATCH_SIZE rows, in one transaction, and
+    spooled to LLM_RATINGS_SPOOL_PATH when the database can't be written.
+    """
+    global _rating_writer
+    if _rating_writer is None:
+        with _rating_writer_lock:
+            if _rating_writer is None:
+                writer = BatchWriter(
+                    DB_PATH,
+                    "INSERT OR REPLACE INTO LLM_Ratings (question, answer, rating, model, comment, submitted_by, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    spool_path=_config('LLM_RATINGS_SPOOL_PATH', 'D:\\AgWaterLLM\\ratings.spool'),
+                    flush_interval=_config('LLM_RATINGS_FLUSH_MS', 200) / 1000,
+                    max_batch=_config('LLM_RATINGS_BATCH_SIZE', 100),
+                    name='llm-ratings-writer',
+                )
+                writer.start()
+                _rating_writer = writer
+    return _rating_writer
+
+
 def put_llm_rating(question, answer, rating, model, comment, submitted_by):
     """
-    Inserts a new LLM rating record into the AgWater SQLite database or replaces an existing one.
-    Uses SQL "INSERT OR REPLACE" to handle both insert and update operations.
+    Queues a new LLM rating record for the AgWater SQLite database, replacing an existing one.
+    The background rating writer (see get_rating_writer) stores it with "INSERT OR REPLACE", so the
+    request doesn't wait for the database.
 
     Args:
         question (str): The question asked by the user.
@@ -753,70 +1920,127 @@ def put_llm_rating(question, answer, rating, model, comment, submitted_by):
         dict: Result of the operation.
     """
     globals.llm_logger.info(f"put_llm_rating called: {question}, {rating}, {model}, {comment}, {submitted_by}")
-    conn = sqlite3.connect(DB_PATH)
     try:
-        c = conn.cursor()
-        # Create table if it doesn't exist with unique constraint
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS LLM_Ratings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                question TEXT NOT NULL,
-                answer TEXT NOT NULL,
-                rating INTEGER NOT NULL,
-                model TEXT NOT NULL,
-                comment TEXT,
-                submitted_by TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(question, answer, model)
-            )
-        """)
-        
-        # Use INSERT OR REPLACE to handle both insert and update
-        c.execute("INSERT OR REPLACE INTO LLM_Ratings (question, answer, rating, model, comment, submitted_by, updated_at) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
-                  (question, answer, rating, model, comment, submitted_by))
+        rating = int(rating)
+    except (TypeError, ValueError):
+        return {"success": False, "message": "rating must be an integer"}, 400
+    if question is None or answer is None or model is None:
+        return {"success": False, "message": "question, answer and model are required"}, 400
 
-        conn.commit()
-        globals.llm_logger.info("put_llm_rating successful")
+    try:
+        # updated_at in the same (UTC) format as CURRENT_TIMESTAMP, taken when the rating was submitted
+        get_rating_writer().submit([question, answer, rating, model, comment, submitted_by,
+                                    time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())])
+        globals.llm_logger.info("put_llm_rating queued")
+
+        # Poorly rated answers must not be served from the answer cache again
+        answer_cache = get_answer_cache()
+        if answer_cache is not None and rating <= _config('ANSWER_CACHE_MIN_RATING', 2):
+            answer_cache.evict_answer(model, answer)
 
-    except sqlite3.Error as e:
-        globals.llm_logger.error(f"DB Error inserting/replacing LLM rating: {e}")
-        conn.rollback()
-        return {"success": False, "message": str(e)}, 500
-    
     except Exception as e:
-        globals.llm_logger.error(f"Error inserting/replacing LLM rating: {e}")
-        conn.rollback()
+        globals.llm_logger.error(f"Error queueing LLM rating: {e}")
         return {"success": False, "message": str(e)}, 500
-        
-    finally:
-        conn.close()
            
     return {"success": True, "message": "LLM rating saved successfully"}
 
 
+def _summarize_counts(counts):
+    """{rating: count} -> {'count', 'mean', 'histogram'}"""
+    total = sum(counts.values())
+    return {
+        "count": total,
+        "mean": round(sum(rating * count for rating, count in counts.items()) / total, 3) if total else None,
+        "histogram": {str(rating): counts[rating] for rating in sorted(counts)},
+    }
+
+
+def get_ratings_summary(model=None, start_day=None, end_day=None):
+    """
+    Rating counts, means and histograms per model and per model and day, from LLM_Ratings_Daily.
+
+    Args:
+        model (str): only this model
+        start_day, end_day (str): inclusive 'YYYY-MM-DD' bounds on the day a rating was submitted
+
+    Returns:
+        dict: {"models": [{"model", "count", "mean", "histogram"}], "days": [{"day", "model", "count", "mean", "histogram"}]}
+    """
+    conditions, params = ["count > 0"], []
+    if model:
+        conditions.append("model = ?")
+        params.append(model)
+    if start_day:
+        conditions.append("day >= ?")
+        params.append(start_day)
+    if end_day:
+        conditions.append("day <= ?")
+        params.append(end_day)
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        rows = conn.execute(
+            f"SELECT model, day, rating, count FROM LLM_Ratings_Daily WHERE {' AND '.join(conditions)} ORDER BY model, day",
+            params,
+        ).fetchall()
+    finally:
+        conn.close()
+
+    by_model, by_day = {}, {}
+    for row_model, day, rating, count in rows:
+        model_counts = by_model.setdefault(row_model, {})
+        model_counts[rating] = model_counts.get(rating, 0) + count
+        day_counts = by_day.setdefault((day, row_model), {})
+        day_counts[rating] = day_counts.get(rating, 0) + count
+
+    return {
+        "models": [dict(model=name, **_summarize_counts(counts)) for name, counts in by_model.items()],
+        "days": [dict(day=day, model=name, **_summarize_counts(counts)) for (day, name), counts in sorted(by_day.items())],
+    }
+
+
+def get_source_file_index():
+    """
+    Returns the process-wide index of the PDFs in LLM_SOURCE_MATERIALS_DIR. /llm/source resolves
+    filenames through it, so only files that are actually in the directory can be served.
+    """
+    global _source_file_index
+    if _source_file_index is None:
+        with _source_file_index_lock:
+            if _source_file_index is None:
+                _source_file_index = FileIndex(
+                    _config('LLM_SOURCE_MATERIALS_DIR', 'D:/AgWaterLLM/source_materials'),
+                    extensions=('.pdf',),
+                    ttl=_config('LLM_SOURCE_INDEX_TTL', 300),
+                )
+    return _source_file_index
+
+
+def get_upload_file_index():
+    """
+    Returns the process-wide index of the uploaded PDFs in LLM_UPLOAD_FOLDER, stored under their source
+    id (see put_llm_source). /llm/source falls back to it for the reference names of uploaded sources.
+    """
+    global _upload_file_index
+    if _upload_file_index is None:
+        with _upload_file_index_lock:
+            if _upload_file_index is None:
+                _upload_file_index = FileIndex(
+                    _config('LLM_UPLOAD_FOLDER', 'D:\\AgWaterLLM\\uploads'),
+                    extensions=('.pdf',),
+                    ttl=_config('LLM_SOURCE_INDEX_TTL', 300),
+                )
+    return _upload_file_index
+
+
 def get_llm_sources():
     """
-    Retrieves all LLM sources from the AgWater SQLite database.
+    Retrieves all LLM sources from the in-memory LLM_Sources catalog (see get_sources_catalog).
     Returns:
         list[dict]: A list of dictionaries, each containing 'title', 'filename', and 'tags' for each source.
     """
     globals.llm_logger.info("get_llm_sources called")
-    # Connect to the SQLite database
-    conn = sqlite3.connect(DB_PATH)
-    sources = []
     try:
-        c = conn.cursor()
-        c.execute("SELECT title, filename, tags FROM LLM_Sources")
-        rows = c.fetchall()
-        for row in rows:
-            sources.append({
-                "title": row[0],
-                "filename": row[1],
-                "tags": row[2].split(',') if row[2] else []
-            })
+        return list(get_sources_catalog().values())
     except sqlite3.Error as e:
         return {"error": str(e)}, 500
-    finally:
-        conn.close()
-    return sources
\ No newline at end of file
@@ -0,0 +1,236 @@
+from flask import current_app
+import gzip
+import hashlib
+import json
+import math
+import threading
+from functools import lru_cache
+
+import numpy as np
+import globals
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip and identity are served
+    brotli = None
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Station metadata from usbr_map.json and crops_by_station.json, loaded once per process
+_stations = None
+_stations_lock = threading.Lock()
+
+
+def _load_stations(usbr_map_path, crops_by_station_path):
+    """
+    Loads the AgriMet station GeoJSON and the crops grown at each station into memory.
+
+    Returns:
+        dict: {
+            'geojson': the parsed usbr_map.json FeatureCollection,
+            'by_id': {siteid: feature},
+            'ids': np.ndarray of siteids,
+            'lat', 'lon': np.ndarray of coordinates (degrees),
+            'elevation': np.ndarray of station elevations (ft), NaN where unknown,
+            'crops': {siteid: set of crop codes},
+            'geojson_payload': the whole FeatureCollection pre-encoded (see _encode_payload),
+        }
+    """
+    with open(usbr_map_path, "r", encoding="utf-8") as f:
+        usbr_map = json.load(f)
+    try:
+        with open(crops_by_station_path, "r", encoding="utf-8") as f:
+            crops_by_station = json.load(f)
+    except FileNotFoundError:
+        globals.agrimet_logger.warning(f"crops_by_station.json not found at {crops_by_station_path}")
+        crops_by_station = {}
+
+    features = usbr_map["features"]
+    coordinates = [feature["geometry"]["coordinates"] for feature in features]
+    elevations = [
+        feature["properties"].get("elevation", coords[2] if len(coords) > 2 else None)
+        for feature, coords in zip(features, coordinates)
+    ]
+
+    return {
+        "geojson": usbr_map,
+        "by_id": {feature["properties"]["siteid"]: feature for feature in features},
+        "ids": np.array([feature["properties"]["siteid"] for feature in features]),
+        "lat": np.array([coords[1] for coords in coordinates], dtype=np.float64),
+        "lon": np.array([coords[0] for coords in coordinates], dtype=np.float64),
+        "elevation": np.array([np.nan if e in (None, "") else float(e) for e in elevations], dtype=np.float64),
+        "crops": {station: set(crops) for station, crops in crops_by_station.items()},
+        # the unfiltered collection is compressed once, at the highest levels, when it is loaded
+        "geojson_payload": _encode_payload(usbr_map, gzip_level=9, brotli_quality=11),
+    }
+
+
+def get_stations():
+    """Returns the in-memory station table (see _load_stations), loading it on first use."""
+    global _stations
+    if _stations is None:
+        with _stations_lock:
+            if _stations is None:
+                _stations = _load_stations(
+                    current_app.config.get('USBR_MAP_PATH', 'd:/Websites/AgWaterAPI/agrimet/usbr_map.json'),
+                    current_app.config.get('CROPS_BY_STATION_PATH', 'd:/Websites/AgWaterAPI/agrimet/crops_by_station.json'),
+                )
+                _neighbor_weights.cache_clear()
+                _filtered_geojson_payload.cache_clear()
+    return _stations
+
+
+def reload_stations():
+    """Drops the in-memory station table so the next call reloads it from disk."""
+    global _stations
+    with _stations_lock:
+        _stations = None
+
+
+def get_station_coordinates(station_id):
+    """Returns (latitude, longitude) for a station id, or None if the station is not in usbr_map.json."""
+    feature = get_stations()["by_id"].get(station_id)
+    if feature is None:
+        return None
+    return feature["geometry"]["coordinates"][1], feature["geometry"]["coordinates"][0]
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance in km from one point to arrays of points (all in degrees)."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+@lru_cache(maxsize=4096)
+def _neighbor_weights(lat, lon, crop, k, power):
+    stations = get_stations()
+
+    # only stations that grow the crop can contribute ETc for it
+    if crop:
+        candidates = np.array([crop in stations["crops"].get(s, ()) for s in stations["ids"]])
+    else:
+        candidates = np.ones(len(stations["ids"]), dtype=bool)
+    if not candidates.any():
+        return (), (), (), ()
+
+    ids = stations["ids"][candidates]
+    distances = haversine_km(lat, lon, stations["lat"][candidates], stations["lon"][candidates])
+    elevations = stations["elevation"][candidates]
+
+    nearest = np.argsort(distances)[:k]
+    ids, distances, elevations = ids[nearest], distances[nearest], elevations[nearest]
+
+    if distances[0] < 1e-6:
+        # the point is on a station; use it alone
+        weights = np.zeros(len(nearest))
+        weights[0] = 1.0
+    else:
+        weights = 1.0 / distances ** power
+        weights /= weights.sum()
+
+    return tuple(ids.tolist()), tuple(distances.tolist()), tuple(weights.tolist()), tuple(elevations.tolist())
+
+
+def get_neighbor_weights(lat, lon, crop=None, k=4, power=2):
+    """
+    Inverse distance weights for the k stations nearest to (lat, lon) that grow the crop.
+
+    Weights are computed once per (rounded) coordinate and cached. Coordinates are rounded
+    to 4 decimal places (about 10 m).
+
+    Returns:
+        list[dict]: [{'siteid', 'distance_km', 'weight', 'elevation'}], nearest first; weights sum to 1
+
+    Example:
+        >>> get_neighbor_weights(44.63, -123.19, 'ALFM', k=3)
+        [{'siteid': 'crvo', 'distance_km': 3.2, 'weight': 0.91, 'elevation': None}, ...]
+    """
+    get_stations()  # load (and reset the cache) before the first cached lookup
+    ids, distances, weights, elevations = _neighbor_weights(round(lat, 4), round(lon, 4), crop, k, power)
+    return [
+        {
+            "siteid": siteid,
+            "distance_km": round(distance, 3),
+            "weight": weight,
+            "elevation": None if math.isnan(elevation) else elevation,
+        }
+        for siteid, distance, weight, elevation in zip(ids, distances, weights, elevations)
+    ]
+
+
+def _encode_payload(obj, gzip_level=6, brotli_quality=5):
+    """
+    Serializes obj to compact JSON and precomputes its compressed variants, each with a strong ETag
+    (the content hash plus the encoding, since each encoding is a different representation).
+
+    Returns:
+        dict: {'variants': {'identity': bytes, 'gzip': bytes, 'br': bytes},
+               'etags': {'identity': '"<hash>"', 'gzip': '"<hash>-gzip"', 'br': '"<hash>-br"'}}
+              ('br' only when the brotli package is installed)
+    """
+    raw = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    variants = {"identity": raw, "gzip": gzip.compress(raw, compresslevel=gzip_level)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(raw, quality=brotli_quality)
+    digest = hashlib.sha256(raw).hexdigest()[:32]
+    etags = {
+        encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+        for encoding in variants
+    }
+    return {"variants": variants, "etags": etags}
+
+
+@lru_cache(maxsize=256)
+def _filtered_geojson_payload(states, programs, regions, bbox, fields):
+    stations = get_stations()
+    features = []
+    for feature in stations["geojson"]["features"]:
+        properties = feature["properties"]
+        if states and properties.get("state", "").lower() not in states:
+            continue
+        if programs and (properties.get("program") or "").lower() not in programs:
+            continue
+        if regions and properties.get("region", "").lower() not in regions:
+            continue
+        if bbox:
+            lon, lat = feature["geometry"]["coordinates"][:2]
+            if not (bbox[0] <= lon <= bbox[2] and bbox[1] <= lat <= bbox[3]):
+                continue
+        if fields:
+            feature = dict(feature, properties={k: v for k, v in properties.items() if k in fields})
+        features.append(feature)
+
+    return _encode_payload({"type": stations["geojson"].get("type", "FeatureCollection"), "features": features})
+
+
+def get_station_geojson_payload(states=None, programs=None, regions=None, bbox=None, fields=None):
+    """
+    Returns the station FeatureCollection, optionally filtered and projected, as a pre-encoded payload
+    (see _encode_payload). The unfiltered collection is encoded once at load time; each distinct
+    filter combination is encoded on first request and cached.
+
+    Args:
+        states, programs, regions (iterable[str], optional): keep stations matching any value (case-insensitive)
+        bbox (tuple, optional): (min_lon, min_lat, max_lon, max_lat)
+        fields (iterable[str], optional): property names to keep on each feature
+
+    Example:
+        >>> payload = get_station_geojson_payload(states=['OR', 'WA'], fields=['siteid', 'title'])
+        >>> payload['variants']['gzip']
+    """
+    stations = get_stations()
+    if not (states or programs or regions or bbox or fields):
+        return stations["geojson_payload"]
+
+    def normalize(values):
+        return tuple(sorted({v.strip().lower() for v in values if v.strip()})) if values else ()
+
+    return _filtered_geojson_payload(
+        normalize(states),
+        normalize(programs),
+        normalize(regions),
+        tuple(bbox) if bbox else (),
+        tuple(sorted(set(fields))) if fields else (),
+    )
@@ -0,0 +1,99 @@
+"""
+In-memory cache of LLM answers.
+
+An answer is reused only when everything that determines it is identical: the model, the system
+prompt, the retrieved context chunks, the chat history and the query. Entries expire after a TTL,
+the cache is bounded (least recently used entries are dropped first), and answers can be evicted
+by content, e.g. once users rate them poorly.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+class AnswerCache:
+    """
+    Example:
+        >>> cache = AnswerCache(max_entries=500, ttl=86400)
+        >>> key = cache.make_key('llama3.2', system_prompt, context_chunks, chat_history, 'What is ET?')
+        >>> answer = cache.get(key)
+        >>> if answer is None:
+        ...     answer = ollama.chat(...)['message']['content']
+        ...     cache.set(key, 'llama3.2', answer)
+    """
+
+    def __init__(self, max_entries=500, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (answer, model, stored_at)
+        self._keys_by_answer = {}       # (model, answer hash) -> set of keys
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def make_key(model, system_prompt, context_chunks, chat_history, user_query):
+        payload = json.dumps(
+            [model, system_prompt, [doc for doc, _ in context_chunks], chat_history, user_query.strip()],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _answer_id(model, answer):
+        return model, hashlib.sha1(answer.strip().encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns the cached answer text, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[2] >= self.ttl:
+                if entry is not None:
+                    self._remove(key)
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def set(self, key, model, answer):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (answer, model, time.monotonic())
+            self._keys_by_answer.setdefault(self._answer_id(model, answer), set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def evict_answer(self, model, answer):
+        """Drops every entry holding this answer from this model. Returns the number of entries removed."""
+        with self._lock:
+            keys = list(self._keys_by_answer.get(self._answer_id(model, answer), ()))
+            for key in keys:
+                self._remove(key)
+            self._stats['evictions'] += len(keys)
+            return len(keys)
+
+    def _remove(self, key):
+        answer, model, _ = self._entries.pop(key)
+        answer_id = self._answer_id(model, answer)
+        keys = self._keys_by_answer.get(answer_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_answer[answer_id]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
+
+
+def replay_tokens(answer):
+    """Splits a cached answer into word-sized pieces (keeping whitespace) so it can be streamed like a live answer."""
+    return re.findall(r'\S+\s*|\s+', answer)
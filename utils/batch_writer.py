@@ -0,0 +1,199 @@
+"""
+Background, batched writes to SQLite.
+
+Callers hand rows to BatchWriter.submit() and return immediately; a writer thread commits them in
+one transaction every flush_interval seconds or as soon as max_batch rows are waiting, so request
+latency no longer includes a commit (and its fsync). If a commit fails (e.g. the database is
+locked), the batch is appended to a JSON-lines spool file and replayed on a later flush, and on
+the next start, so accepted rows are not lost. Spool lines that can't be parsed (e.g. the last line
+of a write cut short by a crash) are moved to a .bad file next to the spool instead of blocking the
+replay. Pending rows are flushed when the process exits.
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _ends_mid_line(path):
+    """True if the file is non-empty and doesn't end with a newline."""
+    try:
+        with open(path, 'rb') as file:
+            file.seek(0, os.SEEK_END)
+            if file.tell() == 0:
+                return False
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) != b'\n'
+    except OSError:
+        return False
+
+
+class BatchWriter:
+    """
+    Example:
+        >>> writer = BatchWriter('agWater.db', "INSERT OR REPLACE INTO LLM_Ratings (...) VALUES (?, ?, ?)",
+        ...                      spool_path='agWater.ratings.spool')
+        >>> writer.start()
+        >>> writer.submit([question, answer, rating])
+    """
+
+    def __init__(self, db_path, sql, spool_path, flush_interval=0.2, max_batch=100, name='batch-writer'):
+        self.db_path = db_path
+        self.sql = sql
+        self.spool_path = spool_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.name = name
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stats = {'submitted': 0, 'written': 0, 'batches': 0, 'spooled': 0, 'replayed': 0, 'quarantined': 0}
+
+    def start(self):
+        """Starts the writer thread (once) and replays rows spooled by an earlier run."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, row):
+        with self._cond:
+            self._pending.append(list(row))
+            self._stats['submitted'] += 1
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def _run(self):
+        try:
+            self._replay_spool()
+        except Exception as e:
+            logger.error(f"{self.name}: replaying the spool at startup failed: {e}")
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) >= self.max_batch, timeout=self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"{self.name}: flush failed: {e}")
+
+    def flush(self):
+        """Writes all pending rows in one transaction; on failure they go to the spool file."""
+        with self._flush_lock:
+            with self._cond:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return
+            try:
+                self._write(rows)
+            except sqlite3.Error as e:
+                logger.warning(f"{self.name}: writing {len(rows)} rows failed, spooling them: {e}")
+                self._spool(rows)
+                return
+            with self._cond:
+                self._stats['written'] += len(rows)
+                self._stats['batches'] += 1
+            if os.path.exists(self.spool_path):
+                self._replay_spool()
+
+    def _write(self, rows):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                conn.executemany(self.sql, rows)
+        finally:
+            conn.close()
+
+    def _spool(self, rows):
+        with open(self.spool_path, 'a', encoding='utf-8') as spool:
+            if _ends_mid_line(self.spool_path):
+                spool.write('\n')     # don't append to a line cut short by a crash
+            for row in rows:
+                spool.write(json.dumps(row) + '\n')
+            spool.flush()
+            os.fsync(spool.fileno())
+        with self._cond:
+            self._stats['spooled'] += len(rows)
+
+    def _replay_spool(self):
+        """Writes spooled rows; the spool is claimed by renaming it, so only one process replays it."""
+        claimed = f"{self.spool_path}.{os.getpid()}.{int(time.time())}"
+        try:
+            os.replace(self.spool_path, claimed)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning(f"{self.name}: could not claim spool file {self.spool_path}: {e}")
+            return
+
+        try:
+            rows, bad_lines = self._read_spool(claimed)
+            if bad_lines:
+                self._quarantine(bad_lines)
+            try:
+                if rows:
+                    self._write(rows)
+            except sqlite3.Error as e:
+                logger.warning(f"{self.name}: replaying {len(rows)} spooled rows failed: {e}")
+                self._spool(rows)
+            else:
+                with self._cond:
+                    self._stats['replayed'] += len(rows)
+                logger.info(f"{self.name}: replayed {len(rows)} spooled rows")
+        except Exception:
+            self._unclaim(claimed)
+            raise
+        os.remove(claimed)
+
+    def _read_spool(self, path):
+        """Returns (rows, bad_lines): the parsed rows, and the lines that aren't a JSON row."""
+        rows, bad_lines = [], []
+        with open(path, encoding='utf-8', errors='replace') as spool:
+            for line in spool:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    bad_lines.append(line)
+                    continue
+                if isinstance(row, list):
+                    rows.append(row)
+                else:
+                    bad_lines.append(line)
+        return rows, bad_lines
+
+    def _quarantine(self, lines):
+        with open(f"{self.spool_path}.bad", 'a', encoding='utf-8') as bad:
+            for line in lines:
+                bad.write(line if line.endswith('\n') else line + '\n')
+        with self._cond:
+            self._stats['quarantined'] += len(lines)
+        logger.warning(f"{self.name}: moved {len(lines)} unreadable spool lines to {self.spool_path}.bad")
+
+    def _unclaim(self, claimed):
+        """Puts a claimed spool file back (appending to a spool written meanwhile) so a later replay retries it."""
+        try:
+            if not os.path.exists(self.spool_path):
+                os.replace(claimed, self.spool_path)
+                return
+            with open(claimed, encoding='utf-8', errors='replace') as source, \
+                    open(self.spool_path, 'a', encoding='utf-8') as spool:
+                if _ends_mid_line(self.spool_path):
+                    spool.write('\n')
+                spool.write(source.read())
+            os.remove(claimed)
+        except OSError as e:
+            logger.error(f"{self.name}: could not return {claimed} to the spool, left in place: {e}")
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending))
@@ -0,0 +1,95 @@
+"""
+An allowlist index of the files in a directory, for serving them by name.
+
+Requested names are looked up in an index built by walking the directory, never joined onto the
+directory path, so '..', absolute paths, drive letters or alternate separators can only ever miss.
+The index is rebuilt every ttl seconds, and on a miss at most every min_rescan_seconds so new files
+show up without letting unknown names trigger a directory walk per request. Each lookup stats the
+file and returns its size, mtime and a strong ETag derived from them.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class IndexedFile:
+    __slots__ = ('name', 'path', 'size', 'mtime', 'etag')
+
+    def __init__(self, name, path, stat):
+        self.name = name
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        # Strong ETag: changes whenever the file is replaced or rewritten
+        self.etag = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+class FileIndex:
+    """
+    Example:
+        >>> index = FileIndex('D:/AgWaterLLM/source_materials', extensions=('.pdf',))
+        >>> entry = index.lookup(request.args.get('filename'))
+        >>> if entry is None:
+        ...     abort(404)
+        >>> send_file(entry.path, etag=entry.etag, conditional=True)
+    """
+
+    def __init__(self, root, extensions=None, ttl=300, min_rescan_seconds=10):
+        self.root = root
+        self.extensions = tuple(extension.lower() for extension in extensions) if extensions else None
+        self.ttl = ttl
+        self.min_rescan_seconds = min_rescan_seconds
+        self._paths = {}    # normalized relative name -> absolute path
+        self._scanned_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name):
+        return os.path.normcase(name.replace('/', os.sep).replace('\\', os.sep))
+
+    def _scan(self):
+        paths = {}
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if self.extensions and not filename.lower().endswith(self.extensions):
+                    continue
+                path = os.path.join(directory, filename)
+                paths[self._key(os.path.relpath(path, self.root))] = path
+        self._paths = paths
+        self._scanned_at = time.monotonic()
+        logger.info(f"Indexed {len(paths)} files under {self.root}")
+
+    def refresh(self):
+        with self._lock:
+            self._scan()
+
+    def _path_for(self, key):
+        with self._lock:
+            age = None if self._scanned_at is None else time.monotonic() - self._scanned_at
+            if age is None or age >= self.ttl or (key not in self._paths and age >= self.min_rescan_seconds):
+                self._scan()
+            return self._paths.get(key)
+
+    def lookup(self, name):
+        """The IndexedFile for a name relative to the root (e.g. 'bulletin.pdf'), or None if it isn't in the index."""
+        if not name:
+            return None
+        key = self._key(name)
+        path = self._path_for(key)
+        if path is None:
+            return None
+        try:
+            return IndexedFile(name, path, os.stat(path))
+        except OSError:
+            # removed since the last scan
+            with self._lock:
+                self._paths.pop(key, None)
+            return None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._paths)
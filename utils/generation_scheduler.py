@@ -0,0 +1,167 @@
+"""
+Admission control for LLM generation.
+
+A single Ollama instance slows every answer down when it is oversubscribed, so generations go
+through a GenerationScheduler: at most max_concurrent run at once, the rest wait in bounded
+per-class queues (served in priority order, e.g. streaming chat before non-streaming before test
+traffic), and requests that find their queue full are rejected immediately with a Retry-After
+estimate instead of piling up.
+
+The scheduler is per process; with several worker processes the effective limit is
+max_concurrent times the number of workers.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+
+class QueueFullError(Exception):
+    """Raised by submit() when the request's queue is full."""
+
+    def __init__(self, queue, retry_after):
+        super().__init__(f"Generation queue '{queue}' is full")
+        self.queue = queue
+        self.retry_after = retry_after
+
+
+class GenerationTimeoutError(Exception):
+    """Raised when a queued request waited longer than the queue timeout for a generation slot."""
+
+    def __init__(self, queue, retry_after):
+        super().__init__(f"Timed out waiting for a generation slot in queue '{queue}'")
+        self.queue = queue
+        self.retry_after = retry_after
+
+
+class GenerationTicket:
+    """A request's place in the scheduler. Release it when the generation is done (or abandoned)."""
+
+    def __init__(self, scheduler, queue):
+        self.scheduler = scheduler
+        self.queue = queue
+        self.submitted_at = time.monotonic()
+        self.granted_at = None
+        self.granted = False
+        self.released = False
+
+    def wait(self, timeout=None):
+        """Blocks until the ticket is granted a slot or the timeout passes. Returns True if granted."""
+        return self.scheduler._wait(self, timeout)
+
+    def position(self):
+        """1-based position among all waiting requests (0 once granted)."""
+        return self.scheduler._position(self)
+
+    def release(self):
+        """Frees the slot (or leaves the queue). Safe to call more than once."""
+        self.scheduler._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class GenerationScheduler:
+    """
+    Example:
+        >>> scheduler = GenerationScheduler(max_concurrent=2, max_queued={'stream': 16, 'sync': 16, 'test': 2})
+        >>> with scheduler.submit('sync') as ticket:
+        ...     if not ticket.wait(timeout=120):
+        ...         raise GenerationTimeoutError('sync', scheduler.retry_after())
+        ...     response = ollama.chat(...)
+    """
+
+    def __init__(self, max_concurrent=2, max_queued=None, initial_duration=10.0):
+        self.max_concurrent = max_concurrent
+        # queue name -> maximum waiting requests; queues are served in this order
+        self.max_queued = dict(max_queued or {'stream': 16, 'sync': 16, 'test': 2})
+        self._queues = {name: deque() for name in self.max_queued}
+        self._running = 0
+        self._avg_duration = initial_duration    # moving average of how long a generation holds its slot
+        self._cond = threading.Condition()
+        self._stats = {'admitted': 0, 'rejected': 0, 'abandoned': 0}    # abandoned: left the queue before getting a slot
+
+    def submit(self, queue):
+        """
+        Enters a queue. Returns a ticket (granted right away when a slot is free) or raises QueueFullError.
+        """
+        with self._cond:
+            ticket = GenerationTicket(self, queue)
+            if self._running < self.max_concurrent and not any(self._queues.values()):
+                self._grant(ticket)
+                return ticket
+            if len(self._queues[queue]) >= self.max_queued[queue]:
+                self._stats['rejected'] += 1
+                raise QueueFullError(queue, self._retry_after())
+            self._queues[queue].append(ticket)
+            return ticket
+
+    def retry_after(self):
+        """Seconds a client should wait before retrying, estimated from the backlog and recent generation times."""
+        with self._cond:
+            return self._retry_after()
+
+    def _retry_after(self):
+        waiting = sum(len(q) for q in self._queues.values())
+        return max(1, math.ceil(self._avg_duration * (waiting + 1) / self.max_concurrent))
+
+    def _grant(self, ticket):
+        ticket.granted = True
+        ticket.granted_at = time.monotonic()
+        self._running += 1
+        self._stats['admitted'] += 1
+
+    def _dispatch(self):
+        while self._running < self.max_concurrent:
+            queue = next((q for q in self._queues.values() if q), None)
+            if queue is None:
+                break
+            self._grant(queue.popleft())
+        self._cond.notify_all()
+
+    def _wait(self, ticket, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: ticket.granted or ticket.released, timeout)
+            return ticket.granted
+
+    def _position(self, ticket):
+        with self._cond:
+            if ticket.granted or ticket.released:
+                return 0
+            ahead = 0
+            for name, queue in self._queues.items():
+                if name == ticket.queue:
+                    return ahead + queue.index(ticket) + 1
+                ahead += len(queue)
+            return 0
+
+    def _release(self, ticket):
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted:
+                self._running -= 1
+                duration = time.monotonic() - ticket.granted_at
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            else:
+                self._stats['abandoned'] += 1
+                try:
+                    self._queues[ticket.queue].remove(ticket)
+                except ValueError:
+                    pass
+            self._dispatch()
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._stats,
+                running=self._running,
+                max_concurrent=self.max_concurrent,
+                queued={name: len(queue) for name, queue in self._queues.items()},
+                avg_generation_seconds=round(self._avg_duration, 2),
+            )
@@ -0,0 +1,138 @@
+"""
+Keyword (BM25) search over the RAG chunk corpus, and helpers to fuse it with vector search results.
+
+Vector similarity misses exact-term matches (crop codes, statute numbers, chemical names) and tends
+to return several near-identical chunks. BM25Index scores chunks by the query's terms;
+reciprocal_rank_fusion() merges its ranking with the vector ranking, and rerank() orders the fused
+candidates by query-term coverage and drops near-duplicates.
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# keeps tokens like 'ors', '537.545', 'et-c' and 'alfm' intact
+_TOKEN_RE = re.compile(r"[a-z0-9](?:[a-z0-9.\-]*[a-z0-9])?")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it of on or that the this to was what when
+where which who why will with you your my me we our
+""".split())
+
+
+def tokenize(text):
+    """Lower-cased word tokens of text, without stopwords."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of documents.
+
+    Example:
+        >>> index = BM25Index(['chunk-1', 'chunk-2'], ['Alfalfa (ALFM) water use ...', 'ORS 537.545 exempt wells ...'])
+        >>> index.search('ORS 537.545', top_n=5)
+        [('chunk-2', 3.1)]
+    """
+
+    def __init__(self, ids, documents, k1=1.5, b=0.75):
+        self.ids = list(ids)
+        self.k1 = k1
+        self.b = b
+
+        postings = defaultdict(lambda: ([], []))    # term -> (document numbers, term frequencies)
+        lengths = np.zeros(len(self.ids), dtype=np.float64)
+        for doc_number, document in enumerate(documents):
+            tokens = tokenize(document or '')
+            lengths[doc_number] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term][0].append(doc_number)
+                postings[term][1].append(tf)
+
+        self.avg_length = lengths.mean() if len(lengths) and lengths.mean() > 0 else 1.0
+        # the length normalization part of the BM25 denominator, per document
+        self._norm = self.k1 * (1 - self.b + self.b * lengths / self.avg_length)
+        self._postings = {
+            term: (np.array(docs, dtype=np.int64), np.array(tfs, dtype=np.float64))
+            for term, (docs, tfs) in postings.items()
+        }
+        n = len(self.ids)
+        self._idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, (docs, _) in self._postings.items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, top_n=10):
+        """Returns up to top_n (id, score) pairs with a positive score, best first."""
+        scores = np.zeros(len(self.ids), dtype=np.float64)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            scores[docs] += self._idf[term] * tfs * (self.k1 + 1) / (tfs + self._norm[docs])
+
+        matched = np.flatnonzero(scores > 0)
+        if not len(matched):
+            return []
+        best = matched[np.argsort(-scores[matched], kind='stable')[:top_n]]
+        return [(self.ids[i], float(scores[i])) for i in best]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merges several best-first lists of ids: each id scores sum(1 / (k + rank)) over the lists it appears in.
+
+    Returns:
+        list[(id, score)], best first
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def rerank(query, candidates, top_n, coverage_weight=0.5, duplicate_threshold=0.8):
+    """
+    Lightweight rerank of fused candidates.
+
+    Each candidate's fused score is blended with the fraction of distinct query terms the chunk contains,
+    then candidates are taken best first, skipping any whose token set overlaps an already selected chunk
+    by more than duplicate_threshold (Jaccard).
+
+    Args:
+        query (str): the user query
+        candidates (list): [(id, fused_score, document, metadata)], best first
+        top_n (int): number of chunks to keep
+
+    Returns:
+        list[(document, metadata)]
+    """
+    query_terms = set(tokenize(query))
+    if not candidates:
+        return []
+    max_score = max(score for _, score, _, _ in candidates) or 1.0
+
+    scored = []
+    for item_id, score, document, metadata in candidates:
+        tokens = set(tokenize(document or ''))
+        coverage = len(query_terms & tokens) / len(query_terms) if query_terms else 0.0
+        scored.append(((1 - coverage_weight) * score / max_score + coverage_weight * coverage, tokens, document, metadata))
+    scored.sort(key=lambda item: item[0], reverse=True)
+
+    selected, selected_tokens = [], []
+    for _, tokens, document, metadata in scored:
+        if any(tokens and other and len(tokens & other) / len(tokens | other) > duplicate_threshold
+               for other in selected_tokens):
+            continue
+        selected.append((document, metadata))
+        selected_tokens.append(tokens)
+        if len(selected) == top_n:
+            break
+    return selected
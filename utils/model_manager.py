@@ -0,0 +1,168 @@
+"""
+Keeps the right Ollama models resident.
+
+Ollama unloads a model once it has been idle for the keep_alive of the last request that used it,
+and the next request pays a multi-second load. ModelManager decides the keep_alive sent with each
+request (pinned models are never unloaded, others get a per-model or default duration), warms
+models up ahead of use, records how long loads take, and sweep() unloads models that haven't been
+used for a while, or the least recently used ones when more than max_resident are loaded.
+Listeners added with add_listener() are called with the model name whenever the manager loads,
+unloads or pulls a model, e.g. to invalidate a cached model list.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def model_name(name):
+    """Ollama reports 'llama3.2:latest' for a model requested as 'llama3.2'."""
+    return name[:-len(':latest')] if name.endswith(':latest') else name
+
+
+class ModelManager:
+    """
+    Example:
+        >>> manager = ModelManager(ollama, pinned=['llama3.2'], keep_alive={'mistral': '30m'})
+        >>> manager.warm_up('llama3.2')
+        >>> response = ollama.chat(model='mistral', messages=messages, keep_alive=manager.keep_alive_for('mistral'))
+        >>> manager.record_use('mistral', response)
+        >>> manager.sweep()     # periodically
+    """
+
+    def __init__(self, client, pinned=(), keep_alive=None, default_keep_alive='10m',
+                 idle_unload_seconds=1800, max_resident=2):
+        self.client = client
+        self.pinned = {model_name(name) for name in pinned}
+        self.keep_alive = {model_name(name): value for name, value in (keep_alive or {}).items()}
+        self.default_keep_alive = default_keep_alive
+        self.idle_unload_seconds = idle_unload_seconds
+        self.max_resident = max_resident
+        self._models = {}   # name -> {'uses', 'last_used', 'loads', 'last_load_seconds', 'total_load_seconds'}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """callback(model_name) is called after the manager loads, unloads or pulls a model."""
+        self._listeners.append(callback)
+
+    def _notify(self, name):
+        for callback in self._listeners:
+            try:
+                callback(name)
+            except Exception as e:
+                logger.warning(f"Model change listener failed for {name}: {e}")
+
+    def keep_alive_for(self, name):
+        """The keep_alive to send with a request for this model: -1 (stay loaded) for pinned models."""
+        name = model_name(name)
+        if name in self.pinned:
+            return -1
+        return self.keep_alive.get(name, self.default_keep_alive)
+
+    def _entry(self, name):
+        return self._models.setdefault(name, {
+            'uses': 0, 'last_used': None, 'loads': 0, 'last_load_seconds': None, 'total_load_seconds': 0.0,
+        })
+
+    def record_use(self, name, response=None):
+        """
+        Records a request for the model. response is the Ollama chat/generate response (or the final
+        streamed chunk); a non-trivial load_duration in it means the model had to be loaded first.
+        """
+        name = model_name(name)
+        load_duration = None
+        if response is not None:
+            try:
+                load_duration = response.get('load_duration')
+            except AttributeError:
+                pass
+        with self._lock:
+            entry = self._entry(name)
+            entry['uses'] += 1
+            entry['last_used'] = time.time()
+            # load_duration is reported on every response; anything under ~0.5s is a model that was already resident
+            if load_duration and load_duration / 1e9 >= 0.5:
+                self._record_load(entry, load_duration / 1e9)
+
+    def _record_load(self, entry, seconds):
+        entry['loads'] += 1
+        entry['last_load_seconds'] = round(seconds, 3)
+        entry['total_load_seconds'] += seconds
+
+    def warm_up(self, name):
+        """Loads the model (an empty generate request) with its keep_alive. Returns the seconds it took."""
+        name = model_name(name)
+        started = time.monotonic()
+        response = self.client.generate(model=name, prompt='', keep_alive=self.keep_alive_for(name))
+        seconds = time.monotonic() - started
+        try:
+            seconds = response.get('load_duration') / 1e9 or seconds   # Ollama's own measure, in ns
+        except (AttributeError, TypeError):
+            pass
+        with self._lock:
+            self._record_load(self._entry(name), seconds)
+        logger.info(f"Warmed up model {name} in {seconds:.2f}s")
+        self._notify(name)
+        return seconds
+
+    def unload(self, name):
+        name = model_name(name)
+        self.client.generate(model=name, prompt='', keep_alive=0)
+        logger.info(f"Unloaded model {name}")
+        self._notify(name)
+
+    def pull(self, name):
+        """Downloads (or updates) the model in Ollama."""
+        name = model_name(name)
+        self.client.pull(name)
+        logger.info(f"Pulled model {name}")
+        self._notify(name)
+
+    def resident_models(self):
+        """Names of the models Ollama currently has loaded."""
+        return [model_name(model['model']) for model in self.client.ps()['models']]
+
+    def sweep(self):
+        """
+        Re-loads pinned models that are not resident, then unloads unpinned models idle for more than
+        idle_unload_seconds and, beyond max_resident loaded models, the least recently used ones.
+        Returns the names of the models unloaded.
+        """
+        resident = self.resident_models()
+        for name in self.pinned - set(resident):
+            self.warm_up(name)
+
+        now = time.time()
+        with self._lock:
+            last_used = {name: (self._models.get(name) or {}).get('last_used') or 0.0 for name in resident}
+        unpinned = sorted((name for name in resident if name not in self.pinned), key=lambda name: last_used[name])
+
+        loaded = len(set(resident) | self.pinned)
+        unloaded = []
+        for name in unpinned:
+            if now - last_used[name] >= self.idle_unload_seconds or loaded > self.max_resident:
+                self.unload(name)
+                unloaded.append(name)
+                loaded -= 1
+        return unloaded
+
+    def stats(self):
+        try:
+            resident = set(self.resident_models())
+        except Exception as e:
+            logger.warning(f"Could not list resident models: {e}")
+            resident = None
+        with self._lock:
+            models = {name: dict(entry) for name, entry in self._models.items()}
+        for name in self.pinned:
+            models.setdefault(name, {'uses': 0, 'last_used': None, 'loads': 0, 'last_load_seconds': None,
+                                     'total_load_seconds': 0.0})
+        for name, entry in models.items():
+            entry['total_load_seconds'] = round(entry['total_load_seconds'], 3)
+            entry['pinned'] = name in self.pinned
+            entry['keep_alive'] = self.keep_alive_for(name)
+            entry['resident'] = None if resident is None else name in resident
+        return models
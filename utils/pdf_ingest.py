@@ -0,0 +1,86 @@
+"""
+Page-streamed text extraction and chunking for PDF sources.
+
+Pages are read and chunked one at a time, so ingesting a long bulletin holds one page of text and
+one batch of chunks in memory instead of the whole document.
+"""
+
+import hashlib
+import re
+
+import PyPDF2 as pypdf
+
+
+def count_pdf_pages(path):
+    with open(path, "rb") as file:
+        return len(pypdf.PdfReader(file).pages)
+
+
+def iter_pdf_pages(path):
+    """Yields (page_number, text) for each page (1-based), extracting one page at a time."""
+    with open(path, "rb") as file:
+        reader = pypdf.PdfReader(file)
+        for page_number, page in enumerate(reader.pages, start=1):
+            yield page_number, page.extract_text() or ''
+
+
+def _break_point(text, limit):
+    """Where to end a chunk of at most limit characters: a sentence end if there is one in the second half, else a space."""
+    window = text[:limit]
+    sentence_end = max(window.rfind('. '), window.rfind('? '), window.rfind('! '))
+    if sentence_end >= limit // 2:
+        return sentence_end + 1
+    space = window.rfind(' ')
+    return space if space >= limit // 2 else limit
+
+
+def chunk_pages(pages, chunk_chars=1000, overlap_chars=200):
+    """
+    Splits a stream of (page_number, text) into chunks of up to chunk_chars characters that overlap by
+    about overlap_chars, breaking at sentence or word boundaries. Text runs across page breaks.
+
+    Yields:
+        (chunk_text, page_number): page_number is the page the chunk starts on
+    """
+    overlap_chars = min(overlap_chars, chunk_chars // 4)
+    buffer = ''
+    page_starts = []    # (offset in buffer, page number) where each page's text begins
+    for page_number, text in pages:
+        text = re.sub(r'\s+', ' ', text).strip()
+        if not text:
+            continue
+        if buffer:
+            buffer += ' '
+        page_starts.append((len(buffer), page_number))
+        buffer += text
+        while len(buffer) >= chunk_chars:
+            cut = _break_point(buffer, chunk_chars)
+            yield buffer[:cut].strip(), page_starts[0][1]
+            # carry the last overlap_chars (from a word start) into the next chunk
+            start = buffer.find(' ', cut - overlap_chars)
+            drop = start + 1 if 0 <= start < cut else cut
+            while buffer[drop:drop + 1] == ' ':
+                drop += 1
+            buffer = buffer[drop:]
+            page_starts = [(offset - drop, page) for offset, page in page_starts]
+            while len(page_starts) > 1 and page_starts[1][0] <= 0:
+                page_starts.pop(0)
+    if buffer.strip():
+        yield buffer.strip(), page_starts[0][1]
+
+
+def chunk_hash(text):
+    """Hash of a chunk's text, ignoring case and whitespace, so identical chunks from different files can share an embedding."""
+    return hashlib.sha1(re.sub(r'\s+', ' ', text).strip().lower().encode('utf-8')).hexdigest()
+
+
+def batched(iterable, size):
+    """Yields lists of up to size items."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
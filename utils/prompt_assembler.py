@@ -0,0 +1,162 @@
+"""
+Token-budgeted assembly of chat prompts.
+
+Prefill time grows with prompt length, so each prompt is held to a per-model token budget:
+the query and the most recent turns are kept verbatim, older turns are condensed into a short
+extractive summary (and dropped oldest-first if even that doesn't fit), and the retrieved chunks
+are picked by maximal marginal relevance (MMR) so overlapping chunks don't crowd out distinct ones.
+
+Token counts are estimated (about 4 characters per token for English text); the budget is a
+ceiling for prefill cost, not an exact context-window fit.
+"""
+
+import re
+
+from utils.hybrid_search import tokenize
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4     # role markers and separators added by the chat template
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1 if text else 0
+
+
+def _message_tokens(message):
+    return estimate_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _first_sentence(text, max_chars):
+    sentence = re.split(r'(?<=[.!?])\s', text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rstrip() + '...'
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def select_chunks_mmr(query, chunks, budget_tokens, lambda_=0.7):
+    """
+    Picks chunks by maximal marginal relevance until the token budget is used up.
+
+    Chunks arrive ranked best first; relevance blends that rank with the share of query terms a chunk
+    contains, and redundancy is the token overlap (Jaccard) with the chunks already picked.
+
+    Args:
+        query (str): the user query
+        chunks (list): [(document, metadata)], best first
+        budget_tokens (int): tokens available for context
+        lambda_ (float): 1.0 = relevance only, 0.0 = diversity only
+
+    Returns:
+        list[(document, metadata)] in the order picked
+    """
+    query_terms = set(tokenize(query))
+    candidates = []
+    for rank, (document, metadata) in enumerate(chunks):
+        tokens = set(tokenize(document or ''))
+        coverage = len(query_terms & tokens) / len(query_terms) if query_terms else 0.0
+        relevance = 0.5 * (1 - rank / len(chunks)) + 0.5 * coverage
+        candidates.append((relevance, tokens, document, metadata))
+
+    selected, selected_tokens = [], []
+    remaining = budget_tokens
+    while candidates:
+        best = max(
+            range(len(candidates)),
+            key=lambda i: lambda_ * candidates[i][0]
+            - (1 - lambda_) * max((_jaccard(candidates[i][1], other) for other in selected_tokens), default=0.0),
+        )
+        _, tokens, document, metadata = candidates.pop(best)
+        cost = estimate_tokens(document) + 2
+        if cost > remaining:
+            continue    # a shorter chunk further down may still fit
+        selected.append((document, metadata))
+        selected_tokens.append(tokens)
+        remaining -= cost
+    return selected
+
+
+def fit_chat_history(chat_history, budget_tokens, recent_turns=2, summary_chars=160):
+    """
+    Fits chat history (alternating user/assistant messages) into a token budget.
+
+    The last recent_turns question/answer pairs are kept verbatim while they fit. Older turns become
+    one system message with a line per turn (the question and the first sentence of the answer);
+    the oldest lines are dropped when the summary doesn't fit either.
+
+    Returns:
+        list[dict]: the messages to send, oldest first
+    """
+    turns = [chat_history[i:i + 2] for i in range(0, len(chat_history), 2)]
+
+    # keep the most recent turns verbatim, newest first, while they fit
+    kept_from = len(turns)
+    remaining = budget_tokens
+    for i in range(len(turns) - 1, max(len(turns) - recent_turns, 0) - 1, -1):
+        cost = sum(_message_tokens(message) for message in turns[i])
+        if cost > remaining:
+            break
+        kept_from = i
+        remaining -= cost
+    older, kept = turns[:kept_from], turns[kept_from:]
+
+    lines = []
+    header = "Summary of the earlier conversation:"
+    remaining -= estimate_tokens(header) + MESSAGE_OVERHEAD_TOKENS
+    for turn in reversed(older):
+        question = next((m['content'] for m in turn if m['role'] == 'user'), '')
+        answer = next((m['content'] for m in turn if m['role'] == 'assistant'), '')
+        line = f"- Q: {_first_sentence(question, summary_chars)} A: {_first_sentence(answer, summary_chars)}"
+        if estimate_tokens(line) > remaining:
+            break
+        lines.insert(0, line)
+        remaining -= estimate_tokens(line)
+
+    messages = [{'role': 'system', 'content': '\n'.join([header] + lines)}] if lines else []
+    for turn in kept:
+        messages.extend(turn)
+    return messages
+
+
+def assemble_prompt(instructions, context_chunks, chat_history, user_query, budget_tokens,
+                    recent_turns=2, context_share=0.6):
+    """
+    Builds the Ollama messages for a RAG chat request within budget_tokens.
+
+    The instructions and query are always included. Of what remains, up to context_share goes to the
+    context chunks (chosen by MMR) and the rest, plus whatever the chunks didn't use, to the history.
+
+    Args:
+        instructions (str): system prompt text; the selected chunks are appended as ' - chunk' lines
+        context_chunks (list): [(document, metadata)] from retrieval, best first
+        chat_history (list[dict]): role/content messages, oldest first
+        user_query (str): the question
+        budget_tokens (int): the model's prompt budget
+
+    Returns:
+        dict: {'messages', 'instruction_prompt', 'context_chunks' (the chunks used), 'chat_history' (as sent),
+               'estimated_tokens'}
+    """
+    fixed = estimate_tokens(instructions) + estimate_tokens(user_query) + 2 * MESSAGE_OVERHEAD_TOKENS
+    available = max(budget_tokens - fixed, 0)
+
+    selected = select_chunks_mmr(user_query, context_chunks, int(available * context_share))
+    context_lines = '\n'.join([f' - {doc}' for doc, _ in selected])
+    instruction_prompt = f'''{instructions}
+    {context_lines}
+    '''
+    history_budget = available - (estimate_tokens(instruction_prompt) - estimate_tokens(instructions))
+    history = fit_chat_history(chat_history, history_budget, recent_turns=recent_turns)
+
+    messages = history + [
+        {'role': 'system', 'content': instruction_prompt},
+        {'role': 'user', 'content': user_query}
+    ]
+    return {
+        'messages': messages,
+        'instruction_prompt': instruction_prompt,
+        'context_chunks': selected,
+        'chat_history': history,
+        'estimated_tokens': sum(_message_tokens(message) for message in messages),
+    }
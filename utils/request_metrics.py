@@ -0,0 +1,188 @@
+"""
+Per-request latency spans and token counts for LLM requests, aggregated per model.
+
+A RequestTrace times the stages of one chat request (queue wait, retrieval, title lookup, prompt
+assembly, time to first token, generation, total) and takes the token counts and generation speed
+from Ollama's final response. MetricsRegistry.record() folds finished traces into fixed-bucket
+histograms per model, so /llm/metrics can show where the time goes without keeping every request,
+and writes requests slower than a threshold (optionally a sample of them) to a separate log.
+"""
+
+import bisect
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds: seconds for spans, tokens/second for generation speed
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 40, 60, 80, 100, 150, 200)
+
+
+class Histogram:
+    """Counts of observations per bucket (the last bucket is everything above the highest bound)."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (the max for the overflow bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 4),
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'max': round(self.max, 4),
+            'buckets': {('+Inf' if index == len(self.bounds) else str(self.bounds[index])): count
+                        for index, count in enumerate(self.counts) if count},
+        }
+
+
+class RequestTrace:
+    """
+    Example:
+        >>> trace = RequestTrace('llama3.2', 'chat_stream')
+        >>> with trace.span('retrieval'):
+        ...     chunks = retrieve_relevant_chunks(query)
+        >>> trace.generation_started()
+        >>> for chunk in ollama.chat(..., stream=True):
+        ...     trace.first_token()
+        >>> trace.generation_finished(chunk)    # the final chunk carries the token counts
+        >>> get_request_metrics().record(trace)
+    """
+
+    def __init__(self, model, kind):
+        self.model = model
+        self.kind = kind
+        self.started = time.monotonic()
+        self.spans = {}
+        self.tokens = {}
+        self.status = 'ok'
+        self._generation_started = None
+
+    @contextmanager
+    def span(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.spans[name] = time.monotonic() - started
+
+    def generation_started(self):
+        self._generation_started = time.monotonic()
+
+    def first_token(self):
+        """Time to first token, measured from the start of the request (so it includes retrieval and queueing)."""
+        if 'ttft' not in self.spans:
+            self.spans['ttft'] = time.monotonic() - self.started
+
+    def generation_finished(self, response=None):
+        """Records the generation time and, from Ollama's (final) response, the token counts and speed."""
+        if self._generation_started is not None:
+            self.spans['generation'] = time.monotonic() - self._generation_started
+        if response is None:
+            return
+        try:
+            prompt_tokens = response.get('prompt_eval_count')
+            completion_tokens = response.get('eval_count')
+            eval_duration = response.get('eval_duration')
+        except AttributeError:
+            return
+        if prompt_tokens is not None:
+            self.tokens['prompt_tokens'] = prompt_tokens
+        if completion_tokens is not None:
+            self.tokens['completion_tokens'] = completion_tokens
+            if eval_duration:
+                self.tokens['tokens_per_second'] = round(completion_tokens / (eval_duration / 1e9), 2)
+
+    def finish(self, status='ok'):
+        self.status = status
+        self.spans['total'] = time.monotonic() - self.started
+
+    def to_dict(self):
+        return {
+            'model': self.model,
+            'kind': self.kind,
+            'status': self.status,
+            'spans': {name: round(seconds, 4) for name, seconds in self.spans.items()},
+            **self.tokens,
+        }
+
+
+class MetricsRegistry:
+    """
+    Example:
+        >>> metrics = MetricsRegistry(slow_threshold=20, slow_sample_rate=1.0, slow_logger=logging.getLogger('llm_slow'))
+        >>> metrics.record(trace)
+        >>> metrics.snapshot()['llama3.2']['spans']['ttft']['p90']
+    """
+
+    def __init__(self, slow_threshold=None, slow_sample_rate=1.0, slow_logger=None):
+        self.slow_threshold = slow_threshold
+        self.slow_sample_rate = slow_sample_rate
+        self.slow_logger = slow_logger
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, model):
+        return self._models.setdefault(model, {
+            'requests': {}, 'spans': {}, 'tokens_per_second': Histogram(TOKEN_RATE_BUCKETS),
+            'prompt_tokens': 0, 'completion_tokens': 0,
+        })
+
+    def record(self, trace):
+        if 'total' not in trace.spans:
+            trace.finish(trace.status)
+        with self._lock:
+            entry = self._entry(trace.model)
+            entry['requests'][trace.status] = entry['requests'].get(trace.status, 0) + 1
+            for name, seconds in trace.spans.items():
+                if name not in entry['spans']:
+                    entry['spans'][name] = Histogram(LATENCY_BUCKETS)
+                entry['spans'][name].observe(seconds)
+            entry['prompt_tokens'] += trace.tokens.get('prompt_tokens', 0)
+            entry['completion_tokens'] += trace.tokens.get('completion_tokens', 0)
+            if 'tokens_per_second' in trace.tokens:
+                entry['tokens_per_second'].observe(trace.tokens['tokens_per_second'])
+
+        if (self.slow_logger is not None and self.slow_threshold is not None
+                and trace.spans['total'] >= self.slow_threshold and random.random() < self.slow_sample_rate):
+            self.slow_logger.info(json.dumps(trace.to_dict()))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                model: {
+                    'requests': dict(entry['requests']),
+                    'spans': {name: histogram.snapshot() for name, histogram in entry['spans'].items()},
+                    'tokens_per_second': entry['tokens_per_second'].snapshot(),
+                    'prompt_tokens': entry['prompt_tokens'],
+                    'completion_tokens': entry['completion_tokens'],
+                }
+                for model, entry in self._models.items()
+            }
@@ -0,0 +1,176 @@
+"""
+Resilience helpers for calls to slow or unreliable upstream services
+(USBR AgriMet, api.weather.gov).
+
+CircuitBreaker fails fast after a run of consecutive errors so blocked
+requests don't pile up behind a dead upstream. StaleCache keeps the last good
+value around after it expires and refreshes it in the background, so callers
+can keep serving (flagged) stale data while the upstream recovers.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the upstream's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker.
+
+    closed    -> calls go through; consecutive failures are counted
+    open      -> calls fail immediately with CircuitOpenError until reset_timeout passes
+    half_open -> a single trial call is let through; success closes, failure re-opens
+
+    Example:
+        >>> nws = CircuitBreaker('nws', failure_threshold=3, reset_timeout=60)
+        >>> data = nws.call(requests.get, url, timeout=10)
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def _before_call(self):
+        with self._lock:
+            state = self._state()
+            if state == self.OPEN:
+                raise CircuitOpenError(f"Circuit for upstream '{self.name}' is open")
+            if state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpenError(f"Circuit for upstream '{self.name}' is half-open, trial call in progress")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit for upstream '{self.name}' closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                # (re)open the circuit; a failed half-open trial restarts the timer
+                self._opened_at = time.monotonic()
+                logger.warning(
+                    f"Circuit for upstream '{self.name}' opened after {self._failures} consecutive failures"
+                )
+
+    def call(self, func, *args, **kwargs):
+        """Call func through the breaker. Raises CircuitOpenError when the circuit is open."""
+        self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+class StaleCache:
+    """
+    Thread-safe TTL cache with stale-while-revalidate semantics.
+
+    get(key, loader) returns (value, is_stale):
+      - fresh entry          -> (value, False)
+      - expired entry        -> (value, True), and loader() is retried in a background thread
+      - no entry (or too old) -> loader() is called inline; its exceptions propagate
+
+    Entries older than max_stale are discarded rather than served.
+    """
+
+    def __init__(self, name, ttl, max_stale=86400, max_entries=512):
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self._entries = {}       # key -> (value, stored_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None:
+            value, stored_at = entry
+            age = now - stored_at
+            if age < self.ttl:
+                return value, False
+            if age < self.ttl + self.max_stale:
+                self._refresh_in_background(key, loader)
+                return value, True
+
+        value = loader()
+        self.set(key, value)
+        return value, False
+
+    def peek(self, key):
+        """Return the cached value for key regardless of age, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def set(self, key, value):
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                # drop the oldest entry
+                oldest = min(self._entries, key=lambda k: self._entries[k][1])
+                del self._entries[oldest]
+            self._entries[key] = (value, time.monotonic())
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _refresh_in_background(self, key, loader):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def _refresh():
+            try:
+                self.set(key, loader())
+            except Exception as e:
+                logger.warning(f"Background refresh of {self.name} cache entry {key} failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=_refresh, name=f"{self.name}-refresh", daemon=True).start()
@@ -0,0 +1,182 @@
+"""
+Two-level (memory LRU + SQLite file) cache for RAG retrieval results.
+
+Results are keyed by the normalized query text and top_n, and tagged with the collection version
+they were computed against. Bumping the version (after documents are ingested into the vector
+collection) makes every older entry a miss; the version is kept in the cache file so all worker
+processes sharing it see the bump.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalCache:
+    """
+    Example:
+        >>> cache = RetrievalCache('D:/AgWaterLLM/retrieval_cache.db')
+        >>> chunks = cache.get('What is deficit irrigation?', 10)
+        >>> if chunks is None:
+        ...     chunks = query_chroma(...)
+        ...     cache.set('What is deficit irrigation?', 10, chunks)
+    """
+
+    def __init__(self, path, max_entries=1024, disk_max_entries=20000, version_check_interval=5.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self.version_check_interval = version_check_interval
+        self._memory = OrderedDict()    # (version, key) -> chunks
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+        self._writes = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._ensure_tables()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _ensure_tables(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS retrieval_cache (
+                    key TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    chunks TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS retrieval_cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO retrieval_cache_meta (name, value) VALUES ('collection_version', 1)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def normalize(query):
+        """Lower-cases, collapses whitespace and drops trailing punctuation, so trivially different phrasings share an entry."""
+        return re.sub(r'\s+', ' ', query).strip().rstrip('?.!').strip().lower()
+
+    @classmethod
+    def make_key(cls, query, top_n):
+        return hashlib.sha1(f"{cls.normalize(query)}\x00{top_n}".encode('utf-8')).hexdigest()
+
+    @property
+    def version(self):
+        """The current collection version, re-read from the cache file at most every version_check_interval seconds."""
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked_at >= self.version_check_interval:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT value FROM retrieval_cache_meta WHERE name = 'collection_version'").fetchone()
+            finally:
+                conn.close()
+            self._version = row[0] if row else 1
+            self._version_checked_at = now
+        return self._version
+
+    def bump_version(self):
+        """Invalidates every cached result; call after the vector collection changes."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("UPDATE retrieval_cache_meta SET value = value + 1 WHERE name = 'collection_version'")
+                version = conn.execute("SELECT value FROM retrieval_cache_meta WHERE name = 'collection_version'").fetchone()[0]
+                conn.execute("DELETE FROM retrieval_cache WHERE version < ?", (version,))
+        finally:
+            conn.close()
+        with self._lock:
+            self._memory.clear()
+            self._version = version
+            self._version_checked_at = time.monotonic()
+        logger.info(f"Retrieval cache invalidated, collection version is now {version}")
+        return version
+
+    def get(self, query, top_n):
+        """Returns the cached list of (document, metadata) chunks, or None."""
+        key = self.make_key(query, top_n)
+        version = self.version
+        with self._lock:
+            chunks = self._memory.get((version, key))
+            if chunks is not None:
+                self._memory.move_to_end((version, key))
+                self._stats['memory_hits'] += 1
+                return chunks
+
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT chunks FROM retrieval_cache WHERE key = ? AND version = ?", (key, version)).fetchone()
+                if row is not None:
+                    with conn:
+                        conn.execute("UPDATE retrieval_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Retrieval cache read failed: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            chunks = [tuple(chunk) for chunk in json.loads(row[0])]
+            self._remember((version, key), chunks)
+            return chunks
+
+    def set(self, query, top_n, chunks):
+        key = self.make_key(query, top_n)
+        version = self.version
+        chunks = [tuple(chunk) for chunk in chunks]
+        with self._lock:
+            self._remember((version, key), chunks)
+            self._writes += 1
+            prune = self._writes % 100 == 0
+
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO retrieval_cache (key, version, chunks, last_used) VALUES (?, ?, ?, ?)",
+                        (key, version, json.dumps(chunks), time.time()),
+                    )
+                    if prune:
+                        # keep the file bounded: drop the least recently used entries beyond disk_max_entries
+                        conn.execute(
+                            "DELETE FROM retrieval_cache WHERE key IN ("
+                            "SELECT key FROM retrieval_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                            (self.disk_max_entries,),
+                        )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Retrieval cache write failed: {e}")
+
+    def _remember(self, memory_key, chunks):
+        self._memory[memory_key] = chunks
+        self._memory.move_to_end(memory_key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        """Hit/miss counters for this process, e.g. {'memory_hits': 40, 'disk_hits': 2, 'misses': 10, 'hit_ratio': 0.81, ...}"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else None
+        stats['collection_version'] = self.version
+        return stats
@@ -0,0 +1,61 @@
+"""
+Helpers for streamed LLM responses.
+
+Ollama streams roughly one token per chunk; sending each as its own frame means a json.dumps, a
+WSGI write and (under wfastcgi) a FastCGI record and flush per token. TokenCoalescer merges
+consecutive tokens so a frame goes out at most every flush_interval seconds or max_bytes of text,
+while the first token after a pause is still sent right away. sse_frames() re-frames the
+newline-delimited JSON frames as Server-Sent Events.
+"""
+
+import time
+
+
+class TokenCoalescer:
+    """
+    Example:
+        >>> coalescer = TokenCoalescer(flush_interval=0.05, max_bytes=512)
+        >>> for chunk in response:
+        ...     text = coalescer.add(chunk['message']['content'])
+        ...     if text:
+        ...         yield frame(text)
+        >>> text = coalescer.flush()
+        >>> if text:
+        ...     yield frame(text)
+    """
+
+    def __init__(self, flush_interval=0.05, max_bytes=512):
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self._parts = []
+        self._size = 0
+        self._last_flush = 0.0
+
+    def add(self, text):
+        """Buffers text; returns the buffered text when it is time to send it, else ''."""
+        if text:
+            self._parts.append(text)
+            self._size += len(text.encode('utf-8'))
+        if self._parts and (self._size >= self.max_bytes
+                            or time.monotonic() - self._last_flush >= self.flush_interval):
+            return self.flush()
+        return ''
+
+    def flush(self):
+        """Returns (and clears) whatever is buffered."""
+        text = ''.join(self._parts)
+        self._parts = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+        return text
+
+
+def sse_frames(frames):
+    """
+    Converts newline-delimited JSON frames to text/event-stream events; the frame's JSON is the
+    event data, so EventSource clients parse the same objects as streaming JSON clients.
+    """
+    for frame in frames:
+        for line in frame.splitlines():
+            if line:
+                yield f"data: {line}\n\n"